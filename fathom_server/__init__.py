@@ -1,5 +1,5 @@
-from django.conf import settings
-
-
 def show_toolbar(request):
+    # Importing fathom_server.settings rebinds this package's `settings`
+    # attribute to that module, so Django's settings are imported here.
+    from django.conf import settings
     return settings.DEBUG
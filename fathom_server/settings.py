@@ -116,3 +116,50 @@ DEBUG_TOOLBAR_CONFIG = {
 
 # Training stuff
 FIREFOX_BIN = os.environ['FIREFOX_BIN']
+
+# Selenium server that training runs start their Firefox sessions from.
+SELENIUM_HUB_URL = os.environ.get('SELENIUM_HUB_URL', 'http://selenium:4444/wd/hub')
+
+# Browser sessions kept warm by each freeze and train worker process: how
+# many, how many jobs each serves before it's restarted, how much memory its
+# browser may use before it's restarted (0 for no limit; only measurable for
+# local browsers), and how many seconds an idle one waits between health
+# checks.
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', 2))
+BROWSER_MAX_USES = int(os.environ.get('BROWSER_MAX_USES', 100))
+BROWSER_MAX_MEMORY_BYTES = int(os.environ.get('BROWSER_MAX_MEMORY_BYTES', 2 * 1024 * 1024 * 1024))
+BROWSER_HEALTH_CHECK_INTERVAL = int(os.environ.get('BROWSER_HEALTH_CHECK_INTERVAL', 60))
+
+# Train workers renew their lease on the run they're training every
+# TRAINING_RUN_HEARTBEAT_INTERVAL seconds. A running run whose lease hasn't
+# been renewed for TRAINING_RUN_LEASE_SECONDS has lost its worker, and is
+# resumed by the next worker to poll the queue.
+TRAINING_RUN_HEARTBEAT_INTERVAL = int(os.environ.get('TRAINING_RUN_HEARTBEAT_INTERVAL', 30))
+TRAINING_RUN_LEASE_SECONDS = int(os.environ.get('TRAINING_RUN_LEASE_SECONDS', 300))
+
+# Maximum number of per-page extraction results kept in the cache shared by
+# training runs.
+EVALUATION_CACHE_MAX_ENTRIES = int(os.environ.get('EVALUATION_CACHE_MAX_ENTRIES', 1000000))
+
+# Memory each annealing process may use to remember the costs of solutions it
+# has evaluated, and the lower bounds of ones early abort rejected; see
+# training.memo. Training runs can set their own.
+SOLUTION_MEMO_MAX_BYTES = int(os.environ.get('SOLUTION_MEMO_MAX_BYTES', 256 * 1024 * 1024))
+
+# Inlined subresources (stylesheets, fonts, images) of at least this many
+# bytes are taken out of newly frozen HTML and stored once each, named by
+# their hash, so pages that share them share one copy; see
+# training.subresources. 0 leaves frozen HTML as freeze-dry makes it.
+FROZEN_SUBRESOURCE_MIN_BYTES = int(os.environ.get('FROZEN_SUBRESOURCE_MIN_BYTES', 0))
+
+# Frozen webpage serving. Up to FROZEN_WEBPAGE_CACHE_BYTES of frozen HTML is
+# kept in memory per process. Set FROZEN_WEBPAGE_OFFLOAD to 'x-sendfile' or
+# 'x-accel-redirect' to have the frontend web server send the files instead;
+# for nginx, FROZEN_WEBPAGE_ACCEL_REDIRECT_PREFIX is the internal location
+# that maps to MEDIA_ROOT.
+FROZEN_WEBPAGE_CACHE_BYTES = int(os.environ.get('FROZEN_WEBPAGE_CACHE_BYTES', 256 * 1024 * 1024))
+FROZEN_WEBPAGE_OFFLOAD = os.environ.get('FROZEN_WEBPAGE_OFFLOAD', '')
+FROZEN_WEBPAGE_ACCEL_REDIRECT_PREFIX = os.environ.get(
+    'FROZEN_WEBPAGE_ACCEL_REDIRECT_PREFIX',
+    '/protected-media/',
+)
@@ -1,17 +1,20 @@
-import json
-import os
-import random
-from tempfile import mkstemp
-
-from marionette_driver.marionette import Marionette
-
 from django import forms
-from django.conf import settings
 from django.conf.urls import url
 from django.contrib import admin, messages
-from django.core.files.base import ContentFile
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
 
+from fathom_server.training.exporting import (
+    export_factset,
+    export_training_run,
+    parse_since,
+    to_jsonl,
+)
+from fathom_server.training.freezing import enqueue_webpages
+from fathom_server.training.importing import import_jsonl
+from fathom_server.training.jobs import enqueue_training_run
 from fathom_server.training.models import (
     Fact,
     FactSet,
@@ -27,12 +30,39 @@ class FactAdmin(admin.ModelAdmin):
     pass
 
 
+def export_response(request, export, obj, filename):
+    """
+    Stream an export as a JSON Lines download. A since query parameter
+    limits it to webpages frozen at or after that ISO 8601 date or time.
+    """
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = parse_since(request.GET['since'])
+        except ValueError as err:
+            return HttpResponseBadRequest(str(err))
+
+    response = StreamingHttpResponse(
+        to_jsonl(export(obj, since=since)),
+        content_type='application/x-ndjson',
+    )
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    return response
+
+
 class WebpageFactForm(forms.ModelForm):
     class Meta:
         model = WebpageFact
         fields = ['fact_answer']
 
 
+class ImportWebpagesForm(forms.Form):
+    file = forms.FileField(help_text=(
+        'A JSON Lines file with one {"url": ..., "frozen_html": ..., "facts": {...}} '
+        'object per line.'
+    ))
+
+
 @admin.register(FactSet)
 class FactSetAdmin(admin.ModelAdmin):
     def get_urls(self):
@@ -48,29 +78,27 @@ class FactSetAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.fill_form),
                 name='fill_factset_form',
             ),
+            url(
+                r'^(\d+)/export/$',
+                self.admin_site.admin_view(self.export),
+                name='export_factset',
+            ),
         ]
         return extra_urls + urls
 
-    def get_unanswered_webpage(self, facts):
-        # Find webpages who are missing answers for all the facts
-        answered_webpages = Webpage.objects.all()
-        for fact in facts:
-            answered_webpages = answered_webpages.filter(webpagefact__fact=fact)
-
-        # Exclude answered webpages so we only find webpages that are
-        # missing answers.
-        unanswered_webpages = Webpage.objects.exclude(
-            id__in=[webpage.id for webpage in answered_webpages]
-        ).exclude(frozen_html='')
-
-        return random.choice(unanswered_webpages)
-
     def fill(self, request, factset_id):
         factset = get_object_or_404(FactSet, id=factset_id)
-        facts = factset.facts.all()
-        webpage = self.get_unanswered_webpage(facts)
+        webpage = factset.random_unanswered_webpage()
+        if webpage is None:
+            messages.info(request, 'Every frozen webpage has answers for all of these facts.')
+            return redirect('admin:training_factset_change', factset_id)
         return redirect('admin:fill_factset_form', factset_id, webpage.id)
 
+    def export(self, request, factset_id):
+        factset = get_object_or_404(FactSet, id=factset_id)
+        filename = 'factset-{}.jsonl'.format(factset.id)
+        return export_response(request, export_factset, factset, filename)
+
     def fill_form(self, request, factset_id, webpage_id):
         request.current_app = self.admin_site.name
 
@@ -118,99 +146,189 @@ class WebpageFactInline(admin.TabularInline):
 
 @admin.register(Webpage)
 class WebpageAdmin(admin.ModelAdmin):
-    list_display = ['url', 'short_frozen_html']
-    fields = ['url', 'short_frozen_html']
-    readonly_fields = ['short_frozen_html']
+    list_display = ['url', 'freeze_status', 'frozen_at', 'freeze_duration', 'short_frozen_html']
+    list_filter = ['freeze_status']
+    fields = [
+        'url',
+        'short_frozen_html',
+        'frozen_html_size',
+        'frozen_html_sha256',
+        'freeze_status',
+        'frozen_at',
+        'freeze_duration',
+        'freeze_timings',
+        'freeze_error',
+    ]
+    readonly_fields = [
+        'short_frozen_html',
+        'frozen_html_size',
+        'frozen_html_sha256',
+        'freeze_status',
+        'frozen_at',
+        'freeze_duration',
+        'freeze_timings',
+        'freeze_error',
+    ]
     actions = ['freeze', 'train']
     inlines = [WebpageFactInline]
 
+    def get_urls(self):
+        urls = super(WebpageAdmin, self).get_urls()
+        extra_urls = [
+            url(
+                r'^import/$',
+                self.admin_site.admin_view(self.import_webpages),
+                name='import_webpages',
+            ),
+        ]
+        return extra_urls + urls
+
+    def import_webpages(self, request):
+        request.current_app = self.admin_site.name
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        form = ImportWebpagesForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            # Large uploads are spooled to disk, and import_jsonl reads them
+            # a line at a time.
+            result = import_jsonl(form.cleaned_data['file'])
+            for line_number, error in result.errors[:20]:
+                messages.warning(request, 'Line {}: {}'.format(line_number, error))
+            messages.success(request, str(result))
+            return redirect('admin:training_webpage_changelist')
+
+        return render(request, 'admin/training/webpage/import.html', {
+            'form': form,
+            'opts': self.model._meta,
+        })
+
     def short_frozen_html(self, webpage):
         if webpage.frozen_html:
-            return webpage.frozen_html.read(200)
+            return webpage.open_frozen_html().read(200)
         return ''
 
     def freeze(self, request, queryset):
-        with open(os.path.join(settings.BASE_DIR, 'build', 'freeze.bundle.js')) as f:
-            freeze_script = f.read()
-
-        client = None
-        try:
-            client = Marionette(bin=settings.FIREFOX_BIN, headless=True)
-            client.start_session()
-
-            for webpage in queryset:
-                print('Freezing {}...'.format(webpage.url))
-                client.navigate(webpage.url)
-                results = client.execute_async_script(
-                    freeze_script,
-                    script_timeout=1000 * 60 * 5,
-                )
-                webpage.frozen_html.save(webpage.url, ContentFile(results['html']))
-                webpage.save()
-        finally:
-            if client:
-                client.cleanup()
+        count = enqueue_webpages(queryset)
+        messages.add_message(
+            request,
+            messages.SUCCESS,
+            'Queued {} webpages for freezing.'.format(count),
+        )
 
 
 @admin.register(TrainingRun)
 class TrainingRunModelAdmin(admin.ModelAdmin):
+    list_display = ['id', 'ruleset', 'status', 'progress', 'started_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = [
+        'status',
+        'queued_at',
+        'started_at',
+        'finished_at',
+        'heartbeat_at',
+        'progress',
+        'error',
+        'stop_reason',
+        'test_results',
+        'cross_validation_results',
+        'checkpointed_at',
+    ]
+
     def get_urls(self):
         urls = super(TrainingRunModelAdmin, self).get_urls()
         extra_urls = [
             url(
                 r'^(\d+)/train/$',
-                self.admin_site.admin_view(self.train),
+                self.admin_site.admin_view(require_POST(self.train)),
                 name='execute_training_run',
             ),
+            url(
+                r'^(\d+)/resume/$',
+                self.admin_site.admin_view(require_POST(self.resume)),
+                name='resume_training_run',
+            ),
+            url(
+                r'^(\d+)/export/$',
+                self.admin_site.admin_view(self.export),
+                name='export_training_run',
+            ),
+            url(
+                r'^(\d+)/telemetry/$',
+                self.admin_site.admin_view(self.telemetry),
+                name='training_run_telemetry',
+            ),
         ]
         return extra_urls + urls
 
     def train(self, request, run_id):
         training_run = get_object_or_404(TrainingRun, id=run_id)
+        return self.enqueue(request, training_run, False, 'Training run queued.')
 
-        with open(os.path.join(settings.BASE_DIR, 'build', 'train.bundle.js')) as f:
-            train_script = f.read()
-
-        fd, ruleset_path = mkstemp()
-        with os.fdopen(fd, 'w') as f:
-            f.write(training_run.ruleset.code.encode('utf8'))
-
-        facts = training_run.ruleset.fact_set.facts.all()
-
-        client = None
-        try:
-            client = Marionette(bin=settings.FIREFOX_BIN, headless=True)
-            client.start_session()
-
-            webpages = list(map(
-                lambda webpage: {
-                    'url': webpage.url,
-                    'facts': {
-                        fact.fact.key: fact.fact_answer
-                        for fact in webpage.webpagefact_set.filter(fact__in=facts)
-                    },
-                },
-                training_run.training_pages.all(),
-            ))
-
-            results = client.execute_async_script(
-                train_script,
-                script_args=(
-                    ruleset_path,
-                    list(map(lambda fact: fact.key, facts)),
-                    webpages,
-                    json.loads(training_run.initial_coefficients),
-                ),
-                sandbox='system',
-                script_timeout=1000 * 60 * 5,
+    def resume(self, request, run_id):
+        training_run = get_object_or_404(TrainingRun, id=run_id)
+        if training_run.checkpoint:
+            message = 'Training run queued to resume from its last checkpoint.'
+        else:
+            message = 'Training run has no checkpoint; queued to start over.'
+        return self.enqueue(request, training_run, True, message)
+
+    def enqueue(self, request, training_run, resume, message):
+        if enqueue_training_run(training_run, resume=resume):
+            messages.add_message(request, messages.SUCCESS, message)
+        else:
+            messages.add_message(
+                request,
+                messages.ERROR,
+                'Training run is running; it can be queued again once it finishes, or once '
+                'its worker stops.',
             )
+        return redirect('admin:training_trainingrun_change', training_run.id)
 
-            training_run.final_coefficients = json.dumps(results[0])
-            training_run.save()
-        finally:
-            if client:
-                client.cleanup()
-            os.remove(ruleset_path)
-
-        messages.add_message(request, messages.SUCCESS, 'Training run completed.')
-        return redirect('admin:training_trainingrun_change', run_id)
+    def export(self, request, run_id):
+        training_run = get_object_or_404(TrainingRun, id=run_id)
+        return export_response(
+            request,
+            export_training_run,
+            training_run,
+            'training-run-{}.jsonl'.format(training_run.id),
+        )
+
+    def telemetry(self, request, run_id):
+        """
+        Return the run's status and the telemetry steps recorded after the
+        step ID in the after query parameter, for the change form to poll.
+        Without after, return the latest 50 steps.
+        """
+        training_run = get_object_or_404(TrainingRun, id=run_id)
+        if 'after' in request.GET:
+            try:
+                after = int(request.GET['after'])
+            except ValueError:
+                return HttpResponseBadRequest('Invalid after parameter.')
+            steps = training_run.steps.filter(id__gt=after)[:500]
+        else:
+            steps = reversed(training_run.steps.order_by('-id')[:50])
+        return JsonResponse({
+            'status': training_run.get_status_display(),
+            'progress': training_run.progress,
+            'steps': [
+                {
+                    'id': step.id,
+                    'chain': step.chain,
+                    'step': step.step,
+                    'recorded_at': step.recorded_at.isoformat(),
+                    'temperature': step.temperature,
+                    'current_cost': step.current_cost,
+                    'best_cost': step.best_cost,
+                    'candidates_evaluated': step.candidates_evaluated,
+                    'evaluations_per_second': step.evaluations_per_second,
+                    'cache_hit_rate': step.cache_hit_rate,
+                    'memo_hit_rate': step.memo_hit_rate,
+                    'page_load_time': step.page_load_time,
+                    'script_time': step.script_time,
+                    'comparison_time': step.comparison_time,
+                }
+                for step in steps
+            ],
+        })
@@ -1,9 +1,172 @@
-import json
 import math
-from random import choice, random, randrange
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from threading import Lock
 
-from selenium import webdriver
-from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+from django.conf import settings
+
+from fathom_server.training.browsers import webdriver_pool
+from fathom_server.training.cache import ResultCache
+from fathom_server.training.memo import SolutionMemo
+from fathom_server.training.models import TrainingRun, WebpageFact
+from fathom_server.training.offline import (
+    EXTRACT_FEATURES_SCRIPT,
+    OfflineEvaluator,
+    save_features,
+    stale_webpages,
+)
+from fathom_server.training.schedules import GeometricSchedule, StoppingRule
+
+
+INITIAL_COEFFICIENTS_SCRIPT = 'return window.ruleset.initialCoefficients();'
+
+# Selenium 3 has no API for opening a window, so resident pages open their
+# tabs from script.
+OPEN_WINDOW_SCRIPT = 'window.open();'
+
+# Saves a ruleset's code in localStorage, which every frozen webpage shares
+# since they're served from the same origin, replacing any other version.
+# Returns whether it could.
+STORE_RULESET_SCRIPT = '''
+const [key, code] = arguments;
+try {
+  for (const other of Object.keys(window.localStorage)) {
+    if (other.startsWith('fathom-ruleset:')) {
+      window.localStorage.removeItem(other);
+    }
+  }
+  window.localStorage.setItem(key, code);
+  return true;
+} catch (error) {
+  return false;
+}
+'''
+
+# Compiles and runs the ruleset code saved by STORE_RULESET_SCRIPT, the same
+# way execute_script would. Returns 'loaded', 'missing' if it isn't there,
+# or 'blocked' if the page doesn't allow storage or eval.
+LOAD_STORED_RULESET_SCRIPT = '''
+const [key] = arguments;
+let code;
+try {
+  code = window.localStorage.getItem(key);
+} catch (error) {
+  return 'blocked';
+}
+if (code === null) {
+  return 'missing';
+}
+let run;
+try {
+  run = new Function(code);
+} catch (error) {
+  if (error instanceof EvalError) {
+    return 'blocked';
+  }
+  throw error;
+}
+run();
+return 'loaded';
+'''
+
+# Runs extractFacts once per coefficient vector and returns the results as a
+# list, so a whole batch of candidates costs a single WebDriver round trip.
+EXTRACT_FACTS_BATCH_SCRIPT = '''
+const [factNames, coefficientsList] = arguments;
+return coefficientsList.map(
+  coefficients => window.ruleset.extractFacts(window.document, factNames, coefficients),
+);
+'''
+
+
+class GroundTruth:
+    """
+    The expected fact answers for a list of webpages, fetched with a single
+    query and decoded according to each fact's type up front, so checking a
+    result never touches the database.
+    """
+    MISSING = object()
+
+    def __init__(self, facts, webpages):
+        facts = list(facts)
+        self.fact_keys = [fact.key for fact in facts]
+        fact_indexes = {fact.id: index for index, fact in enumerate(facts)}
+
+        # webpage id => list of decoded answers in fact_keys order
+        answers = {webpage.id: [self.MISSING] * len(facts) for webpage in webpages}
+        webpage_facts = WebpageFact.objects.filter(
+            webpage__in=list(answers.keys()),
+            fact__in=facts,
+        ).values_list('webpage_id', 'fact_id', 'fact_answer')
+        for webpage_id, fact_id, fact_answer in webpage_facts:
+            index = fact_indexes[fact_id]
+            answers[webpage_id][index] = facts[index].decode_answer(fact_answer)
+        self.answers = {webpage_id: tuple(row) for webpage_id, row in answers.items()}
+
+        # Pages are only checked against the facts they have answers for.
+        self.checks = {
+            webpage_id: tuple(
+                (key, answer)
+                for key, answer in zip(self.fact_keys, row)
+                if answer is not self.MISSING
+            )
+            for webpage_id, row in self.answers.items()
+        }
+
+    def is_correct(self, webpage, result):
+        return all(result[key] == answer for key, answer in self.checks[webpage.id])
+
+
+class StepMetrics:
+    """
+    Counters for the cooling step in progress. The driver pool's threads
+    add to them concurrently.
+    """
+    FIELDS = (
+        'candidates_evaluated',
+        'cache_hits',
+        'cache_misses',
+        'memo_hits',
+        'memo_misses',
+        'page_load_time',
+        'script_time',
+        'comparison_time',
+    )
+
+    def __init__(self):
+        self.lock = Lock()
+        self.values = Counter()
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.values[name] += value
+
+    def pop(self):
+        """Return the counters and start again from zero."""
+        with self.lock:
+            values, self.values = self.values, Counter()
+        return {field: values[field] for field in self.FIELDS}
+
+
+def step_telemetry(step, temperature, current_cost, best_cost, elapsed, metrics):
+    """The metrics of one cooling step, as stored by jobs.record_step."""
+    telemetry = dict(metrics)
+    telemetry.update({
+        'step': step,
+        'temperature': temperature,
+        'current_cost': current_cost,
+        'best_cost': best_cost,
+        'evaluations_per_second': metrics['candidates_evaluated'] / elapsed if elapsed else 0,
+    })
+    return telemetry
+
+
+def json_to_random_state(state):
+    """Turn a random.getstate() that went through JSON back into a state."""
+    version, internal_state, gauss_next = state
+    return (version, tuple(internal_state), gauss_next)
 
 
 class Tuner:
@@ -15,98 +178,786 @@ class Tuner:
         cooling_steps=5000,
         cooling_fraction=0.95,
         steps_per_temp=1000,
+        still_patience=1,
+        cooling_schedule=None,
+        stopping_rule=None,
+        initial_coefficients=None,
+        progress_callback=None,
+        telemetry_callback=None,
+        driver_factory=None,
+        checkpoint_callback=None,
+        checkpoint_interval=10,
+        checkpoint_memo=False,
+        resume_from=None,
+        pool_size=1,
+        batch_size=1,
+        resident_pages=False,
+        offline=False,
+        cache_results=False,
+        early_abort=False,
+        page_order=TrainingRun.PAGE_ORDER_GIVEN,
+        minibatch_fraction=1,
+        minibatch_phase=0.5,
+        minibatch_sampling=TrainingRun.MINIBATCH_RANDOM,
+        memo_max_bytes=None,
+        seed=None,
     ):
         self.ruleset = ruleset
-        self.webpages = webpages
-        self.initial_temperature = initial_temperature
+        self.webpages = list(webpages)
+        # The pages candidates are scored on: all of them, except during a
+        # mini-batch cooling step.
+        self.scored_webpages = self.webpages
         self.cooling_steps = cooling_steps
-        self.cooling_fraction = cooling_fraction
         self.steps_per_temp = steps_per_temp
+        self.still_patience = still_patience
+        schedule = cooling_schedule or GeometricSchedule(initial_temperature, cooling_fraction)
+        # A copy, since schedules can keep state of their own.
+        self.cooling_schedule = schedule.copy()
+        self.initial_temperature = self.cooling_schedule.initial_temperature
+        self.stopping_rule = stopping_rule or StoppingRule()
+        self.stop_reason = None
+        self.started_at = None
+        self.evaluations = 0
+        self.best_cost_seen = math.inf
+        self.improved_at = 0
+        self.moves = Counter()
         self.boltzmanns = 1.3806485279e-23
+        self.initial_coefficients = initial_coefficients
+        self.progress_callback = progress_callback
+        self.telemetry_callback = telemetry_callback
+        self.metrics = StepMetrics()
+        self.driver_factory = driver_factory
+        self.checkpoint_callback = checkpoint_callback
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_memo = checkpoint_memo
+        self.resume_from = resume_from
+        self.pool_size = max(1, pool_size)
+        self.batch_size = max(1, batch_size)
+        self.resident_pages = resident_pages
+        self.offline = offline
+        self.early_abort = early_abort and not offline
+        self.page_order = page_order
+        # Every number annealing draws comes from here, so Tuners running in
+        # parallel threads don't disturb each other's sequences, and a seed
+        # reproduces a run.
+        self.random = Random(seed)
+        self.page_order_random = Random()
+        # Offline scoring is cheap enough to always use every page.
+        self.minibatch_fraction = 1 if offline else minibatch_fraction
+        self.minibatch_phase = minibatch_phase
+        self.minibatch_sampling = minibatch_sampling
+        if memo_max_bytes is None:
+            memo_max_bytes = settings.SOLUTION_MEMO_MAX_BYTES
+        # With early abort, a quarter of the memo's memory goes to the lower
+        # bounds of the candidates it rejected.
+        self.lower_bounds_max_bytes = memo_max_bytes // 4 if self.early_abort else 0
+        self.memo_max_bytes = memo_max_bytes - self.lower_bounds_max_bytes
+        self.memo = None
+        self.ruleset_hash = self.ruleset.code_hash
+        self.ruleset_storage_key = 'fathom-ruleset:{}'.format(self.ruleset_hash)
+
+        # All database access happens here; evaluating candidates afterwards
+        # makes no queries at all unless the result cache is enabled.
+        self.facts = list(self.ruleset.fact_set.facts.all())
+        self.ground_truth = GroundTruth(self.facts, self.webpages)
+        self.webpage_indexes = {webpage.id: index for index, webpage in enumerate(self.webpages)}
+        self.result_cache = None
+        if cache_results and not offline:
+            self.result_cache = ResultCache(self.ruleset, self.ground_truth.fact_keys)
 
-        self.facts = self.ruleset.fact_set.facts.all()
+    def create_driver(self):
+        """
+        Return a new WebDriver session from driver_factory if one was given,
+        otherwise lease a warm one from this process's pool of sessions on
+        the Selenium server.
+        """
+        if self.driver_factory:
+            return self.driver_factory()
+        return webdriver_pool().acquire()
+
+    def release_driver(self, driver):
+        if self.driver_factory:
+            driver.quit()
+        else:
+            webdriver_pool().release(driver)
+
+    def start(self):
+        """
+        Get ready to evaluate candidates, starting the offline evaluator if
+        it's enabled. Browsers are started when they're first needed.
+        """
+        self.drivers = []
+        self.executor = None
+        self.resident_windows = {}
+        self.stored_rulesets = {}
+        self.offline_evaluator = None
+        self.cost_lower_bounds = self.new_lower_bounds()
+        self.page_failures = Counter()
+
+        if self.offline:
+            # The browsers are only needed to extract features for new or
+            # changed pages; candidates are then scored with NumPy.
+            self.extract_features()
+            self.offline_evaluator = OfflineEvaluator(
+                self.ruleset,
+                self.webpages,
+                self.ground_truth,
+            )
+
+    def new_lower_bounds(self):
+        """
+        Return an empty table for the lowest costs that early-aborted
+        candidates could still have, keyed like the memo.
+        """
+        return SolutionMemo(self.lower_bounds_max_bytes)
+
+    def start_drivers(self):
+        """Start the browsers, unless they're already running."""
+        if self.drivers:
+            return
+        # Each driver is only ever used by one thread at a time; the
+        # webpages are split into one shard per driver.
+        self.drivers = [self.create_driver() for _ in range(self.pool_size)]
+        if self.pool_size > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
+
+    def stop(self):
+        if self.executor:
+            self.executor.shutdown()
+        for driver in self.drivers:
+            self.release_driver(driver)
 
     def anneal(self):
+        self.started_at = time.monotonic()
         try:
-            self.driver = webdriver.Remote(
-                command_executor='http://selenium:4444/wd/hub',
-                desired_capabilities=DesiredCapabilities.FIREFOX,
-            )
+            self.start()
 
-            temperature = self.initial_temperature
-            current_solution = self.initial_solution()
-            best_solution = current_solution
-            current_cost = self.solution_cost(current_solution)
-            best_cost = current_cost
-
-            seen_solutions = {}
-            for i in range(self.cooling_steps):
-                start_cost = current_cost
-                for j in range(self.steps_per_temp):
-                    new_solution = self.random_transition(current_solution)
-                    new_solution_key = tuple(new_solution)
-                    if new_solution_key in seen_solutions:
-                        new_cost = seen_solutions[new_solution_key]
-                    else:
-                        new_cost = self.solution_cost(new_solution)
-                        seen_solutions[new_solution_key] = new_cost
-
-                    if new_cost < current_cost:
-                        # Always take improvements
-                        current_cost = new_cost
-                        current_solution = new_solution
-                        if new_cost < best_cost:
-                            best_cost = new_cost
-                            best_solution = new_solution
-                    else:
-                        # Sometimes take non-improvements
-                        minus_delta = current_cost - new_cost
-                        merit = math.exp(minus_delta / (self.boltzmanns * temperature))
-                        if merit > random():
-                            current_cost = new_cost
-                            current_solution = new_solution
-
-                    # Exit if we're not moving
-                    if start_cost == current_cost:
-                        break
-                temperature *= self.cooling_fraction
+            seen_solutions = self.memo = SolutionMemo(self.memo_max_bytes)
+            if self.resume_from:
+                (
+                    first_step,
+                    temperature,
+                    current_solution,
+                    current_cost,
+                    best_solution,
+                    best_cost,
+                ) = self.restore_checkpoint(self.resume_from, seen_solutions)
+            else:
+                first_step = 0
+                temperature = self.initial_temperature
+                current_solution = self.initial_solution()
+                best_solution = current_solution
+                current_cost = self.solution_cost(current_solution)
+                best_cost = current_cost
+                self.best_cost_seen = best_cost
+                self.improved_at = self.evaluations
+
+            # Whether current_cost was scored on every page rather than on
+            # the last step's mini-batch
+            current_cost_is_full = first_step == 0 or self.minibatch_size(first_step - 1) is None
+
+            self.metrics.pop()
+            for i in range(first_step, self.cooling_steps):
+                if self.should_stop():
+                    break
+                step_start = time.monotonic()
+                self.moves.clear()
+                webpages = self.minibatch(i)
+                if webpages is None:
+                    if not current_cost_is_full:
+                        current_cost = self.memoized_cost(current_solution, seen_solutions)
+                        current_cost_is_full = True
+                    sampled = self.sample(
+                        current_solution,
+                        current_cost,
+                        temperature,
+                        seen_solutions,
+                    )
+                    current_solution, current_cost, step_best_solution, step_best_cost = sampled
+                else:
+                    current_solution, current_cost, step_best_solution = self.sample_minibatch(
+                        webpages,
+                        current_solution,
+                        temperature,
+                    )
+                    current_cost_is_full = False
+                    step_best_cost = math.inf
+                    if step_best_solution is not None:
+                        # Only a cost on every page can make a solution the best.
+                        step_best_cost = self.memoized_cost(step_best_solution, seen_solutions)
+                improved = step_best_cost < best_cost
+                if improved:
+                    best_cost = step_best_cost
+                    best_solution = step_best_solution
+                if best_cost < self.best_cost_seen:
+                    self.best_cost_seen = best_cost
+                    self.improved_at = self.evaluations
+                self.flush_result_cache()
+                if self.telemetry_callback:
+                    self.telemetry_callback(step_telemetry(
+                        i + 1,
+                        temperature,
+                        current_cost,
+                        best_cost,
+                        time.monotonic() - step_start,
+                        self.metrics.pop(),
+                    ))
+                proposed = self.moves['proposed']
+                temperature = self.cooling_schedule.next_temperature(
+                    temperature,
+                    self.moves['accepted'] / proposed if proposed else 0,
+                    improved,
+                )
+                if self.progress_callback:
+                    self.progress_callback(i + 1)
+                interval = self.checkpoint_interval
+                if self.checkpoint_callback and interval and (i + 1) % interval == 0:
+                    self.checkpoint_callback(self.checkpoint(
+                        i + 1,
+                        temperature,
+                        current_solution,
+                        current_cost,
+                        best_solution,
+                        best_cost,
+                        seen_solutions,
+                    ))
+            # Results from scoring the initial solution, if no step ran
+            self.flush_result_cache()
             return (best_solution, best_cost)
         finally:
-            self.driver.close()
+            self.stop()
 
-    def initial_solution(self):
-        self.driver.get('about:blank')
-        self.driver.execute_script(self.ruleset.code)
-        initial_solution = self.driver.execute_script(
-            'return window.ruleset.initialCoefficients();',
+    def flush_result_cache(self):
+        """Store the results this cooling step added to the result cache."""
+        if self.result_cache:
+            self.result_cache.flush()
+
+    def should_stop(self):
+        """
+        Return whether the stopping rule says to stop now, remembering why in
+        stop_reason.
+        """
+        if self.stop_reason is None:
+            seconds = time.monotonic() - self.started_at if self.started_at is not None else 0
+            self.stop_reason = self.stopping_rule.reason(
+                self.evaluations,
+                seconds,
+                self.evaluations - self.improved_at,
+            )
+        return self.stop_reason is not None
+
+    def checkpoint(
+        self,
+        step,
+        temperature,
+        current_solution,
+        current_cost,
+        best_solution,
+        best_cost,
+        seen_solutions,
+    ):
+        """
+        Return everything needed to carry on annealing after the given number
+        of cooling steps, as JSON-serializable data. The memo of solution
+        costs is only included if checkpoint_memo is set; without it a
+        resumed run makes the same moves but re-evaluates solutions it had
+        already seen.
+        """
+        checkpoint = {
+            'ruleset_hash': self.ruleset_hash,
+            'step': step,
+            'temperature': temperature,
+            'current_solution': current_solution,
+            'current_cost': current_cost,
+            'best_solution': best_solution,
+            'best_cost': best_cost,
+            'random_state': self.random.getstate(),
+            'page_order_random_state': self.page_order_random.getstate(),
+            'page_failures': list(self.page_failures.items()),
+            'schedule_state': self.cooling_schedule.get_state(),
+            'evaluations': self.evaluations,
+            'evaluations_since_improvement': self.evaluations - self.improved_at,
+            'seconds': time.monotonic() - self.started_at,
+        }
+        if self.checkpoint_memo:
+            checkpoint['memo'] = [[list(key), cost] for key, cost in seen_solutions.items()]
+            checkpoint['cost_lower_bounds'] = [
+                [list(key), cost] for key, cost in self.cost_lower_bounds.items()
+            ]
+        return checkpoint
+
+    def restore_checkpoint(self, checkpoint, seen_solutions):
+        """
+        Restore the state saved by checkpoint(), filling in seen_solutions,
+        and return the step to carry on from followed by the temperature and
+        the current and best solutions and costs.
+        """
+        self.random.setstate(json_to_random_state(checkpoint['random_state']))
+        self.page_order_random.setstate(json_to_random_state(checkpoint['page_order_random_state']))
+        self.page_failures.update(dict(checkpoint['page_failures']))
+        self.cooling_schedule.set_state(checkpoint.get('schedule_state', {}))
+        self.evaluations = checkpoint.get('evaluations', 0)
+        self.improved_at = self.evaluations - checkpoint.get('evaluations_since_improvement', 0)
+        self.best_cost_seen = checkpoint['best_cost']
+        self.started_at -= checkpoint.get('seconds', 0)
+        seen_solutions.update((tuple(key), cost) for key, cost in checkpoint.get('memo', []))
+        self.cost_lower_bounds.update(
+            (tuple(key), cost) for key, cost in checkpoint.get('cost_lower_bounds', [])
+        )
+        return (
+            checkpoint['step'],
+            checkpoint['temperature'],
+            checkpoint['current_solution'],
+            checkpoint['current_cost'],
+            checkpoint['best_solution'],
+            checkpoint['best_cost'],
         )
+
+    def sample(
+        self,
+        current_solution,
+        current_cost,
+        temperature,
+        seen_solutions,
+        stop_when_still=True,
+    ):
+        """
+        Take up to steps_per_temp Metropolis steps at one temperature. By
+        default this stops early if the cost is back where it started after
+        still_patience steps, and it always stops once should_stop() does.
+
+        Returns the solution and cost the chain ended up at, followed by the
+        best solution and cost it visited.
+        """
+        start_cost = current_cost
+        best_solution = current_solution
+        best_cost = current_cost
+        candidates = []
+        for j in range(self.steps_per_temp):
+            if self.should_stop():
+                break
+            if not candidates:
+                candidates = self.propose_candidates(
+                    current_solution,
+                    current_cost,
+                    temperature,
+                    seen_solutions,
+                )
+            new_solution, new_cost = candidates.pop(0)
+            self.moves['proposed'] += 1
+            if self.scored_webpages is self.webpages and new_cost < self.best_cost_seen:
+                self.best_cost_seen = new_cost
+                self.improved_at = self.evaluations
+
+            if new_cost < current_cost:
+                # Always take improvements
+                current_cost = new_cost
+                current_solution = new_solution
+                candidates = []
+                self.moves['accepted'] += 1
+                if new_cost < best_cost:
+                    best_cost = new_cost
+                    best_solution = new_solution
+            else:
+                # Sometimes take non-improvements
+                minus_delta = current_cost - new_cost
+                merit = math.exp(minus_delta / (self.boltzmanns * temperature))
+                if merit > self.random.random():
+                    current_cost = new_cost
+                    current_solution = new_solution
+                    candidates = []
+                    self.moves['accepted'] += 1
+
+            # Exit if we're not moving
+            still = start_cost == current_cost and j + 1 >= self.still_patience
+            if stop_when_still and self.still_patience and still:
+                break
+        return current_solution, current_cost, best_solution, best_cost
+
+    def minibatch_size(self, step):
+        """
+        Return how many webpages to score candidates on during the given
+        cooling step, or None to use all of them. The first step uses
+        minibatch_fraction of the pages, and the fraction grows linearly to
+        all of them by the end of the first minibatch_phase of the cooling
+        steps.
+        """
+        full_from = self.cooling_steps * self.minibatch_phase
+        if self.minibatch_fraction >= 1 or step >= full_from:
+            return None
+        fraction = self.minibatch_fraction + (1 - self.minibatch_fraction) * step / full_from
+        size = max(1, math.ceil(len(self.webpages) * fraction))
+        return size if size < len(self.webpages) else None
+
+    def minibatch(self, step):
+        """
+        Draw the webpages to score candidates on during the given cooling
+        step, or return None to use all of them.
+
+        Stratified sampling ranks the pages by how often candidates have
+        failed on them and takes one page from each of `size` equal slices
+        of the ranking, so every mini-batch has a similar mix of easy and
+        hard pages.
+        """
+        size = self.minibatch_size(step)
+        if size is None:
+            return None
+        if self.minibatch_sampling == TrainingRun.MINIBATCH_STRATIFIED:
+            ranked = sorted(self.webpages, key=lambda webpage: self.page_failures[webpage.id])
+            stratum = len(ranked) / size
+            return [
+                ranked[self.random.randrange(int(index * stratum), int((index + 1) * stratum))]
+                for index in range(size)
+            ]
+        return self.random.sample(self.webpages, size)
+
+    def sample_minibatch(self, webpages, current_solution, temperature):
+        """
+        Take a cooling step scoring candidates on the given webpages only.
+        Costs on different pages can't be compared, so the step starts by
+        scoring the current solution on these pages and uses a memo of its
+        own.
+
+        Returns the solution the chain ended up at and its cost on these
+        pages, followed by the best solution visited if it did better than
+        the one the step started from, or None if it didn't.
+        """
+        self.scored_webpages = webpages
+        lower_bounds, self.cost_lower_bounds = self.cost_lower_bounds, self.new_lower_bounds()
+        try:
+            start_cost = self.solution_cost(current_solution)
+            current_solution, current_cost, best_solution, best_cost = self.sample(
+                current_solution,
+                start_cost,
+                temperature,
+                {},
+            )
+        finally:
+            self.scored_webpages = self.webpages
+            self.cost_lower_bounds = lower_bounds
+        return current_solution, current_cost, best_solution if best_cost < start_cost else None
+
+    def initial_solution(self):
+        if self.initial_coefficients:
+            return list(self.initial_coefficients)
+
+        self.start_drivers()
+        driver = self.drivers[0]
+        driver.get('about:blank')
+        driver.execute_script(self.ruleset.code)
+        initial_solution = driver.execute_script(INITIAL_COEFFICIENTS_SCRIPT)
         return initial_solution
 
+    def propose_candidates(self, solution, current_cost, temperature, seen_solutions):
+        """
+        Draw batch_size neighbours of the given solution and return them
+        paired with their costs. Neighbours we haven't seen before are all
+        evaluated together in one batch, and their costs are memoized.
+
+        With early abort on, a neighbour's evaluation stops once it has
+        failed on enough pages that the Metropolis test in anneal is sure to
+        reject it, and the cost returned for it is only the lower bound
+        reached so far. anneal rejects it on that lower bound too, so its
+        decisions are the same as with full evaluation.
+        """
+        candidates = [self.random_transition(solution) for _ in range(self.batch_size)]
+
+        # The random numbers anneal will compare each candidate's merit
+        # against. Candidate i is only considered if all the ones before it
+        # were rejected, so its number is the i-th draw from here on. We
+        # peek at them without consuming them to keep the random sequence
+        # the same as without early abort.
+        thresholds = {}
+        if self.early_abort:
+            state = self.random.getstate()
+            for candidate in candidates:
+                key = tuple(candidate)
+                thresholds[key] = min(thresholds.get(key, 1), self.random.random())
+            self.random.setstate(state)
+
+        def is_rejected(key, min_cost):
+            if min_cost < current_cost:
+                return False
+            merit = math.exp((current_cost - min_cost) / (self.boltzmanns * temperature))
+            return not merit > thresholds[key]
+
+        # The costs and lower bounds are collected as we go, since adding to
+        # the memo or the lower bounds can evict entries from them.
+        costs = {}
+        lower_bounds = {}
+        unseen_solutions = {}
+        for candidate in candidates:
+            key = tuple(candidate)
+            if key in costs or key in unseen_solutions:
+                continue
+            cost = seen_solutions.get(key)
+            if cost is not None:
+                self.metrics.add('memo_hits')
+                costs[key] = cost
+                continue
+            self.metrics.add('memo_misses')
+            lower_bound = self.cost_lower_bounds.get(key)
+            if lower_bound is not None and is_rejected(key, lower_bound):
+                lower_bounds[key] = lower_bound
+                continue
+            unseen_solutions[key] = candidate
+
+        if unseen_solutions:
+            keys = list(unseen_solutions.keys())
+            evaluated_costs, complete = self.bounded_solution_costs(
+                list(unseen_solutions.values()),
+                (lambda index, min_cost: is_rejected(keys[index], min_cost))
+                if self.early_abort else None,
+            )
+            for key, cost, is_complete in zip(keys, evaluated_costs, complete):
+                if is_complete:
+                    seen_solutions[key] = cost
+                    costs[key] = cost
+                    self.cost_lower_bounds.pop(key, None)
+                else:
+                    self.cost_lower_bounds[key] = cost
+                    lower_bounds[key] = cost
+
+        results = []
+        for candidate in candidates:
+            key = tuple(candidate)
+            results.append((candidate, costs.get(key, lower_bounds.get(key))))
+        return results
+
     def solution_cost(self, solution):
-        results = list(map(lambda webpage: self.test_solution(solution, webpage), self.webpages))
-        success_count = sum(results)  # Booleans are integers, who knew?
-        return (len(results) - success_count) / len(results)
+        return self.solution_costs([solution])[0]
+
+    def memoized_cost(self, solution, seen_solutions):
+        cost = seen_solutions.get(tuple(solution))
+        if cost is None:
+            cost = self.solution_cost(solution)
+            seen_solutions[tuple(solution)] = cost
+        return cost
+
+    def solution_costs(self, solutions):
+        costs, complete = self.bounded_solution_costs(solutions)
+        return costs
 
-    def test_solution(self, solution, webpage):
-        # String representation of lists happens to be the same for JS and Python
-        fact_names = list(map(lambda fact: fact.key, self.facts))
+    def bounded_solution_costs(self, solutions, is_rejected=None):
+        """
+        Return the costs of the given solutions, along with whether each
+        cost is exact.
 
-        webpage_facts = webpage.webpagefact_set.filter(fact__in=self.facts)
+        If is_rejected(index, min_cost) is given, webpages are evaluated a
+        chunk at a time and a solution is dropped once is_rejected returns
+        True for the lowest cost it could still end up with. Its returned
+        cost is then that lower bound.
+        """
+        self.metrics.add('candidates_evaluated', len(solutions))
+        # Stopping rules count mini-batch evaluations as the fraction of a
+        # full evaluation they cost.
+        self.evaluations += len(solutions) * len(self.scored_webpages) / len(self.webpages)
+        if self.offline_evaluator:
+            return self.offline_evaluator.solution_costs(solutions), [True] * len(solutions)
 
-        self.driver.get(f'http://webserver:8000{webpage.get_absolute_url()}')
-        self.driver.execute_script(self.ruleset.code)
-        result = self.driver.execute_script(
-            f'return window.ruleset.extractFacts(window.document, {fact_names}, {solution})'
+        webpages = self.ordered_webpages()
+        page_count = len(webpages)
+        chunk_size = self.pool_size if is_rejected else page_count
+        failures = [0] * len(solutions)
+        complete = [True] * len(solutions)
+        active = list(range(len(solutions)))
+        for start in range(0, page_count, chunk_size):
+            chunk = webpages[start:start + chunk_size]
+            for webpage, successes in self.test_webpages([solutions[i] for i in active], chunk):
+                for index, success in zip(active, successes):
+                    if not success:
+                        failures[index] += 1
+                        self.page_failures[webpage.id] += 1
+
+            if is_rejected:
+                still_active = []
+                for index in active:
+                    if is_rejected(index, failures[index] / page_count):
+                        complete[index] = start + chunk_size >= page_count
+                    else:
+                        still_active.append(index)
+                active = still_active
+                if not active:
+                    break
+
+        return [failure_count / page_count for failure_count in failures], complete
+
+    def ordered_webpages(self):
+        if self.page_order == TrainingRun.PAGE_ORDER_RANDOM:
+            webpages = list(self.scored_webpages)
+            self.page_order_random.shuffle(webpages)
+            return webpages
+        if self.page_order == TrainingRun.PAGE_ORDER_FAILURES:
+            # Pages that fail most often are most likely to settle a
+            # rejection early.
+            return sorted(self.scored_webpages, key=lambda webpage: -self.page_failures[webpage.id])
+        return self.scored_webpages
+
+    def test_webpages(self, solutions, webpages):
+        """
+        Return a (webpage, successes) pair for each of the given webpages,
+        where successes is a list of whether each of the given solutions
+        extracted the right facts from it.
+
+        With the result cache enabled, results are looked up and stored with
+        one batch of queries per call, and webpages are only loaded for the
+        solutions that weren't cached.
+        """
+        cached_results = {}
+        if self.result_cache:
+            cached_results = self.result_cache.get_many(webpages, solutions)
+            self.metrics.add('cache_hits', len(cached_results))
+            self.metrics.add('cache_misses', len(webpages) * len(solutions) - len(cached_results))
+
+        def test(driver, webpage):
+            missing = [
+                solution for solution in solutions
+                if (webpage.id, tuple(solution)) not in cached_results
+            ]
+            new_results = []
+            if missing:
+                new_results = self.extract_facts(driver, missing, webpage)
+            return webpage, list(zip(missing, new_results))
+
+        tested_webpages = self.map_shards(test, webpages)
+
+        if self.result_cache:
+            self.result_cache.set_many([
+                (webpage, solution, result)
+                for webpage, new_results in tested_webpages
+                for solution, result in new_results
+            ])
+
+        comparison_start = time.monotonic()
+        successes = []
+        for webpage, new_results in tested_webpages:
+            results = {tuple(solution): result for solution, result in new_results}
+            for solution in solutions:
+                key = tuple(solution)
+                if key not in results:
+                    results[key] = cached_results[(webpage.id, key)]
+            successes.append((webpage, [
+                self.ground_truth.is_correct(webpage, results[tuple(solution)])
+                for solution in solutions
+            ]))
+        self.metrics.add('comparison_time', time.monotonic() - comparison_start)
+        return successes
+
+    def map_shards(self, func, webpages):
+        """
+        Call func(driver, webpage) for every webpage, spreading the webpages
+        across the driver pool, and return the results. The results are not
+        necessarily in the same order as the webpages.
+
+        In resident pages mode a webpage is always sent to the same driver,
+        since that's where its window is.
+        """
+        def run_shard(driver, shard):
+            return [func(driver, webpage) for webpage in shard]
+
+        self.start_drivers()
+        if not self.executor:
+            return run_shard(self.drivers[0], webpages)
+
+        shards = [[] for driver in self.drivers]
+        for index, webpage in enumerate(webpages):
+            if self.resident_pages:
+                index = self.webpage_indexes[webpage.id]
+            shards[index % len(self.drivers)].append(webpage)
+
+        futures = [
+            self.executor.submit(run_shard, driver, shard)
+            for driver, shard in zip(self.drivers, shards)
+        ]
+        return [result for future in futures for result in future.result()]
+
+    def extract_features(self):
+        """
+        Store per-rule features for every training page whose features are
+        missing or out of date, for use by the offline evaluator.
+        """
+        def extract(driver, webpage):
+            self.load_webpage(driver, webpage)
+            return webpage, driver.execute_script(
+                EXTRACT_FEATURES_SCRIPT,
+                self.ground_truth.fact_keys,
+            )
+
+        stale = stale_webpages(self.ruleset, self.webpages)
+        if not stale:
+            return
+        for webpage, features in self.map_shards(extract, stale):
+            save_features(self.ruleset, webpage, features)
+
+    def extract_facts(self, driver, solutions, webpage):
+        load_start = time.monotonic()
+        self.load_webpage(driver, webpage)
+        script_start = time.monotonic()
+        # One round trip returns a list of fact results, one per solution.
+        results = driver.execute_script(
+            EXTRACT_FACTS_BATCH_SCRIPT,
+            self.ground_truth.fact_keys,
+            solutions,
         )
+        self.metrics.add('page_load_time', script_start - load_start)
+        self.metrics.add('script_time', time.monotonic() - script_start)
+        return results
 
-        for webpage_fact in webpage_facts:
-            if result[webpage_fact.fact.key] != json.loads(webpage_fact.fact_answer):
-                return False
+    def load_webpage(self, driver, webpage):
+        """
+        Make the given webpage, with the ruleset injected, the driver's
+        current window.
+
+        In resident pages mode every webpage gets its own window, which is
+        kept open and reused for later candidates. The webpages and ruleset
+        are read once, when the Tuner is created, so a page re-frozen or a
+        ruleset changed during a run is only picked up by the next run,
+        which loads every page again.
+        """
+        if self.resident_pages:
+            windows = self.resident_windows.setdefault(driver, {})
+            if webpage.id in windows:
+                driver.switch_to.window(windows[webpage.id])
+                return
+            if windows:
+                driver.execute_script(OPEN_WINDOW_SCRIPT)
+                driver.switch_to.window(driver.window_handles[-1])
+            # The first resident webpage takes over the driver's initial window.
+            windows[webpage.id] = driver.current_window_handle
+
+        driver.get(f'http://webserver:8000{webpage.get_absolute_url()}')
+        self.inject_ruleset(driver)
+
+    def inject_ruleset(self, driver):
+        """
+        Define window.ruleset in the driver's current page.
+
+        The ruleset's code only crosses the wire once per browser session:
+        the first page saves it in localStorage, and later pages run it from
+        there. Each page load still compiles and runs the code again, since
+        nothing a page defines survives navigating to the next one.
+        stored_rulesets remembers, per driver, whether it's saved (True), not
+        saved yet (missing), or can't be (False), in which case the code is
+        sent for every page as before.
+        """
+        stored = self.stored_rulesets.get(driver)
+        if stored:
+            status = driver.execute_script(LOAD_STORED_RULESET_SCRIPT, self.ruleset_storage_key)
+            if status == 'loaded':
+                return
+            stored = None if status == 'missing' else False
+            self.stored_rulesets[driver] = stored
 
-        return True
+        driver.execute_script(self.ruleset.code)
+        if stored is None:
+            self.stored_rulesets[driver] = bool(driver.execute_script(
+                STORE_RULESET_SCRIPT,
+                self.ruleset_storage_key,
+                self.ruleset.code,
+            ))
 
     def random_transition(self, solution):
         randomized_solution = solution.copy()
-        index = randrange(0, len(randomized_solution))
-        randomized_solution[index] = randomized_solution[index] + choice((1, -1))
+        index = self.random.randrange(0, len(randomized_solution))
+        randomized_solution[index] = randomized_solution[index] + self.random.choice((1, -1))
         return randomized_solution
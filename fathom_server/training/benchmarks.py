@@ -0,0 +1,168 @@
+"""
+Benchmarks of the training loop against synthetic corpora, using the fake
+driver so they measure the Tuner itself rather than Firefox.
+
+Each benchmark creates its corpus inside a transaction that is rolled
+back afterwards, so nothing is left in the database.
+"""
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from fathom_server.training.annealing import Tuner
+from fathom_server.training.fake_driver import FakeDriver, SyntheticRuleset
+from fathom_server.training.models import TrainingRun
+from fathom_server.training.runs import cooling_schedule
+from fathom_server.training.schedules import StoppingRule
+
+
+class Rollback(Exception):
+    pass
+
+
+def benchmark_tuner(
+    size,
+    cooling_steps=20,
+    steps_per_temp=10,
+    facts=1,
+    rules=4,
+    candidates=8,
+    seed=0,
+    ruleset_bytes=0,
+    schedule=TrainingRun.SCHEDULE_GEOMETRIC,
+    max_evaluations=None,
+    improvement_patience=None,
+    **tuner_options
+):
+    """
+    Anneal a synthetic corpus of `size` webpages and return measurements of
+    the run as a dict. schedule is a TrainingRun.SCHEDULE_* name, and the
+    remaining tuner_options are passed on to the Tuner.
+    """
+    synthetic = SyntheticRuleset(
+        ['synthetic-{}'.format(index) for index in range(facts)],
+        rules=rules,
+        candidates=candidates,
+        seed=seed,
+        code_bytes=ruleset_bytes,
+    )
+    step_metrics = []
+    results = {
+        'size': size,
+        'cooling_steps': cooling_steps,
+        'steps_per_temp': steps_per_temp,
+        'facts': facts,
+        'rules': rules,
+        'candidates': candidates,
+        'seed': seed,
+        'ruleset_bytes': ruleset_bytes,
+        'schedule': schedule,
+        'max_evaluations': max_evaluations,
+        'improvement_patience': improvement_patience,
+        'tuner_options': tuner_options,
+    }
+
+    try:
+        with transaction.atomic():
+            start = time.monotonic()
+            ruleset, webpages = synthetic.create_corpus(size)
+            results['corpus_seconds'] = time.monotonic() - start
+
+            drivers = []
+
+            def driver_factory():
+                driver = FakeDriver(synthetic)
+                drivers.append(driver)
+                return driver
+
+            with CaptureQueriesContext(connection) as queries:
+                start = time.monotonic()
+                tuner = Tuner(
+                    ruleset,
+                    webpages,
+                    cooling_steps=cooling_steps,
+                    steps_per_temp=steps_per_temp,
+                    cooling_schedule=cooling_schedule(schedule),
+                    stopping_rule=StoppingRule(
+                        max_evaluations=max_evaluations,
+                        patience=improvement_patience,
+                    ),
+                    telemetry_callback=step_metrics.append,
+                    driver_factory=driver_factory,
+                    seed=seed,
+                    **tuner_options
+                )
+                results['setup_seconds'] = time.monotonic() - start
+
+                start = time.monotonic()
+                best_solution, best_cost = tuner.anneal()
+                results['anneal_seconds'] = time.monotonic() - start
+            raise Rollback()
+    except Rollback:
+        pass
+
+    evaluated = sum(step['candidates_evaluated'] for step in step_metrics)
+    memo = tuner.memo
+    seconds = results['anneal_seconds']
+    results.update({
+        'best_cost': best_cost,
+        'stop_reason': tuner.stop_reason,
+        'cooling_steps_taken': len(step_metrics),
+        'candidates_evaluated': evaluated,
+        'candidates_per_second': evaluated / seconds if seconds else 0,
+        'page_evaluations_per_second': evaluated * size / seconds if seconds else 0,
+        'queries': len(queries),
+        'queries_per_evaluation': len(queries) / evaluated if evaluated else 0,
+        'script_bytes_per_evaluation': (
+            sum(driver.script_bytes for driver in drivers) / evaluated if evaluated else 0
+        ),
+        'memo_entries': len(memo),
+        'memo_bytes': memo.nbytes,
+        'memo_bytes_per_step': memo.nbytes / cooling_steps if cooling_steps else 0,
+        'memo_hits': memo.hits,
+        'memo_misses': memo.misses,
+        'memo_evictions': memo.evictions,
+        'page_load_seconds': sum(step['page_load_time'] for step in step_metrics),
+        'script_seconds': sum(step['script_time'] for step in step_metrics),
+        'comparison_seconds': sum(step['comparison_time'] for step in step_metrics),
+    })
+    return results
+
+
+# Measurements where a bigger value is a regression, and those where a
+# smaller one is.
+LOWER_IS_BETTER = (
+    'anneal_seconds',
+    'setup_seconds',
+    'queries_per_evaluation',
+    'script_bytes_per_evaluation',
+    'memo_bytes_per_step',
+)
+HIGHER_IS_BETTER = ('candidates_per_second', 'page_evaluations_per_second')
+
+
+def regressions(baseline, results, tolerance):
+    """
+    Compare results with baseline results for the same corpus size and
+    return a description of every measurement that got worse by more than
+    the given fraction.
+    """
+    found = []
+    for name in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+        old = baseline.get(name)
+        new = results.get(name)
+        if old is None or new is None:
+            continue
+        if name in LOWER_IS_BETTER:
+            worse = new > old * (1 + tolerance) and new - old > 1e-9
+        else:
+            worse = new < old * (1 - tolerance)
+        if worse:
+            found.append('{} pages: {} went from {:.4g} to {:.4g}'.format(
+                results['size'],
+                name,
+                old,
+                new,
+            ))
+    return found
@@ -0,0 +1,316 @@
+"""
+Warm browser sessions, kept for reuse across jobs.
+
+A BrowserPool keeps up to `size` idle sessions of one kind, started ahead of
+time, and leases them out. Freezing uses local Firefox instances driven over
+Marionette. Training and evaluation use WebDriver sessions on the Selenium
+server. Both go through the same acquire/release API, so a short job gets a
+browser that has already started and made its profile.
+
+Before a session is leased it is health-checked, and a dead one is replaced.
+When it comes back it is reset and then retired instead of kept if:
+
+- it has been leased max_uses times;
+- its browser uses more than max_memory bytes, where that can be measured;
+- the pool already has enough idle sessions.
+
+Each worker process has its own pools. A forked child process starts with
+empty pools and leaves its parent's sessions alone.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from marionette_driver.marionette import Marionette
+from selenium import webdriver
+from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+
+
+def process_tree_memory(pid):
+    """
+    Return the resident memory, in bytes, of a process and all its
+    descendants, such as Firefox's content processes. Return None where
+    /proc isn't available.
+    """
+    try:
+        children = {}
+        rss = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open('/proc/{}/stat'.format(entry)) as f:
+                    stat = f.read()
+            except (IOError, OSError):
+                continue  # The process has exited.
+            # The command name can contain spaces, so count fields from
+            # after it. They start with the state, then the parent's PID;
+            # the resident set size in pages is 21 fields later.
+            fields = stat[stat.rindex(')') + 2:].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+            rss[int(entry)] = int(fields[21])
+    except (IOError, OSError):
+        return None
+
+    total = 0
+    pending = [pid]
+    while pending:
+        process = pending.pop()
+        total += rss.get(process, 0)
+        pending.extend(children.get(process, []))
+    return total * os.sysconf('SC_PAGE_SIZE')
+
+
+class WebDriverSessions(object):
+    """Sessions on the Selenium server at SELENIUM_HUB_URL."""
+    def create(self):
+        return webdriver.Remote(
+            command_executor=settings.SELENIUM_HUB_URL,
+            desired_capabilities=DesiredCapabilities.FIREFOX,
+        )
+
+    def is_healthy(self, driver):
+        return driver.execute_script('return 1;') == 1
+
+    def reset(self, driver):
+        """Close every window but the first and leave it blank."""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.get('about:blank')
+
+    def memory(self, driver):
+        # The browser runs on another machine.
+        return None
+
+    def quit(self, driver):
+        driver.quit()
+
+
+class MarionetteSessions(object):
+    """
+    Headless Firefox instances started from FIREFOX_BIN, each listening for
+    Marionette on its own port, counting up from first_port.
+    """
+    def __init__(self, first_port=2828):
+        self.first_port = first_port
+        self.ports_in_use = set()
+        self.lock = threading.Lock()
+
+    def create(self):
+        with self.lock:
+            port = self.first_port
+            while port in self.ports_in_use:
+                port += 1
+            self.ports_in_use.add(port)
+        try:
+            client = Marionette(bin=settings.FIREFOX_BIN, port=port, headless=True)
+            client.start_session()
+        except Exception:
+            with self.lock:
+                self.ports_in_use.discard(port)
+            raise
+        return client
+
+    def is_healthy(self, client):
+        return client.execute_script('return 1;') == 1
+
+    def reset(self, client):
+        client.navigate('about:blank')
+
+    def memory(self, client):
+        try:
+            pid = client.instance.runner.process_handler.pid
+        except AttributeError:
+            return None
+        return process_tree_memory(pid)
+
+    def quit(self, client):
+        try:
+            client.cleanup()
+        finally:
+            with self.lock:
+                self.ports_in_use.discard(client.port)
+
+
+class PooledSession(object):
+    def __init__(self, session):
+        self.session = session
+        self.uses = 0
+        self.checked_at = time.time()
+        # The process that started the browser, and may quit it.
+        self.pid = os.getpid()
+
+
+class BrowserPool(object):
+    """
+    Leases out browser sessions of the kind `sessions` creates, keeping up
+    to `size` of them warm in between. Leasing never waits: when no idle
+    session is available, a new one is started, and sessions beyond `size`
+    are retired when they come back. Thread-safe.
+    """
+    def __init__(self, sessions, size=None, max_uses=None, max_memory=None, check_interval=None):
+        self.sessions = sessions
+        self.size = settings.BROWSER_POOL_SIZE if size is None else size
+        self.max_uses = settings.BROWSER_MAX_USES if max_uses is None else max_uses
+        self.max_memory = settings.BROWSER_MAX_MEMORY_BYTES if max_memory is None else max_memory
+        self.check_interval = (
+            settings.BROWSER_HEALTH_CHECK_INTERVAL if check_interval is None else check_interval
+        )
+        self.lock = threading.Lock()
+        self.idle = []
+        self.leased = {}
+        # Sessions a parent process had leased out when it forked this one.
+        self.inherited = {}
+        self.closed = False
+        self.pid = os.getpid()
+
+    def forget_parent_sessions(self):
+        """
+        After a fork, drop the sessions inherited from the parent process,
+        which still uses them, without quitting them. Ones it had leased out
+        are remembered, so they're recognised if they're released here. Call
+        with the lock held.
+        """
+        if os.getpid() != self.pid:
+            self.idle = []
+            self.inherited.update(self.leased)
+            self.leased = {}
+            self.pid = os.getpid()
+
+    def acquire(self):
+        """Lease a healthy session. Release it with release() when done."""
+        while True:
+            with self.lock:
+                self.forget_parent_sessions()
+                pooled = self.idle.pop() if self.idle else None
+            if pooled is None:
+                pooled = PooledSession(self.sessions.create())
+                break
+            if self.check(pooled):
+                break
+        pooled.uses += 1
+        with self.lock:
+            self.leased[id(pooled.session)] = pooled
+        return pooled.session
+
+    def release(self, session, discard=False):
+        """
+        Take back a leased session. With discard, or if it's worn out or
+        can't be reset, it's quit instead of being kept for reuse.
+        """
+        with self.lock:
+            self.forget_parent_sessions()
+            pooled = self.leased.pop(id(session), None) or self.inherited.pop(id(session), None)
+        if pooled is None or pooled.pid != os.getpid():
+            # Leased before a fork: the parent process still uses the
+            # browser, so it's neither ours to keep nor to quit.
+            return
+
+        keep = not (discard or self.closed) and (not self.max_uses or pooled.uses < self.max_uses)
+        if keep:
+            try:
+                self.sessions.reset(session)
+            except Exception:
+                keep = False
+        if keep and self.max_memory:
+            memory = self.sessions.memory(session)
+            keep = memory is None or memory <= self.max_memory
+
+        if keep:
+            with self.lock:
+                if len(self.idle) < self.size:
+                    pooled.checked_at = time.time()
+                    self.idle.append(pooled)
+                    return
+        self.quit(pooled)
+
+    @contextmanager
+    def lease(self):
+        """
+        Lease a session for the duration of a with block. If the block
+        raises, the session is discarded, since the browser may be wedged.
+        """
+        session = self.acquire()
+        try:
+            yield session
+        except Exception:
+            self.release(session, discard=True)
+            raise
+        self.release(session)
+
+    def check(self, pooled):
+        """Return whether a session is healthy, quitting it if it isn't."""
+        try:
+            healthy = self.sessions.is_healthy(pooled.session)
+        except Exception:
+            healthy = False
+        if healthy:
+            pooled.checked_at = time.time()
+        else:
+            self.quit(pooled)
+        return healthy
+
+    def maintain(self):
+        """
+        Health-check the sessions that have been idle for check_interval
+        seconds, replacing dead ones, and start sessions until `size` are
+        idle. Workers call this while they wait for work. If a browser won't
+        start, this gives up until next time; acquire() will raise the error.
+        """
+        now = time.time()
+        with self.lock:
+            self.forget_parent_sessions()
+            due = [pooled for pooled in self.idle if now - pooled.checked_at >= self.check_interval]
+            for pooled in due:
+                self.idle.remove(pooled)
+        for pooled in due:
+            if self.check(pooled):
+                with self.lock:
+                    self.idle.append(pooled)
+
+        while True:
+            with self.lock:
+                if len(self.idle) + len(self.leased) >= self.size:
+                    return
+            try:
+                pooled = PooledSession(self.sessions.create())
+            except Exception:
+                return
+            with self.lock:
+                self.idle.append(pooled)
+
+    def close(self):
+        """
+        Quit the idle sessions. From now on, sessions are quit when they're
+        released instead of being kept.
+        """
+        with self.lock:
+            self.forget_parent_sessions()
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for pooled in idle:
+            self.quit(pooled)
+
+    def quit(self, pooled):
+        try:
+            self.sessions.quit(pooled.session)
+        except Exception:
+            pass
+
+
+_webdriver_pool = None
+_webdriver_pool_lock = threading.Lock()
+
+
+def webdriver_pool():
+    """This process's pool of WebDriver sessions for training and evaluation."""
+    global _webdriver_pool
+    with _webdriver_pool_lock:
+        if _webdriver_pool is None:
+            _webdriver_pool = BrowserPool(WebDriverSessions())
+        return _webdriver_pool
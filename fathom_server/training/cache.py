@@ -0,0 +1,112 @@
+import json
+from hashlib import sha256
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from fathom_server.training.models import CachedResult
+
+
+class ResultCache:
+    """
+    Persistent cache of the facts a ruleset extracts from a webpage with a
+    given coefficient vector, shared by every training run.
+
+    Entries are keyed on the ruleset code hash, the frozen HTML version, the
+    fact keys and the coefficients, so changing the ruleset's code or
+    re-freezing a page means the old entries are never served again.
+
+    New results are held in memory until flush() stores them, which the
+    Tuner calls once per cooling step. Flushing also caps the table at
+    max_entries rows, evicting the oldest entries first.
+    """
+    LOOKUP_CHUNK_SIZE = 1000
+
+    def __init__(self, ruleset, fact_keys, max_entries=None):
+        self.ruleset = ruleset
+        self.ruleset_hash = ruleset.code_hash
+        self.fact_keys = list(fact_keys)
+        self.max_entries = max_entries or settings.EVALUATION_CACHE_MAX_ENTRIES
+        # Maps keys to the CachedResults flush() hasn't stored yet.
+        self.pending = {}
+
+        # Entries for older versions of this ruleset can never be hit again.
+        stale = CachedResult.objects.filter(ruleset=ruleset).exclude(ruleset_hash=self.ruleset_hash)
+        stale.delete()
+
+    def key(self, webpage, solution):
+        return sha256(json.dumps([
+            self.ruleset_hash,
+            webpage.id,
+            webpage.frozen_html_version,
+            self.fact_keys,
+            list(solution),
+        ]).encode('utf8')).hexdigest()
+
+    def get_many(self, webpages, solutions):
+        """
+        Return a dict mapping (webpage id, tuple(solution)) to the cached
+        extractFacts result for every pair that has one.
+        """
+        keys = {
+            self.key(webpage, solution): (webpage.id, tuple(solution))
+            for webpage in webpages
+            for solution in solutions
+        }
+        results = {}
+        for key, pair in keys.items():
+            if key in self.pending:
+                results[pair] = json.loads(self.pending[key].result)
+        key_list = [key for key in keys if key not in self.pending]
+
+        for start in range(0, len(key_list), self.LOOKUP_CHUNK_SIZE):
+            cached_results = CachedResult.objects.filter(
+                key__in=key_list[start:start + self.LOOKUP_CHUNK_SIZE],
+            ).values_list('key', 'result')
+            for key, result in cached_results:
+                results[keys[key]] = json.loads(result)
+        return results
+
+    def set_many(self, entries):
+        """Queue a list of (webpage, solution, result) entries for storing."""
+        for webpage, solution, result in entries:
+            key = self.key(webpage, solution)
+            self.pending[key] = CachedResult(
+                key=key,
+                ruleset=self.ruleset,
+                webpage=webpage,
+                ruleset_hash=self.ruleset_hash,
+                result=json.dumps(result),
+            )
+
+    def flush(self):
+        """Store the queued entries, then evict the oldest ones over the cap."""
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        while pending:
+            # Other workers may have stored some of the same results already.
+            key_list = list(pending.keys())
+            for start in range(0, len(key_list), self.LOOKUP_CHUNK_SIZE):
+                stored_keys = CachedResult.objects.filter(
+                    key__in=key_list[start:start + self.LOOKUP_CHUNK_SIZE],
+                ).values_list('key', flat=True)
+                for key in stored_keys:
+                    del pending[key]
+            try:
+                with transaction.atomic():
+                    CachedResult.objects.bulk_create(pending.values())
+            except IntegrityError:
+                # Another worker stored one of them between the check and
+                # the insert; check again.
+                continue
+            break
+        self.evict()
+
+    def evict(self):
+        # IDs have gaps where rows were deleted, so find the newest row over
+        # the cap instead of counting back from the newest ID.
+        ids = CachedResult.objects.order_by('-id').values_list('id', flat=True)
+        for cutoff in ids[self.max_entries:self.max_entries + 1]:
+            CachedResult.objects.filter(id__lte=cutoff).delete()
@@ -0,0 +1,204 @@
+"""
+Scoring coefficients on held-out webpages: a training run's testing pages,
+and k-fold cross-validation over its training pages.
+
+Everything runs on one EvaluationSession, a pool of browsers over all the
+pages involved. The cross-validation folds anneal in parallel threads on
+that pool. In resident pages mode a page lives in one tab of one browser
+for the whole session, so every fold and the final evaluation reuse it
+without loading it or injecting the ruleset again.
+"""
+import json
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from threading import Lock
+
+from django.db import connection
+
+from fathom_server.training.annealing import GroundTruth, Tuner
+from fathom_server.training.offline import OfflineEvaluator
+
+
+# Most common (expected, actual) pairs kept per fact.
+MAX_CONFUSION_ENTRIES = 50
+
+
+class EvaluationSession(Tuner):
+    """
+    Owns the browser pool that evaluations and cross-validation folds share.
+    Each driver is used by one thread at a time, whichever fold asks for it.
+    """
+    def __init__(self, ruleset, webpages, concurrency=1, **tuner_options):
+        super().__init__(ruleset, webpages, **tuner_options)
+        self.concurrency = max(1, concurrency)
+        self.driver_locks = {}
+
+    def start(self):
+        super().start()
+        # Folds take the drivers from here, so start them up front.
+        self.start_drivers()
+
+    def start_drivers(self):
+        if self.drivers:
+            return
+        super().start_drivers()
+        if self.pool_size > 1 and self.concurrency > 1:
+            # Enough threads that one fold waiting for a driver doesn't hold
+            # up the others.
+            self.executor.shutdown()
+            self.executor = ThreadPoolExecutor(max_workers=self.pool_size * self.concurrency)
+
+    def map_shards(self, func, webpages):
+        def locked(driver, webpage):
+            # setdefault is atomic, so threads can't end up with different locks.
+            with self.driver_locks.setdefault(driver, Lock()):
+                return func(driver, webpage)
+        return super().map_shards(locked, webpages)
+
+
+class FoldTuner(Tuner):
+    """Anneals one cross-validation fold using an EvaluationSession's browsers."""
+    def __init__(self, session, webpages, **tuner_options):
+        super().__init__(session.ruleset, webpages, **tuner_options)
+        self.session = session
+
+    def start(self):
+        self.drivers = self.session.drivers
+        self.executor = None
+        self.resident_windows = self.session.resident_windows
+        self.stored_rulesets = self.session.stored_rulesets
+        self.cost_lower_bounds = self.new_lower_bounds()
+        self.page_failures = Counter()
+        self.offline_evaluator = None
+        if self.offline:
+            # The session already extracted features for every page.
+            self.offline_evaluator = OfflineEvaluator(
+                self.ruleset,
+                self.webpages,
+                self.ground_truth,
+            )
+
+    def stop(self):
+        pass
+
+    def map_shards(self, func, webpages):
+        return self.session.map_shards(func, webpages)
+
+
+def evaluate(session, coefficients, webpages):
+    """
+    Run extractFacts with the given coefficients on every webpage, spread
+    across the session's browsers, and score the results against the
+    webpages' answers.
+    """
+    webpages = list(webpages)
+    ground_truth = GroundTruth(session.facts, webpages)
+
+    def extract(driver, webpage):
+        return webpage, session.extract_facts(driver, [coefficients], webpage)[0]
+
+    return score(ground_truth, session.map_shards(extract, webpages))
+
+
+def score(ground_truth, results):
+    """
+    Summarize (webpage, extractFacts result) pairs: the fraction of pages
+    with every fact right, and for each fact its accuracy and the counts of
+    each (expected, actual) pair of answers.
+    """
+    facts = {
+        key: {'answered': 0, 'correct': 0, 'confusion': Counter()}
+        for key in ground_truth.fact_keys
+    }
+    correct_pages = 0
+    for webpage, result in results:
+        page_correct = True
+        for key, expected in ground_truth.checks[webpage.id]:
+            actual = result.get(key)
+            fact = facts[key]
+            fact['answered'] += 1
+            if actual == expected:
+                fact['correct'] += 1
+            else:
+                page_correct = False
+            # Answers can be lists or objects, so count them as JSON.
+            fact['confusion'][(json.dumps(expected), json.dumps(actual))] += 1
+        correct_pages += page_correct
+
+    page_count = len(results)
+    return {
+        'pages': page_count,
+        'correct_pages': correct_pages,
+        'accuracy': correct_pages / page_count if page_count else None,
+        'facts': {
+            key: {
+                'answered': fact['answered'],
+                'correct': fact['correct'],
+                'accuracy': fact['correct'] / fact['answered'] if fact['answered'] else None,
+                'confusion': [
+                    {'expected': json.loads(expected), 'actual': json.loads(actual), 'count': count}
+                    for (expected, actual), count
+                    in fact['confusion'].most_common(MAX_CONFUSION_ENTRIES)
+                ],
+            }
+            for key, fact in facts.items()
+        },
+    }
+
+
+def split_folds(webpages, folds, seed=0):
+    """Shuffle the webpages reproducibly and deal them into folds."""
+    webpages = sorted(webpages, key=lambda webpage: webpage.id)
+    Random(seed).shuffle(webpages)
+    return [webpages[index::folds] for index in range(folds)]
+
+
+def cross_validate(session, webpages, folds, seed=0, **tuner_options):
+    """
+    k-fold cross-validation: anneal on all but one fold of the webpages and
+    evaluate the result on the remaining fold, for each fold in parallel.
+    The split and each fold's annealing are seeded from `seed`, so the
+    results can be reproduced.
+    """
+    fold_pages = split_folds(webpages, folds, seed)
+    seeds = Random(seed)
+    tuners = [
+        FoldTuner(
+            session,
+            [
+                webpage
+                for other, pages in enumerate(fold_pages) if other != index
+                for webpage in pages
+            ],
+            seed=seeds.getrandbits(64),
+            **tuner_options
+        )
+        for index in range(folds)
+    ]
+
+    def run_fold(index):
+        try:
+            coefficients, training_cost = tuners[index].anneal()
+            return {
+                'coefficients': coefficients,
+                'training_cost': training_cost,
+                'testing': evaluate(session, coefficients, fold_pages[index]),
+            }
+        finally:
+            # Each thread gets its own database connection.
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=folds) as executor:
+        fold_results = list(executor.map(run_fold, range(folds)))
+
+    accuracies = [
+        fold['testing']['accuracy'] for fold in fold_results
+        if fold['testing']['accuracy'] is not None
+    ]
+    return {
+        'folds': fold_results,
+        'mean_accuracy': statistics.mean(accuracies) if accuracies else None,
+        'accuracy_stdev': statistics.stdev(accuracies) if len(accuracies) > 1 else None,
+    }
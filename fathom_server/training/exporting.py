@@ -0,0 +1,118 @@
+"""
+Streaming export of frozen webpages and their fact answers as JSON Lines,
+in the same format training.importing reads, so a corpus can be trained on
+somewhere without access to this server.
+
+Webpages and answers are read with .iterator() in webpage ID order and
+merged as they go, so memory use depends on the largest page rather than
+the size of the corpus.
+"""
+import json
+from datetime import datetime, time
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from fathom_server.training.models import Fact, Webpage, WebpageFact
+from fathom_server.training.subresources import inline_subresources
+
+
+def export_factset(factset, since=None, known_hashes=()):
+    """
+    Yield a record for every frozen webpage with an answer to at least one
+    of the fact set's facts.
+    """
+    facts = factset.facts.all()
+    webpages = Webpage.objects.annotate(answered=Exists(
+        WebpageFact.objects.filter(webpage=OuterRef('pk'), fact__in=facts)
+    )).filter(answered=True)
+    return export_webpages(webpages, facts, since=since, known_hashes=known_hashes)
+
+
+def export_training_run(training_run, since=None, known_hashes=()):
+    """
+    Yield a record for every frozen training and testing page of a training
+    run, with answers to the facts of its ruleset's fact set. Records carry
+    a "split" of "training" or "testing".
+    """
+    fact_set = training_run.ruleset.fact_set
+    facts = fact_set.facts.all() if fact_set else Fact.objects.none()
+    for split, webpages in (
+        ('training', training_run.training_pages.all()),
+        ('testing', training_run.testing_pages.all()),
+    ):
+        for record in export_webpages(webpages, facts, since=since, known_hashes=known_hashes):
+            record['split'] = split
+            yield record
+
+
+def export_webpages(webpages, facts, since=None, known_hashes=()):
+    """
+    Yield {"url", "frozen_html", "frozen_html_sha256", "frozen_at", "facts"}
+    records for the frozen webpages among webpages. Pass since to only
+    export pages frozen since then, and known_hashes to leave out the HTML
+    of pages the consumer already has. Extracted subresources are inlined
+    again, so the HTML stands alone.
+    """
+    facts_by_id = {fact.id: fact for fact in facts}
+    webpages = webpages.exclude(frozen_html='').order_by('id')
+    if since is not None:
+        webpages = webpages.filter(frozen_at__gte=since)
+
+    answers = WebpageFact.objects.filter(
+        webpage__in=webpages.values('id'),
+        fact__in=list(facts_by_id),
+    ).order_by('webpage_id').iterator()
+    answer = next(answers, None)
+
+    for webpage in webpages.iterator():
+        # Both querysets are in webpage ID order, so each page's answers are
+        # the next ones in the stream.
+        webpage_facts = {}
+        while answer is not None and answer.webpage_id <= webpage.id:
+            if answer.webpage_id == webpage.id:
+                fact = facts_by_id[answer.fact_id]
+                webpage_facts[fact.key] = decode_answer(fact, answer.fact_answer)
+            answer = next(answers, None)
+
+        record = {
+            'url': webpage.url,
+            'frozen_html_sha256': webpage.frozen_html_sha256,
+            'frozen_at': webpage.frozen_at.isoformat() if webpage.frozen_at else None,
+            'facts': webpage_facts,
+        }
+        if not webpage.frozen_html_sha256 or webpage.frozen_html_sha256 not in known_hashes:
+            with webpage.open_frozen_html() as f:
+                record['frozen_html'] = inline_subresources(f.read()).decode('utf8')
+        yield record
+
+
+def parse_since(value):
+    """
+    Parse an ISO 8601 date or date and time for the since argument of the
+    exports, in the current time zone unless it gives one.
+    """
+    since = parse_datetime(value)
+    if since is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError('Invalid timestamp: {}'.format(value))
+        since = datetime.combine(date, time())
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def decode_answer(fact, fact_answer):
+    try:
+        return fact.decode_answer(fact_answer)
+    except ValueError:
+        # Leave hand-typed answers that don't suit the fact's type for the
+        # consumer to deal with.
+        return fact_answer
+
+
+def to_jsonl(records):
+    for record in records:
+        yield json.dumps(record, sort_keys=True) + '\n'
@@ -0,0 +1,186 @@
+"""
+A stand-in for a Selenium WebDriver that runs a synthetic ruleset in Python
+instead of a browser, so the training loop can be exercised and
+benchmarked without Firefox or a Selenium server.
+
+Pass ``driver_factory=lambda: FakeDriver(synthetic_ruleset)`` to Tuner.
+"""
+import json
+import re
+from random import Random
+
+from fathom_server.training.annealing import (
+    EXTRACT_FACTS_BATCH_SCRIPT,
+    INITIAL_COEFFICIENTS_SCRIPT,
+    LOAD_STORED_RULESET_SCRIPT,
+    OPEN_WINDOW_SCRIPT,
+    STORE_RULESET_SCRIPT,
+)
+from fathom_server.training.models import Fact, FactSet, Ruleset, Webpage, WebpageFact
+from fathom_server.training.offline import EXTRACT_FEATURES_SCRIPT
+
+
+class SyntheticRuleset:
+    """
+    A ruleset whose candidate elements and rule scores are generated from
+    each webpage's ID, so they're the same in every driver and process.
+
+    For every fact, a page has `candidates` candidate elements with `rules`
+    scores each. Like a real Fathom ruleset, extractFacts answers with the
+    candidate with the highest sum of scores times coefficients, breaking
+    ties in favour of the first. The answers are strings like
+    "candidate-3". The ruleset's code is padded to code_bytes, to stand in
+    for a real ruleset bundled with Fathom.
+    """
+    def __init__(self, fact_keys, rules=4, candidates=8, seed=0, code_bytes=0):
+        self.fact_keys = list(fact_keys)
+        self.rules = rules
+        self.candidates = candidates
+        self.seed = seed
+        self.code_bytes = code_bytes
+
+    def initial_coefficients(self):
+        return [1] * self.rules
+
+    def target_coefficients(self):
+        """Coefficients that get every page right, used for the ground truth."""
+        random = Random(self.seed)
+        return [random.randint(-10, 10) for _ in range(self.rules)]
+
+    def features(self, webpage_id, fact_key):
+        random = Random('{}:{}:{}'.format(self.seed, webpage_id, fact_key))
+        return [
+            [random.random() for _ in range(self.rules)]
+            for _ in range(self.candidates)
+        ]
+
+    def answer(self, features, coefficients):
+        best_index = 0
+        best_score = None
+        for index, scores in enumerate(features):
+            score = sum(score * coefficient for score, coefficient in zip(scores, coefficients))
+            if best_score is None or score > best_score:
+                best_index = index
+                best_score = score
+        return 'candidate-{}'.format(best_index)
+
+    def extract_facts(self, webpage_id, fact_keys, coefficients):
+        return {
+            key: self.answer(self.features(webpage_id, key), coefficients)
+            for key in fact_keys
+        }
+
+    def extract_features(self, webpage_id, fact_keys):
+        return {
+            key: {
+                'features': self.features(webpage_id, key),
+                'answers': ['candidate-{}'.format(index) for index in range(self.candidates)],
+                'default': None,
+            }
+            for key in fact_keys
+        }
+
+    def create_corpus(self, size, batch_size=1000):
+        """
+        Create a ruleset, its facts and `size` webpages answered according
+        to target_coefficients, and return the ruleset and webpages. The
+        webpages have no frozen HTML; the fake driver doesn't need any.
+        """
+        fact_set = FactSet.objects.create(name='Synthetic')
+        facts = []
+        for key in self.fact_keys:
+            fact, _ = Fact.objects.get_or_create(
+                key=key,
+                defaults={'question': 'Synthetic fact {}'.format(key), 'type': Fact.TYPE_STRING},
+            )
+            facts.append(fact)
+        fact_set.facts.set(facts)
+        ruleset = Ruleset.objects.create(
+            name='Synthetic',
+            code='// Synthetic ruleset {}\n'.format(self.seed).ljust(self.code_bytes, '/'),
+            fact_set=fact_set,
+        )
+
+        target = self.target_coefficients()
+        url_prefix = 'https://synthetic.invalid/{}/'.format(self.seed)
+        for start in range(0, size, batch_size):
+            Webpage.objects.bulk_create([
+                Webpage(url='{}{}'.format(url_prefix, index))
+                for index in range(start, min(size, start + batch_size))
+            ])
+        webpages = list(Webpage.objects.filter(url__startswith=url_prefix).order_by('id'))
+
+        for start in range(0, len(webpages), batch_size):
+            WebpageFact.objects.bulk_create([
+                WebpageFact(
+                    webpage=webpage,
+                    fact=fact,
+                    fact_answer=json.dumps(
+                        self.answer(self.features(webpage.id, fact.key), target),
+                    ),
+                )
+                for webpage in webpages[start:start + batch_size]
+                for fact in facts
+            ])
+        return ruleset, webpages
+
+
+class FakeSwitchTo:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def window(self, handle):
+        self.driver.current_window_handle = handle
+
+
+class FakeDriver:
+    """
+    Implements the parts of the WebDriver API the Tuner uses. Loading a
+    frozen webpage URL just remembers the webpage ID for the window; the
+    scripts the Tuner runs are answered by the synthetic ruleset. All pages
+    share one localStorage, and script_bytes counts the characters of the
+    scripts and arguments sent, as a measure of what would cross the wire.
+    """
+    WEBPAGE_ID_PATTERN = re.compile(r'/webpages/(\d+)/')
+
+    def __init__(self, ruleset):
+        self.ruleset = ruleset
+        self.window_handles = ['window-0']
+        self.current_window_handle = 'window-0'
+        self.switch_to = FakeSwitchTo(self)
+        self.webpage_ids = {}
+        self.local_storage = {}
+        self.script_bytes = 0
+
+    def get(self, url):
+        match = self.WEBPAGE_ID_PATTERN.search(url)
+        self.webpage_ids[self.current_window_handle] = int(match.group(1)) if match else None
+
+    def execute_script(self, script, *args):
+        self.script_bytes += len(script) + len(json.dumps(args))
+        webpage_id = self.webpage_ids.get(self.current_window_handle)
+        if script == EXTRACT_FACTS_BATCH_SCRIPT:
+            fact_keys, solutions = args
+            return [
+                self.ruleset.extract_facts(webpage_id, fact_keys, solution)
+                for solution in solutions
+            ]
+        if script == EXTRACT_FEATURES_SCRIPT:
+            return self.ruleset.extract_features(webpage_id, args[0])
+        if script == INITIAL_COEFFICIENTS_SCRIPT:
+            return self.ruleset.initial_coefficients()
+        if script == STORE_RULESET_SCRIPT:
+            key, code = args
+            self.local_storage = {key: code}
+            return True
+        if script == LOAD_STORED_RULESET_SCRIPT:
+            return 'loaded' if args[0] in self.local_storage else 'missing'
+        if script == OPEN_WINDOW_SCRIPT:
+            # Like window.open(), adds a window without switching to it.
+            self.window_handles.append('window-{}'.format(len(self.window_handles)))
+            return None
+        # Anything else is the ruleset's code being injected.
+        return None
+
+    def quit(self):
+        pass
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from fathom_server.training.models import Webpage
+
+
+def enqueue_webpages(queryset):
+    return queryset.update(
+        freeze_status=Webpage.FREEZE_STATUS_QUEUED,
+        freeze_queued_at=timezone.now(),
+        freeze_error='',
+    )
+
+
+def claim_webpage():
+    """
+    Mark the oldest webpage queued for freezing as being frozen and return
+    it, or return None if the queue is empty.
+    """
+    with transaction.atomic():
+        webpage = (
+            Webpage.objects
+            .select_for_update(skip_locked=True)
+            .filter(freeze_status=Webpage.FREEZE_STATUS_QUEUED)
+            .order_by('freeze_queued_at', 'id')
+            .first()
+        )
+        if webpage is None:
+            return None
+
+        webpage.freeze_status = Webpage.FREEZE_STATUS_FREEZING
+        webpage.save(update_fields=['freeze_status'])
+        return webpage
+
+
+class Freezer(threading.Thread):
+    """
+    Freezes queued webpages one at a time, each in a headless Firefox leased
+    from `pool`, a BrowserPool of MarionetteSessions, until told to stop, or
+    until the queue is empty if stop_when_empty is set. Run several of these
+    at once, sharing a pool, to freeze pages concurrently.
+    """
+    def __init__(self, pool, idle_time, timeout, poll_interval, stop_when_empty, log=None):
+        super(Freezer, self).__init__()
+        self.daemon = True
+        self.pool = pool
+        self.idle_time = idle_time
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.stop_when_empty = stop_when_empty
+        self.log = log or (lambda message: None)
+        self.stopping = threading.Event()
+
+        with open(os.path.join(settings.BASE_DIR, 'build', 'freeze.bundle.js')) as f:
+            self.freeze_script = f.read()
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self):
+        try:
+            while not self.stopping.is_set():
+                webpage = claim_webpage()
+                if webpage is None:
+                    if self.stop_when_empty:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                self.freeze(webpage)
+        finally:
+            connection.close()
+
+    def freeze(self, webpage):
+        self.log('Freezing {}...'.format(webpage.url))
+        start = time.time()
+        client = None
+        try:
+            client = self.pool.acquire()
+            client.navigate(webpage.url)
+            navigated = time.time()
+            results = client.execute_async_script(
+                self.freeze_script,
+                script_args=(self.idle_time, self.timeout),
+                # Leave freeze-dry time to serialize the page after waiting.
+                script_timeout=self.timeout + 1000 * 60 * 5,
+            )
+        except Exception:
+            # The browser may be wedged, so don't let another page have it.
+            if client is not None:
+                self.pool.release(client, discard=True)
+            self.fail(webpage, start)
+            return
+        self.pool.release(client)
+
+        try:
+            timings = {'navigate': (navigated - start) * 1000}
+            timings.update(results['timings'])
+            webpage.save_frozen_html(results['html'])
+            webpage.freeze_status = Webpage.FREEZE_STATUS_FROZEN
+            webpage.frozen_at = timezone.now()
+            webpage.freeze_duration = time.time() - start
+            webpage.freeze_timings = json.dumps(timings)
+            webpage.save(update_fields=[
+                'frozen_html',
+                'frozen_html_encoding',
+                'frozen_html_size',
+                'frozen_html_sha256',
+                'freeze_status',
+                'frozen_at',
+                'freeze_duration',
+                'freeze_timings',
+            ])
+        except Exception:
+            # Otherwise the page would stay marked as freezing forever.
+            self.fail(webpage, start)
+            return
+        self.log('Froze {} in {:.1f}s'.format(webpage.url, webpage.freeze_duration))
+
+    def fail(self, webpage, start):
+        webpage.freeze_status = Webpage.FREEZE_STATUS_FAILED
+        webpage.freeze_duration = time.time() - start
+        webpage.freeze_error = traceback.format_exc()
+        webpage.save(update_fields=['freeze_status', 'freeze_duration', 'freeze_error'])
+        self.log('Failed to freeze {}'.format(webpage.url))
@@ -0,0 +1,179 @@
+"""
+Bulk import of webpages and fact answers from JSON Lines. Each line is an
+object like:
+
+    {"url": "https://example.com/", "frozen_html": "<html>...", "facts": {"title": "Example"}}
+
+frozen_html and facts are optional. Fact answers are keyed by Fact.key
+and checked against Fact.type. Lines are read lazily and written in
+batches, one transaction per batch, so memory use doesn't grow with the
+size of the input.
+"""
+import json
+from hashlib import sha256
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.utils import timezone
+
+from fathom_server.training.models import Fact, Webpage, WebpageFact
+from fathom_server.training.subresources import extract_subresources
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+class ImportResult(object):
+    def __init__(self):
+        self.created_webpages = 0
+        self.frozen_webpages = 0
+        self.created_answers = 0
+        self.updated_answers = 0
+        self.errors = []
+
+    def __str__(self):
+        return (
+            'Created {} webpages, stored HTML for {}, created {} answers and '
+            'updated {}. Skipped {} invalid lines.'
+        ).format(
+            self.created_webpages,
+            self.frozen_webpages,
+            self.created_answers,
+            self.updated_answers,
+            len(self.errors),
+        )
+
+
+def answer_is_valid(fact, value):
+    if value is None:
+        return True
+    if fact.type == Fact.TYPE_BOOLEAN:
+        return isinstance(value, bool)
+    if fact.type == Fact.TYPE_NUMBER:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return not isinstance(value, (dict, list))
+
+
+def parse_record(line, facts_by_key, validate_url=URLValidator()):
+    if isinstance(line, bytes):
+        line = line.decode('utf8')
+    try:
+        record = json.loads(line)
+    except ValueError as err:
+        raise InvalidRecord('Invalid JSON: {}'.format(err))
+    if not isinstance(record, dict):
+        raise InvalidRecord('Expected an object.')
+
+    url = record.get('url')
+    try:
+        validate_url(url)
+    except ValidationError:
+        raise InvalidRecord('Invalid URL: {!r}'.format(url))
+
+    frozen_html = record.get('frozen_html')
+    if frozen_html is not None and not isinstance(frozen_html, type(u'')):
+        raise InvalidRecord('frozen_html must be a string.')
+
+    answers = record.get('facts') or {}
+    if not isinstance(answers, dict):
+        raise InvalidRecord('facts must be an object.')
+    for key, value in answers.items():
+        fact = facts_by_key.get(key)
+        if fact is None:
+            raise InvalidRecord('Unknown fact: {!r}'.format(key))
+        if not answer_is_valid(fact, value):
+            raise InvalidRecord('Answer for {!r} is not a {}: {!r}'.format(key, fact.type, value))
+
+    return url, frozen_html, answers
+
+
+def import_jsonl(lines, batch_size=1000):
+    """
+    Import webpages and fact answers from an iterable of JSON Lines. Pages
+    are matched by URL; answers replace any existing answer to the same
+    fact. Invalid lines are skipped and listed in the result's errors as
+    (line number, message).
+    """
+    facts_by_key = {fact.key: fact for fact in Fact.objects.all()}
+    result = ImportResult()
+
+    numbered_lines = enumerate(lines, start=1)
+    while True:
+        batch = list(islice(numbered_lines, batch_size))
+        if not batch:
+            break
+
+        records = {}
+        for line_number, line in batch:
+            if not line.strip():
+                continue
+            try:
+                url, frozen_html, answers = parse_record(line, facts_by_key)
+            except InvalidRecord as err:
+                result.errors.append((line_number, str(err)))
+                continue
+
+            # Later lines for the same URL win.
+            _, previous_html, previous_answers = records.get(url, (None, None, {}))
+            previous_answers.update(answers)
+            records[url] = (url, frozen_html or previous_html, previous_answers)
+
+        with transaction.atomic():
+            import_batch(list(records.values()), facts_by_key, result)
+
+    return result
+
+
+def html_is_unchanged(webpage, html):
+    html = extract_subresources(html.encode('utf8'), save=False)
+    return webpage.pk and webpage.frozen_html_sha256 == sha256(html).hexdigest()
+
+
+def import_batch(records, facts_by_key, result):
+    urls = [url for url, _, _ in records]
+    webpages = {webpage.url: webpage for webpage in Webpage.objects.filter(url__in=urls)}
+
+    new_webpages = []
+    for url, frozen_html, _ in records:
+        webpage = webpages.get(url)
+        if webpage is None:
+            webpage = Webpage(url=url)
+            new_webpages.append(webpage)
+        if frozen_html is not None and not html_is_unchanged(webpage, frozen_html):
+            webpage.save_frozen_html(frozen_html)
+            webpage.freeze_status = Webpage.FREEZE_STATUS_FROZEN
+            webpage.frozen_at = timezone.now()
+            result.frozen_webpages += 1
+            if webpage.pk:
+                webpage.save()
+
+    if new_webpages:
+        Webpage.objects.bulk_create(new_webpages)
+        result.created_webpages += len(new_webpages)
+        # Not every database returns the new IDs from bulk_create.
+        webpages = {webpage.url: webpage for webpage in Webpage.objects.filter(url__in=urls)}
+
+    webpage_ids = [webpage.id for webpage in webpages.values()]
+    existing_answers = {
+        (answer.webpage_id, answer.fact_id): answer
+        for answer in WebpageFact.objects.filter(webpage_id__in=webpage_ids)
+    }
+
+    new_answers = []
+    for url, _, answers in records:
+        webpage = webpages[url]
+        for key, value in answers.items():
+            fact = facts_by_key[key]
+            fact_answer = json.dumps(value)
+            answer = existing_answers.get((webpage.id, fact.id))
+            if answer is None:
+                new_answers.append(WebpageFact(webpage=webpage, fact=fact, fact_answer=fact_answer))
+            elif answer.fact_answer != fact_answer:
+                WebpageFact.objects.filter(id=answer.id).update(fact_answer=fact_answer)
+                result.updated_answers += 1
+
+    WebpageFact.objects.bulk_create(new_answers)
+    result.created_answers += len(new_answers)
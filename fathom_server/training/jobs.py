@@ -0,0 +1,177 @@
+import json
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from fathom_server.training.models import TrainingRun, TrainingRunStep
+
+
+def orphaned_runs():
+    """
+    A filter for running training runs whose lease has expired: their worker was
+    killed, or lost the database, without giving them back.
+    """
+    expired = timezone.now() - timedelta(seconds=settings.TRAINING_RUN_LEASE_SECONDS)
+    return Q(status=TrainingRun.STATUS_RUNNING) & (
+        Q(heartbeat_at__lt=expired) | Q(heartbeat_at__isnull=True)
+    )
+
+
+def enqueue_training_run(training_run, resume=False):
+    """
+    Queue a training run and return True, or return False without changing
+    anything if a worker is running it. A run orphaned by its worker can be
+    queued again. With resume, a run that has a checkpoint carries on from
+    there instead of starting over.
+    """
+    with transaction.atomic():
+        locked = TrainingRun.objects.select_for_update().filter(id=training_run.id)
+        status = locked.values_list('status', flat=True).get()
+        if status == TrainingRun.STATUS_RUNNING and not locked.filter(orphaned_runs()).exists():
+            return False
+        reset_training_run(training_run, resume)
+    return True
+
+
+def reset_training_run(training_run, resume):
+    training_run.status = TrainingRun.STATUS_QUEUED
+    training_run.queued_at = timezone.now()
+    training_run.started_at = None
+    training_run.finished_at = None
+    training_run.error = ''
+    training_run.stop_reason = ''
+    training_run.test_results = ''
+    training_run.cross_validation_results = ''
+    if resume and training_run.checkpoint:
+        step = json.loads(training_run.checkpoint)['step']
+        training_run.progress = step
+        training_run.save()
+        # Steps after the checkpoint will be taken, and recorded, again.
+        training_run.steps.filter(step__gt=step).delete()
+    else:
+        training_run.progress = 0
+        training_run.checkpoint = ''
+        training_run.checkpointed_at = None
+        training_run.save()
+        # Telemetry from an earlier attempt would be confused with the new one.
+        training_run.steps.all().delete()
+
+
+def claim_training_run():
+    """
+    Mark the oldest queued training run as running and return it, or
+    return None if the queue is empty. Rows locked by other workers are
+    skipped, so any number of workers can poll the queue at once.
+
+    Orphaned runs count as queued, and carry on from their last checkpoint.
+    The worker has to keep renewing its lease on the run with a Heartbeat.
+    """
+    with transaction.atomic():
+        training_run = (
+            TrainingRun.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(status=TrainingRun.STATUS_QUEUED) | orphaned_runs())
+            .order_by('queued_at', 'id')
+            .first()
+        )
+        if training_run is None:
+            return None
+
+        if training_run.status == TrainingRun.STATUS_RUNNING:
+            reset_training_run(training_run, resume=True)
+        training_run.status = TrainingRun.STATUS_RUNNING
+        training_run.started_at = timezone.now()
+        training_run.heartbeat_at = training_run.started_at
+        training_run.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+        return training_run
+
+
+def requeue_training_run(training_run):
+    """
+    Give back a run its worker is stopping in the middle of, for the next
+    worker to carry on from its last checkpoint.
+    """
+    with transaction.atomic():
+        # The checkpoint was saved behind the instance's back.
+        training_run.refresh_from_db()
+        if training_run.status == TrainingRun.STATUS_RUNNING:
+            reset_training_run(training_run, resume=True)
+
+
+class Heartbeat(threading.Thread):
+    """
+    Renews a worker's lease on the training run it's running every
+    TRAINING_RUN_HEARTBEAT_INTERVAL seconds, until stopped.
+    """
+    def __init__(self, training_run):
+        super(Heartbeat, self).__init__()
+        self.daemon = True
+        self.training_run = training_run
+        self.stopping = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopping.wait(settings.TRAINING_RUN_HEARTBEAT_INTERVAL):
+                try:
+                    TrainingRun.objects.filter(
+                        id=self.training_run.id,
+                        status=TrainingRun.STATUS_RUNNING,
+                    ).update(heartbeat_at=timezone.now())
+                except Exception:
+                    # Try again next time; the lease outlasts a few misses.
+                    traceback.print_exc()
+                    connection.close()
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+
+def update_progress(training_run, progress):
+    # Only touch the progress column so we don't clobber admin edits made
+    # while the run is going.
+    TrainingRun.objects.filter(id=training_run.id).update(progress=progress)
+
+
+def record_step(training_run, telemetry):
+    """
+    Store the metrics of one cooling step, as produced by
+    annealing.step_telemetry.
+    """
+    TrainingRunStep.objects.create(training_run=training_run, **telemetry)
+
+
+def save_checkpoint(training_run, checkpoint):
+    TrainingRun.objects.filter(id=training_run.id).update(
+        checkpoint=json.dumps(checkpoint),
+        checkpointed_at=timezone.now(),
+    )
+
+
+def complete_training_run(training_run, coefficients):
+    training_run.final_coefficients = json.dumps(coefficients)
+    training_run.status = TrainingRun.STATUS_SUCCEEDED
+    training_run.finished_at = timezone.now()
+    # A finished run has nothing to resume.
+    training_run.checkpoint = ''
+    training_run.save(update_fields=['final_coefficients', 'status', 'finished_at', 'checkpoint'])
+
+
+def fail_training_run(training_run, error):
+    training_run.status = TrainingRun.STATUS_FAILED
+    training_run.error = error
+    training_run.finished_at = timezone.now()
+    training_run.save(update_fields=['status', 'error', 'finished_at'])
+
+
+def record_evaluation_error(training_run, error):
+    # The run keeps its status: only scoring the trained coefficients failed.
+    training_run.error = error
+    training_run.save(update_fields=['error'])
@@ -0,0 +1,122 @@
+import io
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fathom_server.training.benchmarks import benchmark_tuner, regressions
+from fathom_server.training.models import TrainingRun
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the training loop on synthetic corpora with a fake browser '
+        'driver, writing one JSON object of measurements per corpus size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10,100,1000,10000,100000',
+            help='Comma-separated numbers of webpages in the synthetic corpora.',
+        )
+        parser.add_argument('--cooling-steps', type=int, default=20)
+        parser.add_argument('--steps-per-temp', type=int, default=10)
+        parser.add_argument('--still-patience', type=int, default=1)
+        parser.add_argument(
+            '--schedule',
+            default=TrainingRun.SCHEDULE_GEOMETRIC,
+            choices=[
+                TrainingRun.SCHEDULE_GEOMETRIC,
+                TrainingRun.SCHEDULE_ADAPTIVE,
+                TrainingRun.SCHEDULE_REHEATING,
+            ],
+        )
+        parser.add_argument('--max-evaluations', type=int)
+        parser.add_argument('--improvement-patience', type=int)
+        parser.add_argument('--facts', type=int, default=1)
+        parser.add_argument('--rules', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--ruleset-bytes',
+            type=int,
+            default=100000,
+            help='Size to pad the synthetic ruleset code to, like a ruleset bundled with Fathom.',
+        )
+        parser.add_argument('--pool-size', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=1)
+        parser.add_argument('--resident-pages', action='store_true')
+        parser.add_argument('--offline', action='store_true')
+        parser.add_argument('--cache-results', action='store_true')
+        parser.add_argument('--early-abort', action='store_true')
+        parser.add_argument('--minibatch-fraction', type=float, default=1)
+        parser.add_argument('--memo-max-bytes', type=int)
+        parser.add_argument('--minibatch-phase', type=float, default=0.5)
+        parser.add_argument(
+            '--minibatch-sampling',
+            default=TrainingRun.MINIBATCH_RANDOM,
+            choices=[TrainingRun.MINIBATCH_RANDOM, TrainingRun.MINIBATCH_STRATIFIED],
+        )
+        parser.add_argument(
+            '--output',
+            help='Also write the results as JSON Lines to this file, e.g. to use as a baseline.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON Lines results of an earlier run to compare against.',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Fraction by which a measurement may get worse than the baseline.',
+        )
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if options['baseline']:
+            with io.open(options['baseline']) as f:
+                for line in f:
+                    if line.strip():
+                        results = json.loads(line)
+                        baseline[results['size']] = results
+
+        output = io.open(options['output'], 'w') if options['output'] else None
+        found = []
+        try:
+            for size in [int(size) for size in options['sizes'].split(',')]:
+                results = benchmark_tuner(
+                    size,
+                    cooling_steps=options['cooling_steps'],
+                    steps_per_temp=options['steps_per_temp'],
+                    schedule=options['schedule'],
+                    max_evaluations=options['max_evaluations'],
+                    improvement_patience=options['improvement_patience'],
+                    still_patience=options['still_patience'],
+                    facts=options['facts'],
+                    rules=options['rules'],
+                    seed=options['seed'],
+                    ruleset_bytes=options['ruleset_bytes'],
+                    pool_size=options['pool_size'],
+                    batch_size=options['batch_size'],
+                    resident_pages=options['resident_pages'],
+                    offline=options['offline'],
+                    cache_results=options['cache_results'],
+                    early_abort=options['early_abort'],
+                    minibatch_fraction=options['minibatch_fraction'],
+                    minibatch_phase=options['minibatch_phase'],
+                    minibatch_sampling=options['minibatch_sampling'],
+                    memo_max_bytes=options['memo_max_bytes'],
+                )
+                line = json.dumps(results, sort_keys=True)
+                self.stdout.write(line)
+                if output:
+                    output.write(line + '\n')
+                    output.flush()
+                if size in baseline:
+                    found.extend(regressions(baseline[size], results, options['tolerance']))
+        finally:
+            if output:
+                output.close()
+
+        if found:
+            raise CommandError('Regressions found:\n{}'.format('\n'.join(found)))
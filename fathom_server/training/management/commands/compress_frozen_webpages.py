@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from fathom_server.training.models import Webpage
+
+
+class Command(BaseCommand):
+    help = 'Gzip frozen HTML stored before compression was introduced.'
+
+    def handle(self, *args, **options):
+        webpages = Webpage.objects.exclude(frozen_html='').filter(
+            frozen_html_encoding=Webpage.ENCODING_IDENTITY,
+        )
+        for webpage in webpages.iterator():
+            old_name = webpage.frozen_html.name
+            with webpage.open_frozen_html() as f:
+                html = f.read()
+            webpage.save_frozen_html(html)
+            webpage.save()
+            webpage.frozen_html.storage.delete(old_name)
+            self.stdout.write('Compressed {} ({} bytes)'.format(
+                webpage.url,
+                webpage.frozen_html_size,
+            ))
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fathom_server.training.models import TrainingRun
+from fathom_server.training.runs import evaluate_training_run
+
+
+class Command(BaseCommand):
+    help = (
+        "Score a training run's final coefficients on its testing pages and "
+        "cross-validate on its training pages, storing the results on the run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('training_run', type=int)
+        parser.add_argument(
+            '--folds',
+            type=int,
+            help="Number of cross-validation folds, instead of the run's own setting.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            training_run = TrainingRun.objects.get(id=options['training_run'])
+        except TrainingRun.DoesNotExist:
+            raise CommandError('No training run with ID {}'.format(options['training_run']))
+        if not training_run.final_coefficients:
+            raise CommandError(
+                'Training run {} has no final coefficients yet.'.format(training_run.id),
+            )
+
+        if options['folds'] is not None:
+            training_run.cross_validation_folds = options['folds']
+        evaluate_training_run(training_run, json.loads(training_run.final_coefficients))
+
+        if training_run.test_results:
+            self.stdout.write('Testing: {}'.format(training_run.test_results))
+        if training_run.cross_validation_results:
+            results = json.loads(training_run.cross_validation_results)
+            self.stdout.write('Cross-validation accuracy: {} (stdev {})'.format(
+                results['mean_accuracy'],
+                results['accuracy_stdev'],
+            ))
@@ -0,0 +1,81 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fathom_server.training.exporting import (
+    export_factset,
+    export_training_run,
+    parse_since,
+    to_jsonl,
+)
+from fathom_server.training.models import FactSet, TrainingRun
+
+
+class Command(BaseCommand):
+    help = (
+        'Export frozen webpages and their fact answers as JSON Lines that '
+        'import_webpages can read back.'
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument(
+            '--factset',
+            type=int,
+            help='Export every frozen webpage with answers to this fact set.',
+        )
+        source.add_argument(
+            '--training-run',
+            type=int,
+            help="Export this training run's training and testing pages.",
+        )
+        parser.add_argument(
+            '--since',
+            help='Only export webpages frozen at or after this ISO 8601 date or time.',
+        )
+        parser.add_argument(
+            '--known-hashes',
+            help=(
+                'File of frozen_html_sha256 values, one per line, whose HTML is '
+                'already available and should be left out of the export.'
+            ),
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write to, or - for standard output.',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_since(options['since'])
+            except ValueError as err:
+                raise CommandError(str(err))
+
+        known_hashes = set()
+        if options['known_hashes']:
+            with io.open(options['known_hashes']) as f:
+                known_hashes = set(line.strip() for line in f if line.strip())
+
+        if options['factset']:
+            try:
+                factset = FactSet.objects.get(id=options['factset'])
+            except FactSet.DoesNotExist:
+                raise CommandError('No fact set with ID {}'.format(options['factset']))
+            records = export_factset(factset, since=since, known_hashes=known_hashes)
+        else:
+            try:
+                training_run = TrainingRun.objects.get(id=options['training_run'])
+            except TrainingRun.DoesNotExist:
+                raise CommandError('No training run with ID {}'.format(options['training_run']))
+            records = export_training_run(training_run, since=since, known_hashes=known_hashes)
+
+        if options['output'] == '-':
+            for line in to_jsonl(records):
+                self.stdout.write(line, ending='')
+        else:
+            with io.open(options['output'], 'wb') as f:
+                for line in to_jsonl(records):
+                    f.write(line.encode('utf8'))
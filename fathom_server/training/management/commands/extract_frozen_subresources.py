@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from fathom_server.training.models import Webpage
+from fathom_server.training.subresources import extract_subresources
+
+
+class Command(BaseCommand):
+    help = (
+        'Store the big inlined subresources of already frozen HTML separately, '
+        'as newly frozen HTML is when FROZEN_SUBRESOURCE_MIN_BYTES is set.'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.FROZEN_SUBRESOURCE_MIN_BYTES:
+            raise CommandError('FROZEN_SUBRESOURCE_MIN_BYTES is 0, so there is nothing to extract.')
+        webpages = Webpage.objects.exclude(frozen_html='')
+        for webpage in webpages.iterator():
+            with webpage.open_frozen_html() as f:
+                html = f.read()
+            if extract_subresources(html, save=False) == html:
+                continue
+            old_name = webpage.frozen_html.name
+            webpage.save_frozen_html(html)
+            webpage.save()
+            if webpage.frozen_html.name != old_name:
+                webpage.frozen_html.storage.delete(old_name)
+            self.stdout.write('Extracted subresources of {} ({} bytes left)'.format(
+                webpage.url,
+                webpage.frozen_html_size,
+            ))
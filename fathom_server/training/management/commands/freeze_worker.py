@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from fathom_server.training.browsers import BrowserPool, MarionetteSessions
+from fathom_server.training.freezing import Freezer
+
+
+class Command(BaseCommand):
+    help = 'Freeze queued webpages with a pool of headless Firefox instances.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--browsers',
+            type=int,
+            default=4,
+            help='Number of Firefox instances to freeze pages with at once.',
+        )
+        parser.add_argument(
+            '--marionette-port',
+            type=int,
+            default=2828,
+            help='Marionette port of the first browser; the others use the following ports.',
+        )
+        parser.add_argument(
+            '--idle-time',
+            type=int,
+            default=1000,
+            help=(
+                'Milliseconds without DOM changes or finished network requests after '
+                'which a loaded page is considered ready to freeze.'
+            ),
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=1000 * 30,
+            help='Maximum milliseconds to wait for a page to become idle before freezing anyway.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds to wait between checks of an empty queue.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for more pages.',
+        )
+
+    def handle(self, *args, **options):
+        pool = BrowserPool(
+            MarionetteSessions(first_port=options['marionette_port']),
+            size=options['browsers'],
+        )
+        freezers = [
+            Freezer(
+                pool=pool,
+                idle_time=options['idle_time'],
+                timeout=options['timeout'],
+                poll_interval=options['poll_interval'],
+                stop_when_empty=options['once'],
+                log=self.stdout.write,
+            )
+            for index in range(options['browsers'])
+        ]
+        for freezer in freezers:
+            freezer.start()
+
+        try:
+            while any(freezer.is_alive() for freezer in freezers):
+                pool.maintain()
+                time.sleep(1)
+        except KeyboardInterrupt:
+            for freezer in freezers:
+                freezer.stop()
+            for freezer in freezers:
+                freezer.join()
+        finally:
+            pool.close()
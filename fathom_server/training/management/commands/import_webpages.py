@@ -0,0 +1,34 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand
+
+from fathom_server.training.importing import import_jsonl
+
+
+class Command(BaseCommand):
+    help = 'Import webpages, frozen HTML and fact answers from a JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='JSON Lines file to import, or - to read from standard input.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of lines to write per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            lines = getattr(sys.stdin, 'buffer', sys.stdin)
+            result = import_jsonl(lines, batch_size=options['batch_size'])
+        else:
+            with io.open(options['path'], 'rb') as lines:
+                result = import_jsonl(lines, batch_size=options['batch_size'])
+
+        for line_number, error in result.errors:
+            self.stderr.write('Line {}: {}'.format(line_number, error))
+        self.stdout.write(str(result))
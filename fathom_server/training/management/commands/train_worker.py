@@ -0,0 +1,91 @@
+import signal
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+
+from fathom_server.training.browsers import webdriver_pool
+from fathom_server.training.runs import evaluate_training_run, train
+from fathom_server.training.jobs import (
+    Heartbeat,
+    claim_training_run,
+    complete_training_run,
+    fail_training_run,
+    record_evaluation_error,
+    requeue_training_run,
+)
+
+
+class Command(BaseCommand):
+    help = 'Run queued training runs, polling the database for new ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds to wait between checks of an empty queue.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for more runs.',
+        )
+
+    def handle(self, *args, **options):
+        # Stopping the container sends SIGTERM; unwind like Ctrl-C would so
+        # the run in progress is given back.
+        signal.signal(signal.SIGTERM, self.terminate)
+        try:
+            self.work(options)
+        finally:
+            webdriver_pool().close()
+
+    def terminate(self, signum, frame):
+        raise SystemExit('Terminated')
+
+    def work(self, options):
+        while True:
+            training_run = claim_training_run()
+            if training_run is None:
+                if options['once']:
+                    return
+                # Keep browsers warm for the next run.
+                webdriver_pool().maintain()
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write('Training run {}...'.format(training_run.id))
+            heartbeat = Heartbeat(training_run)
+            heartbeat.start()
+            try:
+                best_solution, best_cost = train(training_run)
+            except Exception as err:
+                fail_training_run(training_run, traceback.format_exc())
+                self.stderr.write('Training run {} failed: {}'.format(training_run.id, err))
+                continue
+            except BaseException:
+                # The worker is stopping, not the run failing: leave it for
+                # the next worker to carry on from its last checkpoint.
+                requeue_training_run(training_run)
+                self.stderr.write('Training run {} requeued.'.format(training_run.id))
+                raise
+            finally:
+                heartbeat.stop()
+
+            complete_training_run(training_run, best_solution)
+            self.stdout.write('Training run {} finished with cost {}: {}'.format(
+                training_run.id,
+                best_cost,
+                best_solution,
+            ))
+            # The coefficients are stored by now, so a failed evaluation only
+            # loses the test and cross-validation results.
+            try:
+                evaluate_training_run(training_run, best_solution)
+            except Exception as err:
+                record_evaluation_error(training_run, traceback.format_exc())
+                self.stderr.write('Evaluating training run {} failed: {}'.format(
+                    training_run.id,
+                    err,
+                ))
@@ -0,0 +1,227 @@
+"""
+A solution => cost memo with a memory cap, for the solutions a run has
+already evaluated.
+
+Coefficient vectors are packed into the rows of a NumPy array of a fixed
+width and type: 32-bit integers, or doubles if the ruleset's initial
+coefficients aren't integers. The rows live in an open-addressing hash
+table with linear probing. Costs are kept as doubles rather than floats,
+because annealing compares them exactly and rounding would change which
+moves it accepts.
+
+The table starts small and doubles until it reaches max_bytes. After that,
+every new entry evicts an old one, chosen with the clock algorithm: entries
+get a second chance if they were used since the clock hand last passed.
+"""
+import numpy as np
+from django.conf import settings
+
+
+class SolutionMemo:
+    """
+    Supports the parts of the dict interface the Tuner uses. Keys are
+    sequences of numbers, and keys that don't fit the table's type are never
+    stored. Lookups with get() or `in` count as hits and misses.
+    """
+    INITIAL_CAPACITY = 1024
+    MAX_LOAD = 0.5
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = settings.SOLUTION_MEMO_MAX_BYTES if max_bytes is None else max_bytes
+        self.dtype = None
+        self.width = None
+        self.capacity = 0
+        self.length = 0
+        self.hand = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, key):
+        return self.counted_lookup(key) is not None
+
+    def __getitem__(self, key):
+        slot = self.lookup(key)
+        if slot is None:
+            raise KeyError(key)
+        return float(self.costs[slot])
+
+    def __setitem__(self, key, cost):
+        self.store(key, cost)
+
+    def get(self, key, default=None):
+        slot = self.counted_lookup(key)
+        return default if slot is None else float(self.costs[slot])
+
+    def pop(self, key, default=None):
+        slot = self.lookup(key)
+        if slot is None:
+            return default
+        cost = float(self.costs[slot])
+        self.delete(slot)
+        return cost
+
+    def update(self, entries):
+        if hasattr(entries, 'items'):
+            entries = entries.items()
+        for key, cost in entries:
+            self.store(key, cost)
+
+    def items(self):
+        for slot in np.flatnonzero(self.used):
+            yield tuple(self.keys[slot].tolist()), float(self.costs[slot])
+
+    @property
+    def nbytes(self):
+        if not self.capacity:
+            return 0
+        arrays = (self.keys, self.costs, self.hashes, self.used, self.referenced)
+        return sum(array.nbytes for array in arrays)
+
+    def max_capacity(self):
+        """The largest power of two number of slots that fits in max_bytes."""
+        # The key, the cost, the hash and the used and referenced flags
+        slot_bytes = self.width * self.dtype.itemsize + 8 + 8 + 2
+        capacity = 2
+        while capacity * 2 * slot_bytes <= self.max_bytes:
+            capacity *= 2
+        return capacity
+
+    def allocate(self, capacity):
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.keys = np.zeros((capacity, self.width), dtype=self.dtype)
+        self.costs = np.zeros(capacity, dtype=np.float64)
+        self.hashes = np.zeros(capacity, dtype=np.int64)
+        self.used = np.zeros(capacity, dtype=bool)
+        self.referenced = np.zeros(capacity, dtype=bool)
+
+    def pack(self, key):
+        """
+        Return the key as a row of the table's type, its bytes and their
+        hash, or None if it can't be represented exactly. The first key
+        decides the table's width and type.
+        """
+        if self.dtype is None:
+            integers = all(isinstance(value, int) for value in key)
+            self.dtype = np.dtype(np.int32 if integers else np.float64)
+            self.width = len(key)
+            self.allocate(min(self.INITIAL_CAPACITY, self.max_capacity()))
+        if len(key) != self.width:
+            return None
+        try:
+            row = np.array(key, dtype=self.dtype)
+        except (OverflowError, TypeError, ValueError):
+            return None
+        if row.tolist() != list(key):
+            return None
+        data = row.tobytes()
+        return row, data, hash(data)
+
+    def find(self, data, key_hash):
+        """
+        Return the slot holding the key with the given bytes and hash and
+        True, or the empty slot it would go in and False.
+        """
+        slot = key_hash & self.mask
+        while self.used[slot]:
+            if self.hashes[slot] == key_hash and self.keys[slot].tobytes() == data:
+                return slot, True
+            slot = (slot + 1) & self.mask
+        return slot, False
+
+    def lookup(self, key):
+        packed = self.pack(key)
+        if packed is None:
+            return None
+        slot, found = self.find(packed[1], packed[2])
+        if not found:
+            return None
+        self.referenced[slot] = True
+        return slot
+
+    def counted_lookup(self, key):
+        slot = self.lookup(key)
+        if slot is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return slot
+
+    def store(self, key, cost):
+        packed = self.pack(key)
+        if packed is None:
+            return
+        row, data, key_hash = packed
+        slot, found = self.find(data, key_hash)
+        if not found:
+            if self.length + 1 > self.capacity * self.MAX_LOAD:
+                if self.capacity < self.max_capacity():
+                    self.resize(self.capacity * 2)
+                else:
+                    self.evict()
+                slot, found = self.find(data, key_hash)
+            self.keys[slot] = row
+            self.hashes[slot] = key_hash
+            self.used[slot] = True
+            self.length += 1
+        self.costs[slot] = cost
+        self.referenced[slot] = True
+
+    def resize(self, capacity):
+        keys, costs, hashes, used = self.keys, self.costs, self.hashes, self.used
+        self.allocate(capacity)
+        self.hand = 0
+        for old_slot in np.flatnonzero(used):
+            slot = int(hashes[old_slot]) & self.mask
+            while self.used[slot]:
+                slot = (slot + 1) & self.mask
+            self.keys[slot] = keys[old_slot]
+            self.costs[slot] = costs[old_slot]
+            self.hashes[slot] = hashes[old_slot]
+            self.used[slot] = True
+
+    def evict(self):
+        """Remove one entry, chosen with the clock algorithm."""
+        while True:
+            slot = self.hand
+            self.hand = (self.hand + 1) & self.mask
+            if not self.used[slot]:
+                continue
+            if self.referenced[slot]:
+                self.referenced[slot] = False
+            else:
+                self.delete(slot)
+                self.evictions += 1
+                return
+
+    def delete(self, slot):
+        """
+        Empty a slot, moving later entries of its probe sequence back so
+        lookups never stop early at the hole.
+        """
+        hole = slot
+        next_slot = slot
+        while True:
+            next_slot = (next_slot + 1) & self.mask
+            if not self.used[next_slot]:
+                break
+            home = int(self.hashes[next_slot]) & self.mask
+            # An entry can fill the hole unless its home slot lies after the
+            # hole, cyclically, up to where it is now.
+            if hole <= next_slot:
+                stays = hole < home <= next_slot
+            else:
+                stays = home > hole or home <= next_slot
+            if not stays:
+                self.keys[hole] = self.keys[next_slot]
+                self.costs[hole] = self.costs[next_slot]
+                self.hashes[hole] = self.hashes[next_slot]
+                self.referenced[hole] = self.referenced[next_slot]
+                hole = next_slot
+        self.used[hole] = False
+        self.referenced[hole] = False
+        self.length -= 1
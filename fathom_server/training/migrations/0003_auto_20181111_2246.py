@@ -14,7 +14,7 @@ class Migration(migrations.Migration):
     operations = [
         migrations.RenameField(
             model_name='trainingrun',
-            old_name=b'coefficients',
+            old_name='coefficients',
             new_name='final_coefficients',
         ),
         migrations.AddField(
@@ -24,12 +24,12 @@ class Migration(migrations.Migration):
         ),
         migrations.AlterField(
             model_name='trainingrun',
-            name=b'testing_pages',
+            name='testing_pages',
             field=models.ManyToManyField(blank=True, related_name='testing_runs', to='training.Webpage'),
         ),
         migrations.AlterField(
             model_name='trainingrun',
-            name=b'training_pages',
+            name='training_pages',
             field=models.ManyToManyField(blank=True, related_name='training_runs', to='training.Webpage'),
         ),
     ]
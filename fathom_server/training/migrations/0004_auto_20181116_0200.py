@@ -20,7 +20,7 @@ class Migration(migrations.Migration):
         ),
         migrations.AlterField(
             model_name='webpage',
-            name=b'url',
+            name='url',
             field=models.URLField(unique=True),
         ),
     ]
@@ -14,6 +14,6 @@ class Migration(migrations.Migration):
     operations = [
         migrations.RemoveField(
             model_name='webpage',
-            name=b'frozen_html',
+            name='frozen_html',
         ),
     ]
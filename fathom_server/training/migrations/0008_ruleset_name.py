@@ -15,6 +15,6 @@ class Migration(migrations.Migration):
         migrations.AddField(
             model_name='ruleset',
             name='name',
-            field=models.CharField(default=b'New Ruleset', max_length=255),
+            field=models.CharField(default='New Ruleset', max_length=255),
         ),
     ]
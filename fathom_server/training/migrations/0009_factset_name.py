@@ -15,6 +15,6 @@ class Migration(migrations.Migration):
         migrations.AddField(
             model_name='factset',
             name='name',
-            field=models.CharField(default=b'New Factset', max_length=255),
+            field=models.CharField(default='New Factset', max_length=255),
         ),
     ]
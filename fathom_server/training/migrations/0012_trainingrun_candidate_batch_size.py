@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 10:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0011_trainingrun_browser_pool_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrun',
+            name='candidate_batch_size',
+            field=models.PositiveIntegerField(default=1, help_text='Number of candidate coefficient vectors to evaluate per page load.'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 10:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0012_trainingrun_candidate_batch_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrun',
+            name='resident_pages',
+            field=models.BooleanField(default=False, help_text='Keep every training page open in its own tab for the whole run instead of reloading it for each candidate.'),
+        ),
+    ]
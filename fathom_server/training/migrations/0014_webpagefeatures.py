@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 10:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0013_trainingrun_resident_pages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebpageFeatures',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ruleset_hash', models.CharField(max_length=64)),
+                ('frozen_html_version', models.CharField(max_length=255)),
+                ('features', models.TextField()),
+                ('ruleset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='training.Ruleset')),
+                ('webpage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='training.Webpage')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='offline_scoring',
+            field=models.BooleanField(default=False, help_text='Score candidates with NumPy from per-rule features extracted once per page. Requires a ruleset that implements extractFeatures.'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='webpagefeatures',
+            unique_together=set([('ruleset', 'webpage')]),
+        ),
+    ]
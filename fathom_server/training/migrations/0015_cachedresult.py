@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 11:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0014_webpagefeatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('ruleset_hash', models.CharField(max_length=64)),
+                ('result', models.TextField()),
+                ('ruleset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='training.Ruleset')),
+                ('webpage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='training.Webpage')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='cache_results',
+            field=models.BooleanField(default=True, help_text='Reuse and store per-page results in the cache shared across training runs.'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 12:26
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0015_cachedresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrun',
+            name='early_abort',
+            field=models.BooleanField(default=False, help_text='Stop evaluating a candidate as soon as it is certain to be rejected.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='page_order',
+            field=models.CharField(choices=[('given', 'As given'), ('random', 'Random'), ('failures', 'Most often failing first')], default='given', max_length=255),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 13:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0016_trainingrun_early_abort'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrun',
+            name='chains',
+            field=models.PositiveIntegerField(default=1, help_text='Number of annealing chains to run in parallel processes at different temperatures, swapping states between them (parallel tempering).'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 13:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def mark_frozen_webpages(apps, schema_editor):
+    Webpage = apps.get_model('training', 'Webpage')
+    Webpage.objects.exclude(frozen_html='').update(freeze_status='frozen')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0017_trainingrun_chains'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webpage',
+            name='freeze_duration',
+            field=models.FloatField(blank=True, help_text='Seconds the last freeze attempt took.', null=True),
+        ),
+        migrations.AddField(
+            model_name='webpage',
+            name='freeze_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='webpage',
+            name='freeze_queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webpage',
+            name='freeze_status',
+            field=models.CharField(choices=[('new', 'New'), ('queued', 'Queued'), ('freezing', 'Freezing'), ('frozen', 'Frozen'), ('failed', 'Failed')], default='new', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='webpage',
+            name='freeze_timings',
+            field=models.TextField(blank=True, help_text='Milliseconds spent in each stage of the last successful freeze.'),
+        ),
+        migrations.AddField(
+            model_name='webpage',
+            name='frozen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_frozen_webpages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 14:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0018_webpage_freeze_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webpage',
+            name='frozen_html_encoding',
+            field=models.CharField(blank=True, choices=[('', 'Uncompressed'), ('gzip', 'gzip')], max_length=255),
+        ),
+        migrations.AddField(
+            model_name='webpage',
+            name='frozen_html_sha256',
+            field=models.CharField(blank=True, help_text='SHA-256 of the frozen HTML, before compression.', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='webpage',
+            name='frozen_html_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Size of the frozen HTML in bytes, before compression.', null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 16:12
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_answers(apps, schema_editor):
+    # Keep the most recently saved answer for each webpage and fact.
+    WebpageFact = apps.get_model('training', 'WebpageFact')
+    duplicates = WebpageFact.objects.values('webpage', 'fact').annotate(
+        count=Count('id'),
+        latest_id=Max('id'),
+    ).filter(count__gt=1)
+    for duplicate in duplicates:
+        WebpageFact.objects.filter(
+            webpage=duplicate['webpage'],
+            fact=duplicate['fact'],
+        ).exclude(id=duplicate['latest_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0019_webpage_frozen_html_encoding'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_answers, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='webpagefact',
+            unique_together=set([('webpage', 'fact')]),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 16:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0020_webpagefact_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingRunStep',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chain', models.PositiveIntegerField(default=0)),
+                ('step', models.PositiveIntegerField()),
+                ('recorded_at', models.DateTimeField(auto_now_add=True)),
+                ('temperature', models.FloatField()),
+                ('current_cost', models.FloatField()),
+                ('best_cost', models.FloatField()),
+                ('candidates_evaluated', models.PositiveIntegerField(default=0)),
+                ('evaluations_per_second', models.FloatField(default=0)),
+                ('cache_hits', models.PositiveIntegerField(default=0)),
+                ('cache_misses', models.PositiveIntegerField(default=0)),
+                ('page_load_time', models.FloatField(default=0)),
+                ('script_time', models.FloatField(default=0)),
+                ('comparison_time', models.FloatField(default=0)),
+                ('training_run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='training.TrainingRun')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 17:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0021_trainingrunstep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrun',
+            name='cross_validation_folds',
+            field=models.PositiveIntegerField(default=0, help_text='Number of folds to cross-validate the training pages with after training. Less than 2 skips cross-validation.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='cross_validation_results',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='test_results',
+            field=models.TextField(blank=True, help_text='Accuracy of the final coefficients on the testing pages, as JSON.'),
+        ),
+    ]
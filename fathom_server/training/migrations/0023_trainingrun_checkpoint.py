@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 18:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0022_trainingrun_test_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrun',
+            name='checkpoint',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='checkpoint_interval',
+            field=models.PositiveIntegerField(default=10, help_text='Cooling steps between checkpoints of the annealer state. 0 disables checkpoints.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='checkpoint_memo',
+            field=models.BooleanField(default=False, help_text='Include the costs of every solution seen so far in checkpoints, so a resumed run does not evaluate them again. Makes checkpoints much larger.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='checkpointed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
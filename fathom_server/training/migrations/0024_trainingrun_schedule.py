@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 19:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0023_trainingrun_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrun',
+            name='cooling_fraction',
+            field=models.FloatField(default=0.95, help_text='Factor the temperature is multiplied by each cooling step.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='cooling_schedule',
+            field=models.CharField(choices=[('geometric', 'Geometric'), ('adaptive', 'Adaptive: cool faster while more moves are accepted than the target rate'), ('reheating', 'Reheating: raise the temperature again when stuck')], default='geometric', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='cooling_steps',
+            field=models.PositiveIntegerField(default=5000),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='improvement_patience',
+            field=models.PositiveIntegerField(blank=True, help_text='Stop after evaluating this many candidates without finding a new best cost.', null=True),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='initial_temperature',
+            field=models.FloatField(default=5000),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='max_evaluations',
+            field=models.PositiveIntegerField(blank=True, help_text='Stop after evaluating this many candidates.', null=True),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='max_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='Stop after annealing for this many seconds.', null=True),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='reheat_patience',
+            field=models.PositiveIntegerField(default=50, help_text='Cooling steps without a new best cost after which the reheating schedule reheats.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='steps_per_temp',
+            field=models.PositiveIntegerField(default=1000, help_text='Maximum number of moves to try at each temperature.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='still_patience',
+            field=models.PositiveIntegerField(default=1, help_text='Move on to the next temperature if the cost is still where it started after this many moves. 0 always tries every move.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='stop_reason',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='target_acceptance_rate',
+            field=models.FloatField(default=0.3, help_text='Fraction of moves the adaptive schedule aims to accept.'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 19:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0024_trainingrun_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrun',
+            name='minibatch_fraction',
+            field=models.FloatField(default=1, help_text='Fraction of the training pages to score candidates on in the first cooling step. It grows to all of them by the end of the mini-batch phase. 1 always uses every page.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='minibatch_phase',
+            field=models.FloatField(default=0.5, help_text='Fraction of the cooling steps after which candidates are scored on every page.'),
+        ),
+        migrations.AddField(
+            model_name='trainingrun',
+            name='minibatch_sampling',
+            field=models.CharField(choices=[('random', 'Random'), ('stratified', 'Stratified by how often pages fail')], default='random', max_length=255),
+        ),
+    ]
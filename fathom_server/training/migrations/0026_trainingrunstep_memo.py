@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 20:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0025_trainingrun_minibatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrunstep',
+            name='memo_hits',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainingrunstep',
+            name='memo_misses',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
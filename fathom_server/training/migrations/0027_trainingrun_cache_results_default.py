@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 21:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0026_trainingrunstep_memo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trainingrun',
+            name='cache_results',
+            field=models.BooleanField(default=False, help_text='Reuse and store per-page results in the cache shared across training runs.'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 21:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0027_trainingrun_cache_results_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingrun',
+            name='memo_max_bytes',
+            field=models.BigIntegerField(blank=True, help_text='Memory each annealing process may use to remember the costs of solutions it has evaluated. Blank uses the SOLUTION_MEMO_MAX_BYTES setting.', null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-18 11:37
+from __future__ import unicode_literals
+
+import random
+
+from django.db import migrations, models
+from django.db.models import Func
+import fathom_server.training.models
+
+
+def randomize_keys(apps, schema_editor):
+    # Adding the field gave every existing webpage the same key.
+    Webpage = apps.get_model('training', 'Webpage')
+    if schema_editor.connection.vendor == 'postgresql':
+        Webpage.objects.update(random_key=Func(function='RANDOM'))
+        return
+    for webpage_id in list(Webpage.objects.values_list('id', flat=True)):
+        Webpage.objects.filter(id=webpage_id).update(random_key=random.random())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0029_trainingrun_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webpage',
+            name='random_key',
+            field=models.FloatField(db_index=True, default=fathom_server.training.models._random_key, editable=False),
+        ),
+        migrations.RunPython(randomize_keys, migrations.RunPython.noop),
+    ]
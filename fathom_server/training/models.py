@@ -1,8 +1,18 @@
+import gzip
+import io
+import json
+import numbers
+import random
 from hashlib import sha256
 
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
 from django.db import models
+from django.db.models import Exists, OuterRef, Q
 from django.urls import reverse
 
+from fathom_server.training.subresources import extract_subresources
+
 
 class Fact(models.Model):
     TYPE_STRING = 'string'
@@ -20,6 +30,33 @@ class Fact(models.Model):
     def __str__(self):
         return self.question
 
+    def decode_answer(self, fact_answer):
+        """
+        Convert a stored fact_answer, which is JSON text, into the Python
+        value a ruleset's extractFacts would return for this fact. Raise
+        ValueError if it isn't JSON of the fact's type, or null.
+        """
+        try:
+            value = json.loads(fact_answer)
+        except ValueError:
+            # Answers typed into the admin by hand are often bare strings.
+            if self.type != self.TYPE_STRING:
+                raise
+            return fact_answer
+
+        if value is None:
+            return None
+        if self.type == self.TYPE_NUMBER:
+            # bool is a subclass of int, but true isn't a number.
+            if isinstance(value, bool) or not isinstance(value, numbers.Real):
+                raise ValueError('Not a JSON number: {}'.format(fact_answer))
+            return float(value)
+        if self.type == self.TYPE_BOOLEAN:
+            if not isinstance(value, bool):
+                raise ValueError('Not a JSON boolean: {}'.format(fact_answer))
+            return value
+        return value
+
 
 class FactSet(models.Model):
     name = models.CharField(max_length=255, default='New Factset')
@@ -28,6 +65,44 @@ class FactSet(models.Model):
     def __str__(self):
         return self.name
 
+    def unanswered_webpages(self):
+        """
+        Frozen webpages missing an answer to at least one of this set's
+        facts. Each fact is checked with an EXISTS anti-join against the
+        (webpage, fact) index rather than by collecting answered IDs.
+        """
+        fact_ids = list(self.facts.values_list('id', flat=True))
+        webpages = Webpage.objects.exclude(frozen_html='')
+        if not fact_ids:
+            return webpages.none()
+
+        missing_any = Q()
+        for fact_id in fact_ids:
+            answered = 'answered_{}'.format(fact_id)
+            webpages = webpages.annotate(**{answered: Exists(
+                WebpageFact.objects.filter(webpage=OuterRef('pk'), fact_id=fact_id)
+            )})
+            missing_any |= Q(**{answered: False})
+        return webpages.filter(missing_any)
+
+    def random_unanswered_webpage(self):
+        """
+        Pick an unanswered webpage at random, or return None once every
+        webpage is answered.
+
+        Every webpage has a random key, and this takes the first unanswered
+        page at or after a random point in the random_key index, wrapping
+        around to the start once. That walks the index only as far as the
+        next unanswered page, however many there are. A page is picked with
+        the probability of the point landing in the gap before its key,
+        which is uniform on average over the random keys.
+        """
+        webpages = self.unanswered_webpages().order_by('random_key')
+        webpage = webpages.filter(random_key__gte=random.random()).first()
+        if webpage is None:
+            webpage = webpages.first()
+        return webpage
+
 
 class Ruleset(models.Model):
     name = models.CharField(max_length=255, default='New Ruleset')
@@ -37,18 +112,112 @@ class Ruleset(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def code_hash(self):
+        return sha256(self.code.encode('utf8')).hexdigest()
+
 
 def _frozen_html_upload_to(instance, filename):
-    return 'frozen_webpages/{}.html'.format(sha256(instance.url).hexdigest())
+    extension = '.html'
+    if instance.frozen_html_encoding == Webpage.ENCODING_GZIP:
+        extension = '.html.gz'
+    return 'frozen_webpages/{}{}'.format(sha256(instance.url.encode('utf8')).hexdigest(), extension)
+
+
+def _random_key():
+    return random.random()
 
 
 class Webpage(models.Model):
+    FREEZE_STATUS_NEW = 'new'
+    FREEZE_STATUS_QUEUED = 'queued'
+    FREEZE_STATUS_FREEZING = 'freezing'
+    FREEZE_STATUS_FROZEN = 'frozen'
+    FREEZE_STATUS_FAILED = 'failed'
+
+    ENCODING_IDENTITY = ''
+    ENCODING_GZIP = 'gzip'
+
     url = models.URLField(unique=True)
     frozen_html = models.FileField(blank=True, upload_to=_frozen_html_upload_to)
+    frozen_html_encoding = models.CharField(max_length=255, blank=True, choices=(
+        (ENCODING_IDENTITY, 'Uncompressed'),
+        (ENCODING_GZIP, 'gzip'),
+    ))
+    frozen_html_size = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text='Size of the frozen HTML in bytes, before compression.',
+    )
+    frozen_html_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text='SHA-256 of the frozen HTML, before compression.',
+    )
+    freeze_status = models.CharField(max_length=255, default=FREEZE_STATUS_NEW, choices=(
+        (FREEZE_STATUS_NEW, 'New'),
+        (FREEZE_STATUS_QUEUED, 'Queued'),
+        (FREEZE_STATUS_FREEZING, 'Freezing'),
+        (FREEZE_STATUS_FROZEN, 'Frozen'),
+        (FREEZE_STATUS_FAILED, 'Failed'),
+    ))
+    freeze_queued_at = models.DateTimeField(blank=True, null=True)
+    frozen_at = models.DateTimeField(blank=True, null=True)
+    freeze_duration = models.FloatField(
+        blank=True,
+        null=True,
+        help_text='Seconds the last freeze attempt took.',
+    )
+    freeze_timings = models.TextField(
+        blank=True,
+        help_text='Milliseconds spent in each stage of the last successful freeze.',
+    )
+    freeze_error = models.TextField(blank=True)
+    # For picking webpages at random with an index scan; see
+    # FactSet.random_unanswered_webpage.
+    random_key = models.FloatField(default=_random_key, db_index=True, editable=False)
 
     def get_absolute_url(self):
+        # Each version of the frozen HTML gets its own URL so that browsers
+        # can cache it forever.
+        if self.frozen_html_sha256:
+            return reverse('view-frozen-webpage', args=[self.id, self.frozen_html_sha256])
         return reverse('view-frozen-webpage', args=[self.id])
 
+    @property
+    def frozen_html_version(self):
+        # Pages frozen before we stored hashes always get a new filename
+        # when they're re-frozen, so the name will do for those.
+        return self.frozen_html_sha256 or self.frozen_html.name
+
+    def save_frozen_html(self, html):
+        """
+        Store gzipped frozen HTML along with its uncompressed size and hash,
+        extracting its big inlined subresources first if
+        FROZEN_SUBRESOURCE_MIN_BYTES is set. The size and hash are those of
+        the HTML as stored. The webpage itself still needs saving afterwards.
+        """
+        if not isinstance(html, bytes):
+            html = html.encode('utf8')
+        html = extract_subresources(html)
+
+        compressed = io.BytesIO()
+        # A fixed mtime keeps the output the same for the same HTML.
+        with gzip.GzipFile(fileobj=compressed, mode='wb', mtime=0) as f:
+            f.write(html)
+
+        self.frozen_html_encoding = self.ENCODING_GZIP
+        self.frozen_html_size = len(html)
+        self.frozen_html_sha256 = sha256(html).hexdigest()
+        self.frozen_html.save(self.url, ContentFile(compressed.getvalue()), save=False)
+
+    def open_frozen_html(self):
+        """Return a file object that reads the uncompressed frozen HTML."""
+        self.frozen_html.open('rb')
+        if self.frozen_html_encoding == self.ENCODING_GZIP:
+            return gzip.GzipFile(fileobj=self.frozen_html, mode='rb')
+        return self.frozen_html
+
     def __str__(self):
         return self.url
 
@@ -58,10 +227,261 @@ class WebpageFact(models.Model):
     fact = models.ForeignKey(Fact, on_delete=models.CASCADE)
     fact_answer = models.TextField()
 
+    class Meta:
+        unique_together = (('webpage', 'fact'),)
+
+
+class WebpageFeatures(models.Model):
+    """
+    The raw per-rule scores of every candidate element a ruleset considers on
+    a webpage, as returned by the ruleset's extractFeatures. Used to score
+    coefficients without a browser; see training.offline.
+    """
+    ruleset = models.ForeignKey(Ruleset, on_delete=models.CASCADE)
+    webpage = models.ForeignKey(Webpage, on_delete=models.CASCADE)
+    ruleset_hash = models.CharField(max_length=64)
+    frozen_html_version = models.CharField(max_length=255)
+    features = models.TextField()
+
+    class Meta:
+        unique_together = (('ruleset', 'webpage'),)
+
+
+class CachedResult(models.Model):
+    """
+    What a ruleset's extractFacts returned for one webpage and coefficient
+    vector. Shared across training runs; see training.cache.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    ruleset = models.ForeignKey(Ruleset, on_delete=models.CASCADE)
+    webpage = models.ForeignKey(Webpage, on_delete=models.CASCADE)
+    ruleset_hash = models.CharField(max_length=64)
+    result = models.TextField()
+
 
 class TrainingRun(models.Model):
+    STATUS_NEW = 'new'
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+
+    PAGE_ORDER_GIVEN = 'given'
+    PAGE_ORDER_RANDOM = 'random'
+    PAGE_ORDER_FAILURES = 'failures'
+
+    SCHEDULE_GEOMETRIC = 'geometric'
+    SCHEDULE_ADAPTIVE = 'adaptive'
+    SCHEDULE_REHEATING = 'reheating'
+
+    MINIBATCH_RANDOM = 'random'
+    MINIBATCH_STRATIFIED = 'stratified'
+
     ruleset = models.ForeignKey(Ruleset, on_delete=models.CASCADE)
     initial_coefficients = models.TextField(blank=True)
     training_pages = models.ManyToManyField(Webpage, related_name='training_runs', blank=True)
     testing_pages = models.ManyToManyField(Webpage, related_name='testing_runs', blank=True)
     final_coefficients = models.TextField(blank=True)
+    browser_pool_size = models.PositiveIntegerField(
+        default=1,
+        help_text='Number of browser sessions to evaluate training pages with in parallel.',
+    )
+    chains = models.PositiveIntegerField(
+        default=1,
+        help_text=(
+            'Number of annealing chains to run in parallel processes at different '
+            'temperatures, swapping states between them (parallel tempering).'
+        ),
+    )
+    candidate_batch_size = models.PositiveIntegerField(
+        default=1,
+        help_text='Number of candidate coefficient vectors to evaluate per page load.',
+    )
+    offline_scoring = models.BooleanField(
+        default=False,
+        help_text=(
+            'Score candidates with NumPy from per-rule features extracted once per page. '
+            'Requires a ruleset that implements extractFeatures.'
+        ),
+    )
+    cache_results = models.BooleanField(
+        default=False,
+        help_text='Reuse and store per-page results in the cache shared across training runs.',
+    )
+    early_abort = models.BooleanField(
+        default=False,
+        help_text='Stop evaluating a candidate as soon as it is certain to be rejected.',
+    )
+    page_order = models.CharField(max_length=255, default=PAGE_ORDER_GIVEN, choices=(
+        (PAGE_ORDER_GIVEN, 'As given'),
+        (PAGE_ORDER_RANDOM, 'Random'),
+        (PAGE_ORDER_FAILURES, 'Most often failing first'),
+    ))
+    resident_pages = models.BooleanField(
+        default=False,
+        help_text=(
+            'Keep every training page open in its own tab for the whole run instead of '
+            'reloading it for each candidate.'
+        ),
+    )
+    initial_temperature = models.FloatField(default=5000)
+    cooling_steps = models.PositiveIntegerField(default=5000)
+    cooling_fraction = models.FloatField(
+        default=0.95,
+        help_text='Factor the temperature is multiplied by each cooling step.',
+    )
+    steps_per_temp = models.PositiveIntegerField(
+        default=1000,
+        help_text='Maximum number of moves to try at each temperature.',
+    )
+    still_patience = models.PositiveIntegerField(
+        default=1,
+        help_text=(
+            'Move on to the next temperature if the cost is still where it started after '
+            'this many moves. 0 always tries every move.'
+        ),
+    )
+    cooling_schedule = models.CharField(max_length=255, default=SCHEDULE_GEOMETRIC, choices=(
+        (SCHEDULE_GEOMETRIC, 'Geometric'),
+        (
+            SCHEDULE_ADAPTIVE,
+            'Adaptive: cool faster while more moves are accepted than the target rate',
+        ),
+        (SCHEDULE_REHEATING, 'Reheating: raise the temperature again when stuck'),
+    ))
+    target_acceptance_rate = models.FloatField(
+        default=0.3,
+        help_text='Fraction of moves the adaptive schedule aims to accept.',
+    )
+    reheat_patience = models.PositiveIntegerField(
+        default=50,
+        help_text=(
+            'Cooling steps without a new best cost after which the reheating schedule '
+            'reheats.'
+        ),
+    )
+    max_evaluations = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text='Stop after evaluating this many candidates.',
+    )
+    max_seconds = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text='Stop after annealing for this many seconds.',
+    )
+    improvement_patience = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text='Stop after evaluating this many candidates without finding a new best cost.',
+    )
+    minibatch_fraction = models.FloatField(
+        default=1,
+        help_text=(
+            'Fraction of the training pages to score candidates on in the first cooling step. '
+            'It grows to all of them by the end of the mini-batch phase. 1 always uses every page.'
+        ),
+    )
+    minibatch_phase = models.FloatField(
+        default=0.5,
+        help_text='Fraction of the cooling steps after which candidates are scored on every page.',
+    )
+    minibatch_sampling = models.CharField(max_length=255, default=MINIBATCH_RANDOM, choices=(
+        (MINIBATCH_RANDOM, 'Random'),
+        (MINIBATCH_STRATIFIED, 'Stratified by how often pages fail'),
+    ))
+    memo_max_bytes = models.BigIntegerField(
+        blank=True,
+        null=True,
+        help_text=(
+            'Memory each annealing process may use to remember the costs of solutions it '
+            'has evaluated. Blank uses the SOLUTION_MEMO_MAX_BYTES setting.'
+        ),
+    )
+    stop_reason = models.TextField(blank=True)
+    status = models.CharField(max_length=255, default=STATUS_NEW, choices=(
+        (STATUS_NEW, 'New'),
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ))
+    queued_at = models.DateTimeField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Renewed by the worker running the run; see jobs.Heartbeat.
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    progress = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    cross_validation_folds = models.PositiveIntegerField(
+        default=0,
+        help_text=(
+            'Number of folds to cross-validate the training pages with after training. '
+            'Less than 2 skips cross-validation.'
+        ),
+    )
+    test_results = models.TextField(
+        blank=True,
+        help_text='Accuracy of the final coefficients on the testing pages, as JSON.',
+    )
+    cross_validation_results = models.TextField(blank=True)
+    checkpoint_interval = models.PositiveIntegerField(
+        default=10,
+        help_text=(
+            'Cooling steps between checkpoints of the annealer state. '
+            '0 disables checkpoints.'
+        ),
+    )
+    checkpoint_memo = models.BooleanField(
+        default=False,
+        help_text=(
+            'Include the costs of every solution seen so far in checkpoints, so a resumed '
+            'run does not evaluate them again. Makes checkpoints much larger.'
+        ),
+    )
+    checkpoint = models.TextField(blank=True, editable=False)
+    checkpointed_at = models.DateTimeField(blank=True, null=True)
+
+    def clean(self):
+        # Parallel tempering chains always score candidates on every page.
+        if self.chains > 1 and self.minibatch_fraction < 1 and not self.offline_scoring:
+            raise ValidationError({
+                'minibatch_fraction': 'Mini-batches only work with a single chain.',
+            })
+
+
+class TrainingRunStep(models.Model):
+    """
+    Metrics recorded at the end of each cooling step of a training run, or
+    each round of every chain with parallel tempering. Times are seconds
+    spent during the step, summed across the browser pool.
+    """
+    training_run = models.ForeignKey(TrainingRun, related_name='steps', on_delete=models.CASCADE)
+    chain = models.PositiveIntegerField(default=0)
+    step = models.PositiveIntegerField()
+    recorded_at = models.DateTimeField(auto_now_add=True)
+    temperature = models.FloatField()
+    current_cost = models.FloatField()
+    best_cost = models.FloatField()
+    candidates_evaluated = models.PositiveIntegerField(default=0)
+    evaluations_per_second = models.FloatField(default=0)
+    cache_hits = models.PositiveIntegerField(default=0)
+    cache_misses = models.PositiveIntegerField(default=0)
+    memo_hits = models.PositiveIntegerField(default=0)
+    memo_misses = models.PositiveIntegerField(default=0)
+    page_load_time = models.FloatField(default=0)
+    script_time = models.FloatField(default=0)
+    comparison_time = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['id']
+
+    @property
+    def cache_hit_rate(self):
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / float(lookups) if lookups else None
+
+    @property
+    def memo_hit_rate(self):
+        lookups = self.memo_hits + self.memo_misses
+        return self.memo_hits / float(lookups) if lookups else None
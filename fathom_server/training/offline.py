@@ -0,0 +1,138 @@
+"""
+Browser-free scoring of coefficient vectors.
+
+Rulesets that pick each fact's answer as the candidate element with the
+highest linear combination of rule scores and coefficients can expose that
+work to us through ``window.ruleset.extractFeatures(document, factNames)``,
+which returns, for each fact::
+
+    {
+        features: [[ruleScore, ...], ...],  // one row per candidate element
+        answers: [answer, ...],              // what extractFacts would return per candidate
+        default: answer,                     // returned when there are no candidates
+    }
+
+The features are extracted once per (ruleset, webpage) and stored as
+WebpageFeatures. After that, OfflineEvaluator can find the winning candidate
+for a whole batch of coefficient vectors at once with NumPy.
+"""
+import json
+
+import numpy as np
+
+from fathom_server.training.models import WebpageFeatures
+
+
+EXTRACT_FEATURES_SCRIPT = '''
+return window.ruleset.extractFeatures(window.document, arguments[0]);
+'''
+
+
+def stale_webpages(ruleset, webpages):
+    """
+    Return the webpages whose stored features are missing or were extracted
+    from a different version of the ruleset or the frozen HTML.
+    """
+    versions = {
+        webpage_id: (ruleset_hash, frozen_html_version)
+        for webpage_id, ruleset_hash, frozen_html_version in WebpageFeatures.objects.filter(
+            ruleset=ruleset,
+            webpage__in=webpages,
+        ).values_list('webpage_id', 'ruleset_hash', 'frozen_html_version')
+    }
+    return [
+        webpage for webpage in webpages
+        if versions.get(webpage.id) != (ruleset.code_hash, webpage.frozen_html_version)
+    ]
+
+
+def save_features(ruleset, webpage, features):
+    WebpageFeatures.objects.update_or_create(
+        ruleset=ruleset,
+        webpage=webpage,
+        defaults={
+            'ruleset_hash': ruleset.code_hash,
+            'frozen_html_version': webpage.frozen_html_version,
+            'features': json.dumps(features),
+        },
+    )
+
+
+class FactFeatures:
+    """
+    Every candidate for one fact across all the webpages, stacked into one
+    matrix so a batch of coefficient vectors can be scored with one product.
+    """
+    def __init__(self, rows, good, starts, pages, failing_pages):
+        self.features = np.array(rows, dtype=np.float64)
+        self.good = np.array(good, dtype=bool)  # Whether each candidate's answer is correct
+        self.starts = np.array(starts, dtype=np.intp)  # First row of each page's candidates
+        self.lengths = np.diff(np.append(self.starts, len(rows)))
+        self.pages = np.array(pages, dtype=np.intp)  # Webpage index of each run of candidates
+        self.failing_pages = np.array(failing_pages, dtype=np.intp)
+
+    def correct_pages(self, coefficients):
+        """
+        Return a (pages x solutions) boolean matrix of whether each solution
+        picks a candidate with the right answer, for the pages in self.pages.
+        """
+        scores = self.features @ coefficients.T
+        best = np.maximum.reduceat(scores, self.starts, axis=0)
+        is_best = scores == np.repeat(best, self.lengths, axis=0)
+
+        # Like extractFacts, break ties in favour of the first candidate.
+        row_numbers = np.arange(len(scores))[:, np.newaxis]
+        winners = np.minimum.reduceat(
+            np.where(is_best, row_numbers, len(scores)),
+            self.starts,
+            axis=0,
+        )
+        return self.good[winners]
+
+
+class OfflineEvaluator:
+    def __init__(self, ruleset, webpages, ground_truth):
+        self.page_count = len(webpages)
+
+        stored_features = {
+            webpage_id: json.loads(features)
+            for webpage_id, features in WebpageFeatures.objects.filter(
+                ruleset=ruleset,
+                webpage__in=webpages,
+            ).values_list('webpage_id', 'features')
+        }
+        missing = [webpage.url for webpage in webpages if webpage.id not in stored_features]
+        if missing:
+            raise ValueError('No features have been extracted for {}'.format(', '.join(missing)))
+
+        self.facts = []
+        for fact_index, key in enumerate(ground_truth.fact_keys):
+            rows, good, starts, pages, failing_pages = [], [], [], [], []
+            for page_index, webpage in enumerate(webpages):
+                expected = ground_truth.answers[webpage.id][fact_index]
+                if expected is ground_truth.MISSING:
+                    continue
+
+                fact_features = stored_features[webpage.id][key]
+                if not fact_features['features']:
+                    # With no candidates the answer can't depend on the coefficients.
+                    if fact_features.get('default') != expected:
+                        failing_pages.append(page_index)
+                    continue
+
+                starts.append(len(rows))
+                pages.append(page_index)
+                rows.extend(fact_features['features'])
+                good.extend(answer == expected for answer in fact_features['answers'])
+            self.facts.append(FactFeatures(rows, good, starts, pages, failing_pages))
+
+    def solution_costs(self, solutions):
+        coefficients = np.array(solutions, dtype=np.float64)
+        correct = np.ones((self.page_count, len(solutions)), dtype=bool)
+        for fact in self.facts:
+            correct[fact.failing_pages] = False
+            if len(fact.starts):
+                correct[fact.pages] &= fact.correct_pages(coefficients)
+
+        costs = (self.page_count - correct.sum(axis=0)) / self.page_count
+        return costs.tolist()
@@ -0,0 +1,161 @@
+import json
+
+from fathom_server.training.annealing import Tuner
+from fathom_server.training.evaluation import cross_validate, evaluate, EvaluationSession
+from fathom_server.training.jobs import record_step, save_checkpoint, update_progress
+from fathom_server.training.models import TrainingRun
+from fathom_server.training.schedules import (
+    AdaptiveSchedule,
+    GeometricSchedule,
+    ReheatingSchedule,
+    StoppingRule,
+)
+from fathom_server.training.tempering import ParallelTempering
+
+
+def cooling_schedule(
+    name,
+    initial_temperature=5000,
+    cooling_fraction=0.95,
+    target_acceptance=0.3,
+    reheat_patience=50,
+):
+    """Return the cooling schedule of the given TrainingRun.SCHEDULE_* name."""
+    if name == TrainingRun.SCHEDULE_ADAPTIVE:
+        return AdaptiveSchedule(
+            initial_temperature,
+            cooling_fraction,
+            target_acceptance=target_acceptance,
+        )
+    if name == TrainingRun.SCHEDULE_REHEATING:
+        return ReheatingSchedule(initial_temperature, cooling_fraction, patience=reheat_patience)
+    return GeometricSchedule(initial_temperature, cooling_fraction)
+
+
+def tuner_options(training_run):
+    """The Tuner options a training run's settings call for."""
+    initial_coefficients = None
+    if training_run.initial_coefficients:
+        initial_coefficients = json.loads(training_run.initial_coefficients)
+
+    return {
+        'initial_temperature': training_run.initial_temperature,
+        'cooling_steps': training_run.cooling_steps,
+        'cooling_fraction': training_run.cooling_fraction,
+        'steps_per_temp': training_run.steps_per_temp,
+        'still_patience': training_run.still_patience,
+        'cooling_schedule': cooling_schedule(
+            training_run.cooling_schedule,
+            training_run.initial_temperature,
+            training_run.cooling_fraction,
+            target_acceptance=training_run.target_acceptance_rate,
+            reheat_patience=training_run.reheat_patience,
+        ),
+        'initial_coefficients': initial_coefficients,
+        'pool_size': training_run.browser_pool_size,
+        'batch_size': training_run.candidate_batch_size,
+        'resident_pages': training_run.resident_pages,
+        'offline': training_run.offline_scoring,
+        'cache_results': training_run.cache_results,
+        'early_abort': training_run.early_abort,
+        'page_order': training_run.page_order,
+        'minibatch_fraction': training_run.minibatch_fraction,
+        'minibatch_phase': training_run.minibatch_phase,
+        'minibatch_sampling': training_run.minibatch_sampling,
+        'memo_max_bytes': training_run.memo_max_bytes,
+    }
+
+
+def resumable_checkpoint(training_run):
+    """
+    Return the run's checkpoint if it can be resumed from, or None. A
+    checkpoint taken with different ruleset code or number of chains is
+    ignored.
+    """
+    if not training_run.checkpoint:
+        return None
+    checkpoint = json.loads(training_run.checkpoint)
+    if checkpoint['ruleset_hash'] != training_run.ruleset.code_hash:
+        return None
+    if checkpoint.get('chains', 1) != max(1, training_run.chains):
+        return None
+    return checkpoint
+
+
+def train(training_run):
+    """
+    Anneal the coefficients of a training run's ruleset against its training
+    pages, recording progress, telemetry and checkpoints on the run as
+    cooling steps complete. A run with a checkpoint carries on from it, and
+    a run its stopping rule ends early records why.
+    Returns the best solution found and its cost.
+    """
+    def progress_callback(progress):
+        update_progress(training_run, progress)
+
+    def telemetry_callback(telemetry):
+        record_step(training_run, telemetry)
+
+    def checkpoint_callback(checkpoint):
+        save_checkpoint(training_run, checkpoint)
+
+    options = tuner_options(training_run)
+    options['progress_callback'] = progress_callback
+    options['telemetry_callback'] = telemetry_callback
+    options['checkpoint_callback'] = checkpoint_callback
+    options['checkpoint_interval'] = training_run.checkpoint_interval
+    options['checkpoint_memo'] = training_run.checkpoint_memo
+    options['resume_from'] = resumable_checkpoint(training_run)
+    options['stopping_rule'] = StoppingRule(
+        max_evaluations=training_run.max_evaluations,
+        max_seconds=training_run.max_seconds,
+        patience=training_run.improvement_patience,
+    )
+    if training_run.chains > 1:
+        tuner = ParallelTempering(
+            training_run.ruleset,
+            training_run.training_pages.all(),
+            chains=training_run.chains,
+            **options
+        )
+    else:
+        tuner = Tuner(training_run.ruleset, training_run.training_pages.all(), **options)
+    result = tuner.anneal()
+    if tuner.stop_reason:
+        training_run.stop_reason = tuner.stop_reason
+        training_run.save(update_fields=['stop_reason'])
+    return result
+
+
+def evaluate_training_run(training_run, coefficients):
+    """
+    Score the given coefficients on the run's testing pages and, if the run
+    asks for it, cross-validate on its training pages, storing the results
+    on the run. Both share one pool of browsers.
+    """
+    training_pages = list(training_run.training_pages.all())
+    testing_pages = list(training_run.testing_pages.all())
+    folds = training_run.cross_validation_folds
+    if folds > len(training_pages):
+        folds = len(training_pages)
+    if not testing_pages and folds < 2:
+        return
+
+    options = tuner_options(training_run)
+    session = EvaluationSession(
+        training_run.ruleset,
+        {webpage.id: webpage for webpage in training_pages + testing_pages}.values(),
+        concurrency=folds,
+        **options
+    )
+    session.start()
+    try:
+        if testing_pages:
+            training_run.test_results = json.dumps(evaluate(session, coefficients, testing_pages))
+        if folds >= 2:
+            training_run.cross_validation_results = json.dumps(
+                cross_validate(session, training_pages, folds, **options),
+            )
+    finally:
+        session.stop()
+    training_run.save(update_fields=['test_results', 'cross_validation_results'])
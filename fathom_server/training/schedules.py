@@ -0,0 +1,114 @@
+"""
+Cooling schedules and stopping rules for the Tuner.
+
+After each cooling step, a schedule decides the next temperature from the
+last one, the fraction of proposed moves the step accepted and whether it
+found a new best cost. A Tuner works on its own copy of the schedule it's
+given, so one schedule can configure several Tuners.
+"""
+import copy
+
+
+class GeometricSchedule:
+    """Multiply the temperature by cooling_fraction every step."""
+    def __init__(self, initial_temperature=5000, cooling_fraction=0.95):
+        self.initial_temperature = initial_temperature
+        self.cooling_fraction = cooling_fraction
+
+    def next_temperature(self, temperature, acceptance_rate, improved):
+        return temperature * self.cooling_fraction
+
+    def copy(self):
+        return copy.copy(self)
+
+    def get_state(self):
+        """Return what a checkpoint needs to save, as JSON-serializable data."""
+        return {}
+
+    def set_state(self, state):
+        pass
+
+
+class AdaptiveSchedule(GeometricSchedule):
+    """
+    Cool quickly while most moves are accepted and slowly once few are, by
+    raising cooling_fraction to the power of the acceptance rate over
+    target_acceptance. Little time is spent at temperatures too high to
+    tell solutions apart, and more near the one where the acceptance rate
+    reaches the target.
+    """
+    def __init__(self, initial_temperature=5000, cooling_fraction=0.95, target_acceptance=0.3):
+        super().__init__(initial_temperature, cooling_fraction)
+        self.target_acceptance = target_acceptance
+
+    def next_temperature(self, temperature, acceptance_rate, improved):
+        exponent = min(10, max(0.1, acceptance_rate / self.target_acceptance))
+        return temperature * self.cooling_fraction ** exponent
+
+
+class ReheatingSchedule(GeometricSchedule):
+    """
+    Cool geometrically, but after `patience` steps without a new best cost
+    raise the temperature again to get out of a local minimum. The first
+    reheat goes to reheat_fraction of the initial temperature, and each
+    later one to reheat_fraction of the one before.
+    """
+    def __init__(
+        self,
+        initial_temperature=5000,
+        cooling_fraction=0.95,
+        patience=50,
+        reheat_fraction=0.5,
+    ):
+        super().__init__(initial_temperature, cooling_fraction)
+        self.patience = patience
+        self.reheat_fraction = reheat_fraction
+        self.steps_without_improvement = 0
+        self.reheat_temperature = initial_temperature * reheat_fraction
+
+    def next_temperature(self, temperature, acceptance_rate, improved):
+        if improved:
+            self.steps_without_improvement = 0
+        else:
+            self.steps_without_improvement += 1
+
+        next_temperature = temperature * self.cooling_fraction
+        stuck = self.steps_without_improvement >= self.patience
+        if stuck and self.reheat_temperature > next_temperature:
+            self.steps_without_improvement = 0
+            next_temperature = self.reheat_temperature
+            self.reheat_temperature *= self.reheat_fraction
+        return next_temperature
+
+    def get_state(self):
+        return {
+            'steps_without_improvement': self.steps_without_improvement,
+            'reheat_temperature': self.reheat_temperature,
+        }
+
+    def set_state(self, state):
+        # A checkpoint taken with another schedule has no state for this one.
+        self.steps_without_improvement = state.get('steps_without_improvement', 0)
+        self.reheat_temperature = state.get('reheat_temperature', self.reheat_temperature)
+
+
+class StoppingRule:
+    """
+    Limits on a whole run: stop after max_evaluations candidate evaluations,
+    after max_seconds, or once `patience` evaluations have gone by without a
+    new best cost. None disables a limit.
+    """
+    def __init__(self, max_evaluations=None, max_seconds=None, patience=None):
+        self.max_evaluations = max_evaluations
+        self.max_seconds = max_seconds
+        self.patience = patience
+
+    def reason(self, evaluations, seconds, evaluations_since_improvement):
+        """Return why the run should stop now, or None if it shouldn't."""
+        if self.max_evaluations is not None and evaluations >= self.max_evaluations:
+            return 'Used the budget of {} evaluations.'.format(self.max_evaluations)
+        if self.max_seconds is not None and seconds >= self.max_seconds:
+            return 'Used the time budget of {} seconds.'.format(self.max_seconds)
+        if self.patience is not None and evaluations_since_improvement >= self.patience:
+            return 'No improvement in {:.0f} evaluations.'.format(evaluations_since_improvement)
+        return None
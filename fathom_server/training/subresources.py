@@ -0,0 +1,152 @@
+"""
+Content-addressed storage for the subresources freeze-dry inlines into
+frozen HTML.
+
+freeze-dry inlines every stylesheet, font and image a page uses as a base64
+data URL, so pages from the same site repeat the same CSS and fonts. With
+FROZEN_SUBRESOURCE_MIN_BYTES set, extract_subresources() stores each inlined
+subresource at least that big once, named by the SHA-256 of its content, and
+points the page at the view_subresource URL for it instead. What such a URL
+serves never changes, so browsers can cache it for good. Inlined stylesheets
+are rewritten the same way before they're stored, so the fonts and images
+they inline are shared too.
+
+inline_subresources() undoes this, for exports that have to stand alone.
+"""
+import base64
+import binascii
+import re
+from hashlib import sha256
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+
+_TOKEN = br'[A-Za-z0-9!$^_.+-]+'
+
+# A base64 data URL, ending where the attribute value, CSS url() or srcset
+# candidate it's in does.
+DATA_URL = re.compile(
+    br'data:(' + _TOKEN + br'/' + _TOKEN + br'(?:;' + _TOKEN + br'=' + _TOKEN + br')*);base64,'
+    br'([A-Za-z0-9+/]+={0,2})(?=["\'\s)&]|$)'
+)
+
+# freeze-dry only allows data: URLs in the Content-Security-Policy it adds.
+CSP_META = re.compile(
+    br'<meta\s[^>]*http-equiv=["\']?content-security-policy[^>]*>',
+    re.IGNORECASE,
+)
+CSP_DATA_SOURCE = re.compile(br'\bdata:(?=[\s;"\']|$)')
+CSP_DATA_AND_SELF_SOURCES = b'data: &#39;self&#39;'
+
+# Our URLs are path-absolute, so a <base> pointing elsewhere would break them.
+BASE_ELEMENT = re.compile(br'<base[\s>/]', re.IGNORECASE)
+
+MEDIA_TYPE = re.compile(_TOKEN + br'/' + _TOKEN + br'(?:;' + _TOKEN + br'=' + _TOKEN + br')*$')
+
+
+def storage_name(digest):
+    return 'subresources/{}/{}'.format(digest[:2], digest)
+
+
+def subresource_url(digest, media_type):
+    return '{}?type={}'.format(
+        reverse('view-subresource', args=[digest]),
+        quote(media_type.decode('ascii'), safe='/;='),
+    ).encode('ascii')
+
+
+def subresource_url_pattern():
+    prefix = reverse('view-subresource', args=['0' * 64])[:-64]
+    return re.compile(
+        re.escape(prefix.encode('ascii')) + br'([0-9a-f]{64})\?type=([A-Za-z0-9%!$^_.;=/-]+)'
+    )
+
+
+def is_stylesheet(media_type):
+    return media_type.split(b';')[0].lower() == b'text/css'
+
+
+def extract_subresources(html, min_bytes=None, save=True):
+    """
+    Return the frozen HTML, as bytes, with the subresources inlined in it
+    that are at least min_bytes long stored separately and referenced by
+    URL. With save=False, just return what the HTML would be. Pages with a
+    <base> element, and all pages if min_bytes is 0, are left as they are.
+    """
+    if min_bytes is None:
+        min_bytes = settings.FROZEN_SUBRESOURCE_MIN_BYTES
+    if not min_bytes or BASE_ELEMENT.search(html):
+        return html
+
+    extracted = _extract(html, min_bytes, save)
+    if extracted == html:
+        return html
+
+    def allow_self(match):
+        tag = match.group(0)
+        if CSP_DATA_AND_SELF_SOURCES in tag:
+            return tag
+        return CSP_DATA_SOURCE.sub(CSP_DATA_AND_SELF_SOURCES, tag)
+
+    return CSP_META.sub(allow_self, extracted)
+
+
+def _extract(content, min_bytes, save):
+    def extract(match):
+        media_type, payload = match.groups()
+        if len(payload) * 3 // 4 < min_bytes:
+            return match.group(0)
+        try:
+            data = base64.b64decode(payload)
+        except (binascii.Error, TypeError):
+            return match.group(0)
+        # Leave anything we couldn't put back exactly as it was.
+        if base64.b64encode(data) != payload:
+            return match.group(0)
+
+        if is_stylesheet(media_type):
+            data = _extract(data, min_bytes, save)
+        digest = sha256(data).hexdigest()
+        name = storage_name(digest)
+        if save and not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+        return subresource_url(digest, media_type)
+
+    return DATA_URL.sub(extract, content)
+
+
+def inline_subresources(html):
+    """
+    Return the frozen HTML, as bytes, with the subresources
+    extract_subresources() took out of it inlined again.
+    """
+    pattern = subresource_url_pattern()
+    if not pattern.search(html):
+        return html
+
+    def disallow_self(match):
+        return match.group(0).replace(CSP_DATA_AND_SELF_SOURCES, b'data:')
+
+    html = CSP_META.sub(disallow_self, html)
+    return _inline(html, pattern)
+
+
+def _inline(content, pattern):
+    def inline(match):
+        digest = match.group(1).decode('ascii')
+        media_type = unquote(match.group(2).decode('ascii')).encode('ascii')
+        try:
+            with default_storage.open(storage_name(digest), 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return match.group(0)
+
+        if is_stylesheet(media_type):
+            data = _inline(data, pattern)
+        return b'data:' + media_type + b';base64,' + base64.b64encode(data)
+
+    return pattern.sub(inline, content)
@@ -0,0 +1,295 @@
+"""
+Parallel tempering: several annealing chains, each in its own process with
+its own browsers (or offline evaluator), sampling at a fixed ladder of
+temperatures and periodically swapping states between neighbours.
+"""
+import math
+import multiprocessing
+import time
+import traceback
+from random import Random
+
+from django.db import connections
+
+from fathom_server.training.annealing import json_to_random_state, step_telemetry, Tuner
+from fathom_server.training.browsers import webdriver_pool
+from fathom_server.training.memo import SolutionMemo
+from fathom_server.training.models import Ruleset, Webpage
+from fathom_server.training.schedules import StoppingRule
+
+
+class SharedMemo(SolutionMemo):
+    """
+    A solution => cost memo that remembers which entries were added by this
+    chain since they were last shared with the others. Entries merged in
+    with update() came from other chains and aren't shared again.
+    """
+    def __init__(self, max_bytes=None):
+        super().__init__(max_bytes)
+        # Kept apart from the table, which may have evicted them by the
+        # time they're shared.
+        self.new_entries = {}
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.new_entries[key] = value
+
+    def pop_new_entries(self):
+        entries, self.new_entries = self.new_entries, {}
+        return entries
+
+
+def run_chain(connection, ruleset_id, webpage_ids, tuner_options):
+    tuner = None
+    try:
+        tuner = Tuner(
+            Ruleset.objects.get(id=ruleset_id),
+            Webpage.objects.filter(id__in=webpage_ids),
+            **tuner_options
+        )
+        tuner.start()
+
+        memo = SharedMemo(tuner.memo_max_bytes)
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+
+            command, args = message
+            if command == 'initial':
+                solution = tuner.initial_solution()
+                cost = tuner.solution_cost(solution)
+                tuner.flush_result_cache()
+                connection.send((solution, cost))
+            elif command == 'sample':
+                solution, cost, temperature, memo_entries = args
+                memo.update(memo_entries)
+                tuner.metrics.pop()
+                start = time.monotonic()
+                results = tuner.sample(solution, cost, temperature, memo, stop_when_still=False)
+                tuner.flush_result_cache()
+                elapsed = time.monotonic() - start
+                connection.send(results + (memo.pop_new_entries(), elapsed, tuner.metrics.pop()))
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+    finally:
+        if tuner:
+            tuner.stop()
+        # Sessions this process started aren't any use to the parent.
+        webdriver_pool().close()
+        connection.close()
+
+
+class ParallelTempering:
+    """
+    Runs `chains` annealing chains in parallel at temperatures spaced
+    geometrically between the Tuner's initial and final temperatures. Each
+    round, every chain takes steps_per_temp steps at its temperature, then
+    neighbouring chains may swap states and every chain receives the costs
+    the others found. There are cooling_steps rounds, unless stopping_rule
+    ends the run sooner; it counts the evaluations of all the chains.
+
+    Each chain draws its random numbers from a seed taken from this object's
+    generator, so chains make different moves, and a seed reproduces a run.
+    """
+    # Chains inherit Django's configuration from this process.
+    context = multiprocessing.get_context('fork')
+
+    def __init__(
+        self,
+        ruleset,
+        webpages,
+        chains=2,
+        initial_temperature=5000,
+        cooling_steps=5000,
+        cooling_fraction=0.95,
+        progress_callback=None,
+        telemetry_callback=None,
+        checkpoint_callback=None,
+        checkpoint_interval=10,
+        resume_from=None,
+        stopping_rule=None,
+        seed=None,
+        **tuner_options
+    ):
+        if tuner_options.get('minibatch_fraction', 1) < 1 and not tuner_options.get('offline'):
+            # Chains take their steps with Tuner.sample, on every page.
+            raise ValueError('Mini-batches only work with a single chain.')
+        self.ruleset = ruleset
+        self.webpage_ids = [webpage.id for webpage in webpages]
+        self.chains = max(2, chains)
+        self.rounds = cooling_steps
+        self.progress_callback = progress_callback
+        self.telemetry_callback = telemetry_callback
+        self.checkpoint_callback = checkpoint_callback
+        self.checkpoint_interval = checkpoint_interval
+        self.resume_from = resume_from
+        self.stopping_rule = stopping_rule or StoppingRule()
+        self.stop_reason = None
+        self.tuner_options = tuner_options
+        self.random = Random(seed)
+        self.boltzmanns = 1.3806485279e-23
+
+        final_temperature = initial_temperature * cooling_fraction ** cooling_steps
+        ratio = (final_temperature / initial_temperature) ** (1 / (self.chains - 1))
+        self.temperatures = [initial_temperature * ratio ** index for index in range(self.chains)]
+
+    def anneal(self):
+        started_at = time.monotonic()
+        if self.tuner_options.get('offline'):
+            self.extract_features()
+        # Forked processes must not share the parent's database connections.
+        connections.close_all()
+
+        processes = []
+        pipes = []
+        try:
+            for _ in range(self.chains):
+                parent_connection, child_connection = self.context.Pipe()
+                chain_options = dict(self.tuner_options, seed=self.random.getrandbits(64))
+                process = self.context.Process(
+                    target=run_chain,
+                    args=(child_connection, self.ruleset.id, self.webpage_ids, chain_options),
+                )
+                process.start()
+                processes.append(process)
+                pipes.append(parent_connection)
+
+            if self.resume_from:
+                first_round = self.resume_from['step']
+                states = [tuple(state) for state in self.resume_from['states']]
+                best_solution = self.resume_from['best_solution']
+                best_cost = self.resume_from['best_cost']
+                self.random.setstate(json_to_random_state(self.resume_from['random_state']))
+                evaluations = self.resume_from.get('evaluations', 0)
+                improved_at = evaluations - self.resume_from.get('evaluations_since_improvement', 0)
+                started_at -= self.resume_from.get('seconds', 0)
+            else:
+                first_round = 0
+                pipes[0].send(('initial', None))
+                initial_solution, initial_cost = self.receive(pipes[0])
+                states = [(initial_solution, initial_cost)] * self.chains
+                best_solution, best_cost = initial_solution, initial_cost
+                evaluations = improved_at = 1
+            memo_entries = [{} for _ in range(self.chains)]
+
+            for round_index in range(first_round, self.rounds):
+                self.stop_reason = self.stopping_rule.reason(
+                    evaluations,
+                    time.monotonic() - started_at,
+                    evaluations - improved_at,
+                )
+                if self.stop_reason:
+                    break
+                for pipe, (solution, cost), temperature, entries in zip(
+                    pipes, states, self.temperatures, memo_entries,
+                ):
+                    pipe.send(('sample', (solution, cost, temperature, entries)))
+
+                new_entries = []
+                chain_telemetry = []
+                for index, pipe in enumerate(pipes):
+                    (
+                        solution,
+                        cost,
+                        chain_best_solution,
+                        chain_best_cost,
+                        entries,
+                        elapsed,
+                        metrics,
+                    ) = self.receive(pipe)
+                    states[index] = (solution, cost)
+                    new_entries.append(entries)
+                    chain_telemetry.append((cost, elapsed, metrics))
+                    evaluations += metrics['candidates_evaluated']
+                    if chain_best_cost < best_cost:
+                        best_solution, best_cost = chain_best_solution, chain_best_cost
+                        improved_at = evaluations
+
+                if self.telemetry_callback:
+                    for index, (cost, elapsed, metrics) in enumerate(chain_telemetry):
+                        telemetry = step_telemetry(
+                            round_index + 1,
+                            self.temperatures[index],
+                            cost,
+                            best_cost,
+                            elapsed,
+                            metrics,
+                        )
+                        telemetry['chain'] = index
+                        self.telemetry_callback(telemetry)
+
+                # Every chain gets the costs all the other chains found.
+                memo_entries = []
+                for index in range(self.chains):
+                    entries = {}
+                    for other_index, other_entries in enumerate(new_entries):
+                        if other_index != index:
+                            entries.update(other_entries)
+                    memo_entries.append(entries)
+
+                self.swap_states(states, round_index)
+                if self.progress_callback:
+                    self.progress_callback(round_index + 1)
+                interval = self.checkpoint_interval
+                if self.checkpoint_callback and interval and (round_index + 1) % interval == 0:
+                    # The chains' memos aren't saved; after resuming they
+                    # start again with empty ones.
+                    self.checkpoint_callback({
+                        'ruleset_hash': self.ruleset.code_hash,
+                        'chains': self.chains,
+                        'step': round_index + 1,
+                        'states': states,
+                        'best_solution': best_solution,
+                        'best_cost': best_cost,
+                        'random_state': self.random.getstate(),
+                        'evaluations': evaluations,
+                        'evaluations_since_improvement': evaluations - improved_at,
+                        'seconds': time.monotonic() - started_at,
+                    })
+
+            return (best_solution, best_cost)
+        finally:
+            for pipe in pipes:
+                try:
+                    pipe.send(None)
+                except (BrokenPipeError, EOFError):
+                    pass
+            for process in processes:
+                process.join()
+
+    def extract_features(self):
+        """
+        Extract features for stale pages once, here, so the chains find
+        them all stored instead of each extracting them again.
+        """
+        tuner = Tuner(
+            self.ruleset,
+            Webpage.objects.filter(id__in=self.webpage_ids),
+            **self.tuner_options
+        )
+        try:
+            tuner.start()
+        finally:
+            tuner.stop()
+
+    def receive(self, pipe):
+        message = pipe.recv()
+        if message[0] == 'error':
+            raise RuntimeError('Annealing chain failed:\n{}'.format(message[1]))
+        return message
+
+    def swap_states(self, states, round_index):
+        """
+        Offer swaps between neighbouring temperatures, alternating between
+        even and odd pairs each round, using the usual replica exchange
+        acceptance test.
+        """
+        for index in range(round_index % 2, self.chains - 1, 2):
+            hot_cost = states[index][1]
+            cold_cost = states[index + 1][1]
+            hot_beta = 1 / (self.boltzmanns * self.temperatures[index])
+            cold_beta = 1 / (self.boltzmanns * self.temperatures[index + 1])
+            delta = (hot_beta - cold_beta) * (hot_cost - cold_cost)
+            if delta >= 0 or self.random.random() < math.exp(delta):
+                states[index], states[index + 1] = states[index + 1], states[index]
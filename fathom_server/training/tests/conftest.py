@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def test_settings(settings, tmpdir):
+    # The debug toolbar would otherwise be added to every HTML response.
+    settings.DEBUG = False
+    settings.MEDIA_ROOT = str(tmpdir)
+    settings.FROZEN_WEBPAGE_OFFLOAD = ''
+    settings.FROZEN_SUBRESOURCE_MIN_BYTES = 0
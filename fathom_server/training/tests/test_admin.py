@@ -0,0 +1,71 @@
+import json
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+
+from fathom_server.training.models import Ruleset, TrainingRun
+
+
+@pytest.fixture
+def training_run(db):
+    return TrainingRun.objects.create(ruleset=Ruleset.objects.create(code=''))
+
+
+def test_train_requires_post(admin_client, training_run):
+    response = admin_client.get(reverse('admin:execute_training_run', args=[training_run.id]))
+    assert response.status_code == 405
+    training_run.refresh_from_db()
+    assert training_run.status == TrainingRun.STATUS_NEW
+
+
+def test_train_queues_run(admin_client, training_run):
+    response = admin_client.post(reverse('admin:execute_training_run', args=[training_run.id]))
+    assert response.status_code == 302
+    training_run.refresh_from_db()
+    assert training_run.status == TrainingRun.STATUS_QUEUED
+
+
+def test_resume_keeps_checkpoint(admin_client, training_run):
+    training_run.status = TrainingRun.STATUS_FAILED
+    training_run.checkpoint = json.dumps({'step': 3})
+    training_run.save()
+    admin_client.post(reverse('admin:resume_training_run', args=[training_run.id]))
+    training_run.refresh_from_db()
+    assert training_run.status == TrainingRun.STATUS_QUEUED
+    assert training_run.progress == 3
+    assert training_run.checkpoint
+
+
+@pytest.mark.parametrize('view', ['admin:execute_training_run', 'admin:resume_training_run'])
+def test_running_run_not_queued(admin_client, training_run, view):
+    training_run.status = TrainingRun.STATUS_RUNNING
+    training_run.heartbeat_at = timezone.now()
+    training_run.progress = 7
+    training_run.save()
+    admin_client.post(reverse(view, args=[training_run.id]))
+    training_run.refresh_from_db()
+    assert training_run.status == TrainingRun.STATUS_RUNNING
+    assert training_run.progress == 7
+
+
+def test_orphaned_run_resumed(admin_client, training_run, settings):
+    training_run.status = TrainingRun.STATUS_RUNNING
+    training_run.heartbeat_at = timezone.now() - timedelta(
+        seconds=settings.TRAINING_RUN_LEASE_SECONDS + 1,
+    )
+    training_run.checkpoint = json.dumps({'step': 3})
+    training_run.save()
+    admin_client.post(reverse('admin:resume_training_run', args=[training_run.id]))
+    training_run.refresh_from_db()
+    assert training_run.status == TrainingRun.STATUS_QUEUED
+    assert training_run.progress == 3
+
+
+def test_change_form_posts_to_train(admin_client, training_run):
+    response = admin_client.get(
+        reverse('admin:training_trainingrun_change', args=[training_run.id]),
+    )
+    url = reverse('admin:execute_training_run', args=[training_run.id])
+    assert 'method="post" action="{}"'.format(url).encode('utf8') in response.content
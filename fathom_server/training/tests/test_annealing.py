@@ -0,0 +1,211 @@
+import pytest
+
+from fathom_server.training.annealing import Tuner
+from fathom_server.training.evaluation import cross_validate, EvaluationSession
+from fathom_server.training.fake_driver import FakeDriver, SyntheticRuleset
+from fathom_server.training.models import TrainingRun, WebpageFeatures
+from fathom_server.training.offline import stale_webpages
+from fathom_server.training.runs import tuner_options
+from fathom_server.training.tempering import ParallelTempering
+
+
+@pytest.fixture
+def synthetic():
+    return SyntheticRuleset(['title'], rules=3, candidates=4)
+
+
+@pytest.fixture
+def corpus(db, synthetic):
+    return synthetic.create_corpus(20)
+
+
+def make_tuner(synthetic, corpus, **options):
+    ruleset, webpages = corpus
+    options.setdefault('driver_factory', lambda: FakeDriver(synthetic))
+    return Tuner(ruleset, webpages, **options)
+
+
+def test_solution_costs_make_no_queries(synthetic, corpus, django_assert_num_queries):
+    tuner = make_tuner(synthetic, corpus)
+    tuner.start()
+    try:
+        with django_assert_num_queries(0):
+            costs = tuner.solution_costs([[1, 1, 1], [2, -1, 0]])
+    finally:
+        tuner.stop()
+    assert len(costs) == 2
+    assert all(0 <= cost <= 1 for cost in costs)
+
+
+def test_tempering_extracts_features_before_forking(synthetic, corpus):
+    ruleset, webpages = corpus
+    drivers = []
+
+    def driver_factory():
+        drivers.append(FakeDriver(synthetic))
+        return drivers[-1]
+
+    tempering = ParallelTempering(
+        ruleset,
+        webpages,
+        chains=2,
+        offline=True,
+        driver_factory=driver_factory,
+    )
+    tempering.extract_features()
+    assert WebpageFeatures.objects.filter(ruleset=ruleset).count() == len(webpages)
+    assert not stale_webpages(ruleset, webpages)
+
+
+def test_tempering_rejects_minibatches(synthetic, corpus):
+    ruleset, webpages = corpus
+    with pytest.raises(ValueError):
+        ParallelTempering(ruleset, webpages, chains=2, minibatch_fraction=0.5)
+
+
+def test_offline_tuner_starts_browsers_only_for_stale_pages(synthetic, corpus):
+    drivers = []
+
+    def driver_factory():
+        drivers.append(FakeDriver(synthetic))
+        return drivers[-1]
+
+    options = {
+        'offline': True,
+        'initial_coefficients': [1, 1, 1],
+        'cooling_steps': 3,
+        'steps_per_temp': 5,
+        'driver_factory': driver_factory,
+    }
+    make_tuner(synthetic, corpus, **options).anneal()
+    assert len(drivers) == 1
+
+    make_tuner(synthetic, corpus, **options).anneal()
+    assert len(drivers) == 1
+
+
+def test_resident_pages_loaded_once(synthetic, corpus):
+    ruleset, webpages = corpus
+    loaded = []
+    drivers = []
+
+    class CountingDriver(FakeDriver):
+        def get(self, url):
+            loaded.append(url)
+            super().get(url)
+
+    def driver_factory():
+        drivers.append(CountingDriver(synthetic))
+        return drivers[-1]
+
+    tuner = make_tuner(
+        synthetic,
+        corpus,
+        resident_pages=True,
+        driver_factory=driver_factory,
+    )
+    tuner.start()
+    try:
+        first = tuner.solution_costs([[1, 1, 1]])
+        again = tuner.solution_costs([[1, 1, 1], [3, 0, -1]])
+    finally:
+        tuner.stop()
+    assert len(loaded) == len(webpages)
+    assert again[0] == first[0]
+    # Every webpage kept a window of its own, opened the Selenium 3 way.
+    assert sorted(
+        webpage_id for driver in drivers for webpage_id in driver.webpage_ids.values()
+    ) == sorted(webpage.id for webpage in webpages)
+
+
+def test_lower_bounds_share_memo_budget(synthetic, corpus):
+    tuner = make_tuner(
+        synthetic,
+        corpus,
+        early_abort=True,
+        batch_size=4,
+        cooling_steps=5,
+        steps_per_temp=20,
+        memo_max_bytes=64 * 1024,
+    )
+    tuner.anneal()
+    assert tuner.lower_bounds_max_bytes == 16 * 1024
+    assert tuner.memo.nbytes <= 48 * 1024
+    assert len(tuner.cost_lower_bounds)
+    assert tuner.cost_lower_bounds.nbytes <= 16 * 1024
+
+
+def test_tuner_options_pass_memo_size():
+    training_run = TrainingRun(memo_max_bytes=64 * 1024 * 1024)
+    assert tuner_options(training_run)['memo_max_bytes'] == 64 * 1024 * 1024
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'batch_size': 4},
+    {'batch_size': 3, 'pool_size': 2},
+    {'page_order': TrainingRun.PAGE_ORDER_FAILURES},
+])
+def test_early_abort_keeps_trajectory(synthetic, corpus, options):
+    def run(early_abort):
+        steps = []
+        drivers = []
+
+        def driver_factory():
+            drivers.append(FakeDriver(synthetic))
+            return drivers[-1]
+
+        tuner = make_tuner(
+            synthetic,
+            corpus,
+            driver_factory=driver_factory,
+            seed=1,
+            cooling_steps=8,
+            steps_per_temp=15,
+            initial_temperature=0.05,
+            still_patience=0,
+            early_abort=early_abort,
+            telemetry_callback=steps.append,
+            **options
+        )
+        result = tuner.anneal()
+        trajectory = [(step['current_cost'], step['best_cost']) for step in steps]
+        script_bytes = sum(driver.script_bytes for driver in drivers)
+        return result, trajectory, tuner.moves, script_bytes
+
+    full, full_trajectory, full_moves, full_bytes = run(early_abort=False)
+    aborted, aborted_trajectory, aborted_moves, aborted_bytes = run(early_abort=True)
+    assert aborted == full
+    assert aborted_trajectory == full_trajectory
+    assert aborted_moves == full_moves
+    # Some evaluations were actually cut short.
+    assert aborted_bytes < full_bytes
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_folds_reproducible(synthetic, corpus):
+    ruleset, webpages = corpus
+
+    def run(early_abort):
+        options = {
+            'driver_factory': lambda: FakeDriver(synthetic),
+            'pool_size': 2,
+            'batch_size': 3,
+            'cooling_steps': 6,
+            'steps_per_temp': 10,
+            'initial_temperature': 0.05,
+            'early_abort': early_abort,
+        }
+        session = EvaluationSession(ruleset, webpages, concurrency=4, **options)
+        session.start()
+        try:
+            results = cross_validate(session, webpages, 4, **options)
+        finally:
+            session.stop()
+        return [(fold['coefficients'], fold['training_cost']) for fold in results['folds']]
+
+    # The folds anneal at the same time, and early abort peeks at their
+    # random numbers; neither may change what any fold does.
+    full = run(early_abort=False)
+    assert run(early_abort=True) == full
+    assert run(early_abort=True) == full
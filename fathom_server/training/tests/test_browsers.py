@@ -0,0 +1,37 @@
+import os
+
+from fathom_server.training.browsers import BrowserPool
+
+
+class FakeSessions:
+    def __init__(self):
+        self.quit_sessions = []
+
+    def create(self):
+        return object()
+
+    def is_healthy(self, session):
+        return True
+
+    def reset(self, session):
+        pass
+
+    def memory(self, session):
+        return None
+
+    def quit(self, session):
+        self.quit_sessions.append(session)
+
+
+def test_sessions_leased_before_fork_left_running(monkeypatch):
+    sessions = FakeSessions()
+    pool = BrowserPool(sessions, size=0, max_uses=0, max_memory=0, check_interval=0)
+    parent_session = pool.acquire()
+
+    parent_pid = os.getpid()
+    monkeypatch.setattr(os, 'getpid', lambda: parent_pid + 1)
+    child_session = pool.acquire()
+    # A pool of size 0 keeps nothing, so both would be quit if they were ours.
+    pool.release(parent_session)
+    pool.release(child_session)
+    assert sessions.quit_sessions == [child_session]
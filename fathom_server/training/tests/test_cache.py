@@ -0,0 +1,71 @@
+import pytest
+
+from fathom_server.training.cache import ResultCache
+from fathom_server.training.models import CachedResult, Ruleset, Webpage
+
+
+@pytest.fixture
+def ruleset(db):
+    return Ruleset.objects.create(code='function extractFacts() {}')
+
+
+@pytest.fixture
+def webpages(db):
+    return [
+        Webpage.objects.create(url='https://example.com/{}/'.format(i), frozen_html='page.html')
+        for i in range(3)
+    ]
+
+
+def test_results_stored_on_flush(ruleset, webpages, django_assert_num_queries):
+    cache = ResultCache(ruleset, ['title'])
+    with django_assert_num_queries(0):
+        cache.set_many([(webpage, [1, 2], {'title': webpage.url}) for webpage in webpages])
+        # Queued results are served before they're stored.
+        assert cache.get_many(webpages[:1], [[1, 2]]) == {
+            (webpages[0].id, (1, 2)): {'title': webpages[0].url},
+        }
+    assert not CachedResult.objects.exists()
+
+    cache.flush()
+    assert CachedResult.objects.count() == 3
+    assert ResultCache(ruleset, ['title']).get_many(webpages, [[1, 2]]) == {
+        (webpage.id, (1, 2)): {'title': webpage.url} for webpage in webpages
+    }
+
+
+def test_flush_skips_results_stored_elsewhere(ruleset, webpages):
+    other = ResultCache(ruleset, ['title'])
+    other.set_many([(webpages[0], [1], {'title': 'other'})])
+    other.flush()
+
+    cache = ResultCache(ruleset, ['title'])
+    cache.set_many([(webpage, [1], {'title': 'mine'}) for webpage in webpages])
+    cache.flush()
+    assert CachedResult.objects.count() == 3
+    assert cache.get_many(webpages[:1], [[1]]) == {(webpages[0].id, (1,)): {'title': 'other'}}
+
+
+def test_flush_evicts_oldest(ruleset, webpages):
+    cache = ResultCache(ruleset, ['title'], max_entries=2)
+    cache.set_many([(webpage, [1], {'title': webpage.url}) for webpage in webpages])
+    cache.flush()
+    assert CachedResult.objects.count() == 2
+
+
+def test_evict_keeps_max_entries_despite_id_gaps(ruleset, webpages):
+    cache = ResultCache(ruleset, ['title'], max_entries=3)
+    cache.set_many([(webpage, [1], {'title': webpage.url}) for webpage in webpages])
+    cache.flush()
+    oldest, *newer = CachedResult.objects.order_by('id')
+    CachedResult.objects.filter(id__in=[entry.id for entry in newer]).delete()
+
+    cache.set_many([(webpage, [2], {'title': webpage.url}) for webpage in webpages[:2]])
+    cache.flush()
+    assert CachedResult.objects.count() == 3
+    assert CachedResult.objects.filter(id=oldest.id).exists()
+
+    cache.set_many([(webpages[2], [2], {'title': webpages[2].url})])
+    cache.flush()
+    assert CachedResult.objects.count() == 3
+    assert not CachedResult.objects.filter(id=oldest.id).exists()
@@ -0,0 +1,12 @@
+import pytest
+from django.core.management import find_commands, load_command_class
+
+from fathom_server.training import management
+
+
+@pytest.mark.parametrize('name', find_commands(management.__path__[0]))
+def test_command_loads(name):
+    # The workers import the whole training loop, so this catches syntax the
+    # image's Python can't run.
+    command = load_command_class('fathom_server.training', name)
+    assert command.create_parser('manage.py', name).format_help()
@@ -0,0 +1,102 @@
+import base64
+import json
+
+import pytest
+
+from fathom_server.training.exporting import export_factset, export_training_run, to_jsonl
+from fathom_server.training.importing import import_jsonl
+from fathom_server.training.models import Fact, FactSet, Ruleset, TrainingRun, Webpage
+
+IMAGE = 'data:image/png;base64,' + base64.b64encode(b'\x89PNG' * 64).decode('ascii')
+
+RECORDS = [
+    {
+        'url': 'https://example.com/a/',
+        'frozen_html': u'<html><body><img src="{}">A \u2603</body></html>'.format(IMAGE),
+        'facts': {'title': 'A', 'price': 9.5, 'in_stock': True},
+    },
+    {
+        'url': 'https://example.com/b/',
+        'frozen_html': '<html><body>B</body></html>',
+        'facts': {'title': 'B', 'price': 3, 'in_stock': False},
+    },
+    {
+        'url': 'https://example.com/c/',
+        'frozen_html': '<html><body>C</body></html>',
+        'facts': {'title': None},
+    },
+]
+
+
+@pytest.fixture
+def fact_set(db):
+    fact_set = FactSet.objects.create()
+    fact_set.facts.add(
+        Fact.objects.create(key='title', question='Title?', type=Fact.TYPE_STRING),
+        Fact.objects.create(key='price', question='Price?', type=Fact.TYPE_NUMBER),
+        Fact.objects.create(key='in_stock', question='In stock?', type=Fact.TYPE_BOOLEAN),
+    )
+    return fact_set
+
+
+def lines(records):
+    return [json.dumps(record) + '\n' for record in records]
+
+
+def exported(records):
+    return sorted(
+        ({
+            'url': record['url'],
+            'frozen_html': record['frozen_html'],
+            'facts': record['facts'],
+        } for record in records),
+        key=lambda record: record['url'],
+    )
+
+
+@pytest.mark.parametrize('min_bytes', [0, 64])
+def test_round_trip(settings, fact_set, min_bytes):
+    settings.FROZEN_SUBRESOURCE_MIN_BYTES = min_bytes
+    result = import_jsonl(lines(RECORDS))
+    assert not result.errors
+    assert result.created_webpages == 3
+    # With a minimum size, the image is stored apart and inlined again on export.
+    stored = Webpage.objects.get(url='https://example.com/a/').open_frozen_html().read()
+    assert (b'data:image/png' in stored) == (not min_bytes)
+
+    records = list(export_factset(fact_set))
+    assert exported(records) == exported(RECORDS)
+    for record in records:
+        webpage = Webpage.objects.get(url=record['url'])
+        assert record['frozen_html_sha256'] == webpage.frozen_html_sha256
+
+    # Importing an export again changes nothing.
+    result = import_jsonl(to_jsonl(records))
+    assert not result.errors
+    assert result.created_webpages == 0
+    assert result.frozen_webpages == 0
+    assert exported(export_factset(fact_set)) == exported(RECORDS)
+
+
+def test_known_hashes_leave_out_html(fact_set):
+    import_jsonl(lines(RECORDS))
+    known = Webpage.objects.get(url='https://example.com/a/').frozen_html_sha256
+    records = {record['url']: record for record in export_factset(fact_set, known_hashes={known})}
+    assert 'frozen_html' not in records['https://example.com/a/']
+    assert records['https://example.com/b/']['frozen_html'] == RECORDS[1]['frozen_html']
+
+
+def test_training_run_export_splits(fact_set):
+    import_jsonl(lines(RECORDS))
+    training_run = TrainingRun.objects.create(
+        ruleset=Ruleset.objects.create(code='', fact_set=fact_set),
+    )
+    training_run.training_pages.set(Webpage.objects.exclude(url='https://example.com/c/'))
+    training_run.testing_pages.set(Webpage.objects.filter(url='https://example.com/c/'))
+
+    splits = {record['url']: record['split'] for record in export_training_run(training_run)}
+    assert splits == {
+        'https://example.com/a/': 'training',
+        'https://example.com/b/': 'training',
+        'https://example.com/c/': 'testing',
+    }
@@ -0,0 +1,67 @@
+import pytest
+
+from fathom_server.training.freezing import Freezer
+from fathom_server.training.models import Webpage
+
+
+class FakeClient(object):
+    def __init__(self, html):
+        self.html = html
+
+    def navigate(self, url):
+        pass
+
+    def execute_async_script(self, script, script_args, script_timeout):
+        return {'html': self.html, 'timings': {'freeze': 1}}
+
+
+class FakePool(object):
+    def __init__(self, html):
+        self.html = html
+        self.released = []
+
+    def acquire(self):
+        return FakeClient(self.html)
+
+    def release(self, client, discard=False):
+        self.released.append(discard)
+
+
+@pytest.fixture
+def freezer_factory(settings, tmpdir):
+    tmpdir.mkdir('build').join('freeze.bundle.js').write('')
+    settings.BASE_DIR = str(tmpdir)
+
+    def make(html):
+        return Freezer(FakePool(html), 0, 0, 0, stop_when_empty=True)
+    return make
+
+
+@pytest.fixture
+def webpage(db):
+    return Webpage.objects.create(
+        url='https://example.com/',
+        freeze_status=Webpage.FREEZE_STATUS_FREEZING,
+    )
+
+
+def test_freeze(freezer_factory, webpage):
+    freezer = freezer_factory('<html></html>')
+    freezer.freeze(webpage)
+    webpage.refresh_from_db()
+    assert webpage.freeze_status == Webpage.FREEZE_STATUS_FROZEN
+    assert webpage.frozen_html_size == len('<html></html>')
+    assert webpage.open_frozen_html().read() == b'<html></html>'
+    assert freezer.pool.released == [False]
+
+
+def test_failure_to_store_marks_page_failed(freezer_factory, webpage):
+    # The browser returned something that isn't HTML.
+    freezer = freezer_factory(None)
+    freezer.freeze(webpage)
+    webpage.refresh_from_db()
+    assert webpage.freeze_status == Webpage.FREEZE_STATUS_FAILED
+    assert 'Traceback' in webpage.freeze_error
+    assert not webpage.frozen_html
+    # The browser itself was fine.
+    assert freezer.pool.released == [False]
@@ -0,0 +1,95 @@
+import json
+import os
+import signal
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from fathom_server.training.jobs import claim_training_run
+from fathom_server.training.management.commands import train_worker
+from fathom_server.training.models import Ruleset, TrainingRun, TrainingRunStep
+
+
+def add_run(status, heartbeat_at=None, checkpoint_step=None):
+    training_run = TrainingRun.objects.create(
+        ruleset=Ruleset.objects.create(code=''),
+        status=status,
+        queued_at=timezone.now(),
+        heartbeat_at=heartbeat_at,
+        progress=5,
+    )
+    if checkpoint_step is not None:
+        training_run.checkpoint = json.dumps({'step': checkpoint_step})
+        training_run.save()
+    for step in range(1, 6):
+        TrainingRunStep.objects.create(
+            training_run=training_run,
+            step=step,
+            temperature=1,
+            current_cost=1,
+            best_cost=1,
+        )
+    return training_run
+
+
+@pytest.fixture
+def lease_expired(settings):
+    return timezone.now() - timedelta(seconds=settings.TRAINING_RUN_LEASE_SECONDS + 1)
+
+
+@pytest.mark.django_db
+def test_claim_resumes_orphaned_run(lease_expired):
+    add_run(TrainingRun.STATUS_RUNNING, heartbeat_at=timezone.now())
+    orphaned = add_run(TrainingRun.STATUS_RUNNING, heartbeat_at=lease_expired, checkpoint_step=3)
+
+    claimed = claim_training_run()
+    assert claimed.id == orphaned.id
+    assert claimed.status == TrainingRun.STATUS_RUNNING
+    assert claimed.progress == 3
+    assert claimed.heartbeat_at > lease_expired
+    assert list(claimed.steps.values_list('step', flat=True)) == [1, 2, 3]
+    # The run whose worker is alive is left alone.
+    assert claim_training_run() is None
+
+
+@pytest.fixture
+def worker(settings, monkeypatch):
+    # Heartbeats would write from another thread, outside the test's transaction.
+    settings.TRAINING_RUN_HEARTBEAT_INTERVAL = 3600
+    handler = signal.getsignal(signal.SIGTERM)
+    yield lambda train: monkeypatch.setattr(train_worker, 'train', train)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def stop_worker(training_run):
+    TrainingRun.objects.filter(id=training_run.id).update(checkpoint=json.dumps({'step': 4}))
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+@pytest.mark.django_db
+def test_terminated_worker_requeues_run(worker):
+    training_run = add_run(TrainingRun.STATUS_QUEUED)
+    worker(stop_worker)
+    with pytest.raises(SystemExit):
+        call_command('train_worker', '--once')
+
+    training_run.refresh_from_db()
+    assert training_run.status == TrainingRun.STATUS_QUEUED
+    assert training_run.progress == 4
+    assert training_run.steps.count() == 4
+
+
+@pytest.mark.django_db
+def test_failed_run_not_requeued(worker):
+    training_run = add_run(TrainingRun.STATUS_QUEUED)
+
+    def fail(training_run):
+        raise ValueError('Broken ruleset')
+
+    worker(fail)
+    call_command('train_worker', '--once')
+    training_run.refresh_from_db()
+    assert training_run.status == TrainingRun.STATUS_FAILED
+    assert 'Broken ruleset' in training_run.error
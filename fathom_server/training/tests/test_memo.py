@@ -0,0 +1,22 @@
+from fathom_server.training.memo import SolutionMemo
+
+
+def test_pop():
+    memo = SolutionMemo(1024 * 1024)
+    memo[(1, 2)] = 0.5
+    memo[(3, 4)] = 0.25
+    assert memo.pop((1, 2)) == 0.5
+    assert memo.pop((1, 2)) is None
+    assert memo.pop((5, 6), 1.0) == 1.0
+    assert (1, 2) not in memo
+    assert memo[(3, 4)] == 0.25
+    assert len(memo) == 1
+
+
+def test_capped():
+    memo = SolutionMemo(16 * 1024)
+    for i in range(10000):
+        memo[(i, -i)] = i / 10000
+    assert memo.nbytes <= 16 * 1024
+    assert memo.evictions
+    assert len(memo) + memo.evictions == 10000
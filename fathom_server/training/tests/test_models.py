@@ -0,0 +1,89 @@
+import random
+
+import pytest
+from django.core.exceptions import ValidationError
+
+from fathom_server.training.models import Fact, FactSet, TrainingRun, Webpage, WebpageFact
+
+
+@pytest.mark.parametrize('fact_type, fact_answer, value', [
+    (Fact.TYPE_NUMBER, '3', 3.0),
+    (Fact.TYPE_NUMBER, '-2.5', -2.5),
+    (Fact.TYPE_BOOLEAN, 'true', True),
+    (Fact.TYPE_BOOLEAN, 'false', False),
+    (Fact.TYPE_STRING, '"Example"', 'Example'),
+    (Fact.TYPE_STRING, 'Typed by hand', 'Typed by hand'),
+    (Fact.TYPE_NUMBER, 'null', None),
+    (Fact.TYPE_BOOLEAN, 'null', None),
+])
+def test_decode_answer(fact_type, fact_answer, value):
+    decoded = Fact(type=fact_type).decode_answer(fact_answer)
+    assert decoded == value
+    # True == 1.0, so that alone wouldn't tell them apart.
+    assert isinstance(decoded, bool) == isinstance(value, bool)
+
+
+@pytest.mark.parametrize('fact_type, fact_answer', [
+    (Fact.TYPE_NUMBER, 'true'),
+    (Fact.TYPE_NUMBER, '"3"'),
+    (Fact.TYPE_NUMBER, '[3]'),
+    (Fact.TYPE_NUMBER, 'three'),
+    (Fact.TYPE_BOOLEAN, '1'),
+    (Fact.TYPE_BOOLEAN, '"false"'),
+    (Fact.TYPE_BOOLEAN, '{}'),
+])
+def test_decode_answer_rejects_other_types(fact_type, fact_answer):
+    with pytest.raises(ValueError):
+        Fact(type=fact_type).decode_answer(fact_answer)
+
+
+def test_training_run_rejects_minibatches_with_chains():
+    training_run = TrainingRun(chains=2, minibatch_fraction=0.5)
+    with pytest.raises(ValidationError) as excinfo:
+        training_run.clean()
+    assert 'minibatch_fraction' in excinfo.value.message_dict
+    training_run.chains = 1
+    training_run.clean()
+
+
+@pytest.fixture
+def fact_set(db):
+    fact_set = FactSet.objects.create()
+    fact_set.facts.add(Fact.objects.create(key='title', question='Title?', type=Fact.TYPE_STRING))
+    return fact_set
+
+
+def test_random_unanswered_webpage_seeks_random_key(fact_set, monkeypatch):
+    fact = fact_set.facts.get()
+    webpages = [
+        Webpage.objects.create(
+            url='https://example.com/{}/'.format(i),
+            frozen_html='page.html',
+            random_key=(i + 1) / 10,
+        )
+        for i in range(6)
+    ]
+    Webpage.objects.create(url='https://example.com/unfrozen/', random_key=0.05)
+    for webpage in webpages[1:4]:
+        WebpageFact.objects.create(webpage=webpage, fact=fact, fact_answer='"Title"')
+
+    # The first unanswered page at or after the point, wrapping around.
+    expected = [
+        (0, webpages[0]),
+        (0.1, webpages[0]),
+        (0.15, webpages[4]),
+        (0.5, webpages[4]),
+        (0.55, webpages[5]),
+        (0.65, webpages[0]),
+    ]
+    for point, webpage in expected:
+        monkeypatch.setattr(random, 'random', lambda: point)
+        assert fact_set.random_unanswered_webpage() == webpage
+
+
+def test_random_unanswered_webpage_none_left(fact_set):
+    fact = fact_set.facts.get()
+    webpage = Webpage.objects.create(url='https://example.com/', frozen_html='page.html')
+    assert fact_set.random_unanswered_webpage() == webpage
+    WebpageFact.objects.create(webpage=webpage, fact=fact, fact_answer='"Title"')
+    assert fact_set.random_unanswered_webpage() is None
@@ -0,0 +1,104 @@
+import gzip
+import io
+
+import pytest
+from django.core.files.base import ContentFile
+
+from fathom_server.training import views
+from fathom_server.training.models import Webpage
+
+
+HTML = b'<html><body>Frozen</body></html>'
+
+
+@pytest.fixture(autouse=True)
+def frozen_webpage_cache(monkeypatch):
+    cache = views.FrozenWebpageCache(1024 * 1024)
+    monkeypatch.setattr(views, 'frozen_webpage_cache', cache)
+    return cache
+
+
+@pytest.fixture
+def webpage(db):
+    webpage = Webpage(url='https://example.com/')
+    webpage.save_frozen_html(HTML)
+    webpage.save()
+    return webpage
+
+
+@pytest.fixture
+def uncompressed_webpage(db):
+    webpage = Webpage(url='https://example.com/old/')
+    webpage.frozen_html.save('old.html', ContentFile(HTML), save=False)
+    webpage.save()
+    return webpage
+
+
+def gunzip(content):
+    return gzip.GzipFile(fileobj=io.BytesIO(content), mode='rb').read()
+
+
+def test_gzip_sent_as_stored(client, webpage):
+    response = client.get(webpage.get_absolute_url(), HTTP_ACCEPT_ENCODING='gzip, deflate')
+    assert response.status_code == 200
+    assert response['Content-Encoding'] == 'gzip'
+    assert response['Vary'] == 'Accept-Encoding'
+    assert response['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert gunzip(response.content) == HTML
+
+
+def test_gzip_decompressed_for_clients_without_it(client, webpage):
+    response = client.get(webpage.get_absolute_url(), HTTP_ACCEPT_ENCODING='identity')
+    assert response.status_code == 200
+    assert not response.has_header('Content-Encoding')
+    assert response.content == HTML
+
+
+def test_gzip_refused_with_zero_quality(client, webpage):
+    response = client.get(webpage.get_absolute_url(), HTTP_ACCEPT_ENCODING='gzip;q=0')
+    assert not response.has_header('Content-Encoding')
+    assert response.content == HTML
+
+
+def test_versioned_url_served_from_cache(client, webpage, django_assert_num_queries):
+    url = webpage.get_absolute_url()
+    client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+    with django_assert_num_queries(0):
+        response = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+    assert gunzip(response.content) == HTML
+
+
+def test_not_modified(client, webpage, django_assert_num_queries):
+    url = webpage.get_absolute_url()
+    etag = client.get(url)['ETag']
+    with django_assert_num_queries(0):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+
+def test_not_modified_unversioned(client, webpage):
+    url = '/webpages/{}/'.format(webpage.id)
+    etag = client.get(url)['ETag']
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+
+def test_stale_version_redirects(client, webpage):
+    response = client.get('/webpages/{}/{}/'.format(webpage.id, '0' * 64))
+    assert response.status_code == 302
+    assert response['Location'].endswith(webpage.get_absolute_url())
+
+
+def test_unversioned_url_revalidated(client, webpage):
+    response = client.get('/webpages/{}/'.format(webpage.id), HTTP_ACCEPT_ENCODING='gzip')
+    assert response.status_code == 200
+    assert response['Cache-Control'] == 'no-cache'
+    assert gunzip(response.content) == HTML
+
+
+def test_uncompressed_page_streamed(client, uncompressed_webpage):
+    response = client.get(uncompressed_webpage.get_absolute_url(), HTTP_ACCEPT_ENCODING='gzip')
+    assert response.status_code == 200
+    assert response.streaming
+    assert not response.has_header('Content-Encoding')
+    assert b''.join(response.streaming_content) == HTML
@@ -4,5 +4,11 @@ from fathom_server.training import views
 
 
 urlpatterns = [
+    url(
+        r'webpages/(\d+)/([0-9a-f]{64})/',
+        views.view_frozen_webpage,
+        name='view-frozen-webpage',
+    ),
     url(r'webpages/(\d+)/', views.view_frozen_webpage, name='view-frozen-webpage'),
+    url(r'subresources/([0-9a-f]{64})', views.view_subresource, name='view-subresource'),
 ]
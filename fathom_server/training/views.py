@@ -1,9 +1,185 @@
-from django.http import FileResponse
-from django.shortcuts import get_object_or_404
+import calendar
+import gzip
+import io
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.http import http_date
+from django.views.decorators.http import condition
 
 from fathom_server.training.models import Webpage
+from fathom_server.training.subresources import MEDIA_TYPE, storage_name
+
+
+def accepts_encoding(request, encoding):
+    for accepted in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = accepted.partition(';')
+        if name.strip().lower() not in (encoding, '*'):
+            continue
+
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if quality > 0:
+            return True
+    return False
+
+
+class FrozenWebpageCache(object):
+    """
+    Thread-safe LRU cache of stored frozen HTML, keyed by webpage ID and
+    content hash, holding at most max_bytes of content.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        content = entry[0]
+        if len(content) > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = entry
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                evicted_key, evicted_entry = self.entries.popitem(last=False)
+                self.size -= len(evicted_entry[0])
+
+
+frozen_webpage_cache = FrozenWebpageCache(settings.FROZEN_WEBPAGE_CACHE_BYTES)
+
+
+def frozen_webpage_etag(request, webpage_id, version=None):
+    # Versioned URLs carry their own ETag, so revalidating them never
+    # touches the database.
+    if version is None:
+        version = Webpage.objects.filter(id=webpage_id).values_list(
+            'frozen_html_sha256',
+            flat=True,
+        ).first()
+    return version or None
 
 
-def view_frozen_webpage(request, webpage_id):
+def frozen_webpage_response(request, content, encoding):
+    if encoding == Webpage.ENCODING_GZIP and not accepts_encoding(request, 'gzip'):
+        content = gzip.GzipFile(fileobj=io.BytesIO(content), mode='rb').read()
+        encoding = Webpage.ENCODING_IDENTITY
+
+    response = HttpResponse(content, content_type='text/html; charset=utf-8')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+def offloaded_frozen_webpage_response(webpage):
+    """
+    Have the frontend web server send the stored file, using
+    X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd).
+    """
+    response = HttpResponse(content_type='text/html; charset=utf-8')
+    if settings.FROZEN_WEBPAGE_OFFLOAD == 'x-accel-redirect':
+        prefix = settings.FROZEN_WEBPAGE_ACCEL_REDIRECT_PREFIX
+        response['X-Accel-Redirect'] = prefix + webpage.frozen_html.name
+    else:
+        response['X-Sendfile'] = webpage.frozen_html.path
+    # Clients that can't take gzip get it decompressed by the frontend,
+    # e.g. with nginx's gunzip module.
+    if webpage.frozen_html_encoding:
+        response['Content-Encoding'] = webpage.frozen_html_encoding
+    return response
+
+
+def add_caching_headers(response, version, frozen_at):
+    if version:
+        # The content at a versioned URL never changes.
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'no-cache'
+    if frozen_at:
+        response['Last-Modified'] = http_date(calendar.timegm(frozen_at.utctimetuple()))
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@condition(etag_func=frozen_webpage_etag)
+def view_frozen_webpage(request, webpage_id, version=None):
+    cache_key = (int(webpage_id), version)
+    if version:
+        entry = frozen_webpage_cache.get(cache_key)
+        if entry is not None:
+            content, encoding, frozen_at = entry
+            response = frozen_webpage_response(request, content, encoding)
+            return add_caching_headers(response, version, frozen_at)
+
     webpage = get_object_or_404(Webpage, id=webpage_id)
-    return FileResponse(webpage.frozen_html)
+    if version and version != webpage.frozen_html_sha256:
+        return redirect(webpage)
+
+    if settings.FROZEN_WEBPAGE_OFFLOAD:
+        response = offloaded_frozen_webpage_response(webpage)
+    elif webpage.frozen_html_encoding == Webpage.ENCODING_GZIP:
+        webpage.frozen_html.open('rb')
+        try:
+            content = webpage.frozen_html.read()
+        finally:
+            webpage.frozen_html.close()
+        if version:
+            frozen_webpage_cache.set(
+                cache_key,
+                (content, webpage.frozen_html_encoding, webpage.frozen_at),
+            )
+        response = frozen_webpage_response(request, content, webpage.frozen_html_encoding)
+    else:
+        # Pages stored before compression are streamed as they are.
+        webpage.frozen_html.open('rb')
+        response = FileResponse(webpage.frozen_html, content_type='text/html; charset=utf-8')
+    return add_caching_headers(response, version, webpage.frozen_at)
+
+
+@condition(etag_func=lambda request, digest: digest)
+def view_subresource(request, digest):
+    """
+    Serve a subresource extracted from frozen HTML, as the media type in the
+    URL's type parameter. The URL names the content by its hash, so it can
+    be cached forever.
+    """
+    media_type = request.GET.get('type', '')
+    if not MEDIA_TYPE.match(media_type.encode('ascii', 'replace')):
+        media_type = 'application/octet-stream'
+
+    name = storage_name(digest)
+    if settings.FROZEN_WEBPAGE_OFFLOAD:
+        response = HttpResponse(content_type=media_type)
+        if settings.FROZEN_WEBPAGE_OFFLOAD == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.FROZEN_WEBPAGE_ACCEL_REDIRECT_PREFIX + name
+        else:
+            response['X-Sendfile'] = default_storage.path(name)
+    else:
+        try:
+            response = FileResponse(default_storage.open(name, 'rb'), content_type=media_type)
+        except (IOError, OSError):
+            raise Http404('No such subresource.')
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
@@ -1,7 +1,66 @@
 import freezeDry from 'freeze-dry';
 
-const marionetteScriptFinished = marionetteArguments[0];
-setTimeout(async () => {
+const [idleTime, timeout, marionetteScriptFinished] = marionetteArguments;
+
+/** Resolve once the page's load event has fired. */
+function loaded() {
+  if (document.readyState === 'complete') {
+    return Promise.resolve();
+  }
+  return new Promise(resolve => window.addEventListener('load', resolve, {once: true}));
+}
+
+/**
+ * Resolve once neither the DOM has changed nor a network request has
+ * finished for idleTime milliseconds, or after timeout milliseconds,
+ * whichever comes first.
+ */
+function idle() {
+  return new Promise(resolve => {
+    let idleTimer = null;
+    const mutationObserver = new MutationObserver(activity);
+    const performanceObserver = new PerformanceObserver(activity);
+    const timeoutTimer = setTimeout(finish, timeout);
+
+    function finish() {
+      mutationObserver.disconnect();
+      performanceObserver.disconnect();
+      clearTimeout(idleTimer);
+      clearTimeout(timeoutTimer);
+      resolve();
+    }
+
+    function activity() {
+      clearTimeout(idleTimer);
+      idleTimer = setTimeout(finish, idleTime);
+    }
+
+    mutationObserver.observe(document, {
+      attributes: true,
+      characterData: true,
+      childList: true,
+      subtree: true,
+    });
+    performanceObserver.observe({entryTypes: ['resource']});
+    activity();
+  });
+}
+
+(async function main() {
+  const start = performance.now();
+  await loaded();
+  const load = performance.now();
+  await idle();
+  const ready = performance.now();
   const html = await freezeDry(window.document, document.URL);
-  marionetteScriptFinished({html});
-}, 5000);
+  const end = performance.now();
+
+  marionetteScriptFinished({
+    html,
+    timings: {
+      load: load - start,
+      idle: ready - load,
+      freeze: end - ready,
+    },
+  });
+}());
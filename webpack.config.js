@@ -46,7 +46,6 @@ module.exports = [
   merge(common, {
     entry: {
       freeze: './js/freeze',
-      train: './js/train',
     },
     plugins: [
       new webpack.BannerPlugin({
@@ -57,16 +56,4 @@ module.exports = [
     ],
 
   }),
-  merge(common, {
-    entry: {
-      train_framescript: './js/train_framescript',
-    },
-    plugins: [
-      new webpack.BannerPlugin({
-        banner: 'const global = this;',
-        raw: true,
-        entryOnly: true,
-      }),
-    ],
-  }),
 ];